@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# this script compares the exact rbf SVC with its kernel approximations (see build_classifier in model.py):
+# a linear classifier on Nystroem or random Fourier features, for every number of components
+# it records the train and predict time and the test accuracy of the tweets and authors for the
+# languages and tasks whose a priori best model is an rbf kernel (English, Spanish gender)
+# the test data is the test table, or with --holdout every n-th author of the train table
+# (the vocabulary is then fitted on all train tweets, which is the same for all classifiers)
+#
+#   python3 bench/bench_approx.py [TRAIN DIR] [TEST DIR] approx.json --components 500 2000 --holdout 4
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOTDIR)
+from feats import get_features
+from model import APPROX, best_params, build_classifier, train_classifier
+from output import majority_vote
+from utils.table import Table
+
+
+# rbf configurations to benchmark: (lang, task)
+RBF_CONFIGS = [('english', 'gender'), ('english', 'age'), ('spanish', 'gender')]
+
+
+# train and test matrices, labels and author codes of a language and task
+def load(lang, task, args):
+    train = Table(os.path.join(args.train_dir, lang, 'features', 'train-' + lang + '.table'))
+    X, vec = get_features(train, lang, None)
+    Y = np.array(train.labels(task))
+    codes = np.asarray(train.codes('id'), dtype=np.int64)
+    if args.holdout:
+        held = codes % args.holdout == 0
+        return X[~held], Y[~held], X[held], Y[held], codes[held]
+
+    test = Table(os.path.join(args.test_dir, lang, 'features', 'test-' + lang + '.table'))
+    Xtest, _ = get_features(test, lang, vec)
+    return X, Y, Xtest, np.array(test.labels(task)), np.asarray(test.codes('id'), dtype=np.int64)
+
+
+# fit and predict one classifier, returns its measurements
+def run(clf, Xtrain, Ytrain, Xtest, Ytest, codes):
+    start = time.perf_counter()
+    train_classifier(clf, Xtrain, Ytrain)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    Yguess = clf.predict(Xtest)
+    predict_seconds = time.perf_counter() - start
+
+    # the label of an author is the majority of its tweets
+    authors, rows = np.unique(codes, return_inverse=True)
+    guess, gold = majority_vote(authors, rows.ravel(), Yguess), majority_vote(authors, rows.ravel(), Ytest)
+    return {'fit_seconds': round(fit_seconds, 4), 'predict_seconds': round(predict_seconds, 4),
+            'tweet_accuracy': round(float(accuracy_score(Ytest, Yguess)), 4),
+            'author_accuracy': round(float(np.mean([guess[a] == gold[a] for a in authors])), 4)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the exact rbf SVC with kernel approximations.')
+    parser.add_argument('train_dir', help='train directory (with the tables of the driver)')
+    parser.add_argument('test_dir', help='test directory (with the tables of the driver)')
+    parser.add_argument('fout', help='output JSON file with the results')
+    parser.add_argument('--configs', nargs='+', default=[l + '-' + t for l, t in RBF_CONFIGS],
+                        help='LANG-TASK configurations (their a priori best C and gamma are used)')
+    parser.add_argument('--approx', nargs='+', choices=APPROX, default=APPROX, help='kernel approximations')
+    parser.add_argument('--components', type=int, nargs='+', default=[250, 1000, 4000], help='numbers of components')
+    parser.add_argument('--backend', default='liblinear', help='linear classifier of the approximations (liblinear, sgd)')
+    parser.add_argument('--holdout', type=int, default=0, help='test on every n-th train author instead of the test table')
+    parser.add_argument('--no-exact', dest='exact', action='store_false', help='skip the exact rbf SVC')
+    args = parser.parse_args()
+
+    results = []
+    for config in args.configs:
+        lang, task = config.split('-')
+        kernel, C, gamma = best_params(lang, task)
+        if kernel != 'rbf':
+            gamma = 0.1
+        Xtrain, Ytrain, Xtest, Ytest, codes = load(lang, task, args)
+        print()
+        print('%-8s %-6s C %s gamma %s: %d train, %d test tweets' % (lang, task, C, gamma, Xtrain.shape[0], Xtest.shape[0]))
+        print('%-22s %9s %10s %9s %9s' % ('classifier', 'fit_s', 'predict_s', 'tweet_acc', 'auth_acc'))
+
+        runs = [('exact', None, 0)] if args.exact else []
+        runs += [(a, a, n) for a in args.approx for n in args.components]
+        for name, approx, n in runs:
+            clf = build_classifier('rbf', C, gamma, args.backend, Xtrain.shape[0], approx, n)
+            r = dict({'lang': lang, 'task': task, 'C': C, 'gamma': gamma, 'approx': approx, 'components': n},
+                     **run(clf, Xtrain, Ytrain, Xtest, Ytest, codes))
+            results.append(r)
+            print('%-22s %9.3f %10.4f %9.4f %9.4f' % (name + (' ' + str(n) if n else ''), r['fit_seconds'],
+                                                     r['predict_seconds'], r['tweet_accuracy'], r['author_accuracy']))
+            sys.stdout.flush()
+
+    with open(args.fout, 'w') as f:
+        json.dump({'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': vars(args), 'results': results}, f, indent=1)
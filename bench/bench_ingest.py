@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# this script checks and benchmarks the ingestion of author XML files
+# against the previous implementation (os.listdir and ET.parse of one file after the other)
+# the author files of the input directory are copied several times to get a larger corpus
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.pipeline import NO_LABELS, SPECIAL_FILES, Record, author_files, read_authors, read_truth, write_records
+
+
+# input directory of author files
+idir = sys.argv[1]
+
+# number of copies of every author file
+copies = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+# numbers of workers to benchmark
+workers = [int(w) for w in sys.argv[3:]] or [1, 2, 4]
+
+
+# previous ingestion (reference): os.listdir, ET.parse of one file after the other,
+# both task files written tweet by tweet
+def dom_read(idir):
+    labels = read_truth(idir)
+    for f in [f for f in os.listdir(idir) if f not in SPECIAL_FILES]:
+        with open(idir + "/" + f) as af:
+            root = ET.parse(af).getroot()
+            auth_id = root.attrib["id"].strip()
+            for child in root:
+                text = child.text.replace('\n', '').strip()
+                if labels:
+                    yield Record(auth_id, text, text, tuple(labels[auth_id][:2]))
+                else:
+                    yield Record(auth_id, text, text, NO_LABELS)
+
+
+def dom_extract(idir, ofile1, ofile2):
+    with open(ofile1, 'w') as o1, open(ofile2, 'w') as o2:
+        o1.write('id\ttweet\tgender\n')
+        o2.write('id\ttweet\tage\n')
+        for r in dom_read(idir):
+            o1.write(r.id + '\t' + r.tweet + '\t' + r.labels[0] + '\n')
+            o2.write(r.id + '\t' + r.tweet + '\t' + r.labels[1] + '\n')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    corpus = os.path.join(tmp, 'corpus')
+    os.makedirs(corpus)
+    for f in author_files(idir):
+        for c in range(copies):
+            shutil.copy(os.path.join(idir, f), os.path.join(corpus, str(c) + '-' + f))
+
+    files = author_files(corpus)
+    ntweets = sum(1 for r in read_authors(corpus))
+    print('Corpus: ' + str(len(files)) + ' author files, ' + str(ntweets) + ' tweets')
+
+    # same tweets (and order) as before with every number of workers
+    reference = [(r.id, r.tweet) for r in dom_read(corpus)]
+    for w in workers:
+        assert [(r.id, r.tweet) for r in read_authors(corpus, workers=w)] == reference
+    print('Records identical for workers ' + str(workers))
+
+    out = (os.path.join(tmp, 'gender.txt'), os.path.join(tmp, 'age.txt'))
+    t = timed(dom_extract, corpus, *out)
+    print('previous (serial, tweet by tweet writes): %.3fs (%.0f files/s, %.0f tweets/s)' % (t, len(files) / t, ntweets / t))
+    for w in workers:
+        t = timed(write_records, read_authors(corpus, workers=w), out)
+        print('scandir + pool of %d worker(s), bulk writes: %.3fs (%.0f files/s, %.0f tweets/s)' %
+              (w, t, len(files) / t, ntweets / t))
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# this script benchmarks the whole pipeline on synthetic corpora (see gen_corpus.py) of growing size
+# every stage runs on its own (the records are materialized in between) and its wall time, its peak
+# Python memory (tracemalloc) and the peak RSS of the process are recorded (the RSS includes the
+# buffers allocated outside Python, e.g. by scipy, but neither covers the tokenizer processes):
+#   extract, clean, tokenize, stopwords (train and test), feats (fit on train, transform test),
+#   fit, predict (test) and eval (test accuracy and macro F-score of tweets and authors)
+# the results are written as JSON; with --compare the stages are checked against an earlier run
+#
+#   python3 bench/bench_pipeline.py results.json --authors 10 100 1000 --langs dutch
+#   python3 bench/bench_pipeline.py new.json --compare old.json
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+from sklearn.metrics import accuracy_score, f1_score
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOTDIR)
+from feats import FEATS, get_features
+from gen_corpus import generate
+from model import best_params, build_classifier, predict_authors, train_classifier
+from utils.instrument import peak_rss, reset_peak_rss
+from utils.pipeline import clean, filter_stopwords, read_authors, read_stopwords, tokenize
+from utils.table import Table, write_table
+from utils.tokenizer import TokenizerPool
+
+
+# version of the results layout
+RESULTS_VERSION = 2
+
+# stages, in the order they run
+STAGES = ['extract', 'clean', 'tokenize', 'stopwords', 'feats', 'fit', 'predict', 'eval']
+
+
+# run func and return its result with the wall time (s), the peak Python memory (MB) and the
+# peak RSS of the process (MB, since the start of func on Linux) it took
+def measure(trace, func, *args):
+    if trace:
+        tracemalloc.start()
+    reset_peak_rss()
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        seconds = time.perf_counter() - start
+        rss = peak_rss()
+        peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        if trace:
+            tracemalloc.stop()
+    return result, {'seconds': round(seconds, 4), 'peak_mb': round(peak / 2**20, 2), 'peak_rss_mb': round(rss, 1)}
+
+
+# add the measurements of a stage on several subsets (e.g. train and test)
+def add(stats, stage, m):
+    total = stats.setdefault(stage, {'seconds': 0, 'peak_mb': 0, 'peak_rss_mb': 0})
+    total['seconds'] = round(total['seconds'] + m['seconds'], 4)
+    total['peak_mb'] = max(total['peak_mb'], m['peak_mb'])
+    total['peak_rss_mb'] = max(total['peak_rss_mb'], m['peak_rss_mb'])
+
+
+# preprocess a corpus directory stage by stage, into a table
+def preprocess_stages(idir, fstopwords, tokenizer, table_path, stats, args):
+    records, m = measure(args.trace, lambda: list(read_authors(idir, workers=args.workers)))
+    add(stats, 'extract', m)
+    records, m = measure(args.trace, lambda: list(clean(records)))
+    add(stats, 'clean', m)
+    records, m = measure(args.trace, lambda: list(tokenize(records, tokenizer)))
+    add(stats, 'tokenize', m)
+    records, m = measure(args.trace, lambda: list(filter_stopwords(records, read_stopwords(fstopwords))))
+    add(stats, 'stopwords', m)
+    write_table(table_path, records)
+    return Table(table_path)
+
+
+# every run gets its own tokenizer pool: the corpora are seeded, so the authors of a smaller size are
+# also generated for a larger one, and a shared pool would take their tokenizations from its cache
+def bench(lang, n_authors, args):
+    task = args.task
+    stats = {}
+    with tempfile.TemporaryDirectory() as tmp, TokenizerPool(args.tweetnlp) as tokenizer:
+        generate(os.path.join(tmp, 'train'), lang, n_authors, args.tweets, args.seed)
+        generate(os.path.join(tmp, 'test'), lang, max(1, n_authors // args.test_ratio), args.tweets, args.seed + 1)
+
+        fstopwords = os.path.join(ROOTDIR, 'utils', 'stopwords', 'stopwords_' + lang + '.txt')
+        train = preprocess_stages(os.path.join(tmp, 'train'), fstopwords, tokenizer, os.path.join(tmp, 'train.table'),
+                                  stats, args)
+        test = preprocess_stages(os.path.join(tmp, 'test'), fstopwords, tokenizer, os.path.join(tmp, 'test.table'),
+                                 stats, args)
+
+        feats = dict(FEATS, hashing=args.hashing)
+        (Xtrain, vec), m = measure(args.trace, get_features, train, lang, None, feats, args.workers)
+        add(stats, 'feats', m)
+        (Xtest, _), m = measure(args.trace, get_features, test, lang, vec, feats, args.workers)
+        add(stats, 'feats', m)
+
+        Ytrain = train.labels(task)
+        params = best_params(lang, task)
+        if args.kernel == 'linear':
+            params = ('linear', params[1], 0)
+
+        def fit():
+            clf = build_classifier(*params, args.backend, Xtrain.shape[0])
+            train_classifier(clf, sparse.csr_matrix(Xtrain), Ytrain)
+            return clf
+        if len(set(Ytrain)) > 1:
+            clf, stats['fit'] = measure(args.trace, fit)
+            model = {'clf': clf, 'feats': feats}
+        else:
+            stats['fit'] = {'seconds': 0, 'peak_mb': 0, 'peak_rss_mb': 0}
+            model = {'clf': None, 'feats': feats, 'default': Ytrain[0]}
+
+        authors, codes = test.categories('id'), np.asarray(test.codes('id'), dtype=np.int64)
+        (Yguess, auth2label), stats['predict'] = measure(args.trace, predict_authors, model, Xtest, authors, codes)
+
+        def evaluate():
+            Ytest = test.labels(task)
+            gold = dict(zip(test.labels('id'), Ytest))
+            Agold, Aguess = [gold[a] for a in authors], [auth2label[a] for a in authors]
+            return {'tweet_accuracy': accuracy_score(Ytest, Yguess),
+                    'tweet_macro_f1': f1_score(Ytest, Yguess, average='macro'),
+                    'author_accuracy': accuracy_score(Agold, Aguess)}
+        scores, stats['eval'] = measure(args.trace, evaluate)
+
+    return {'lang': lang, 'task': task, 'authors': n_authors, 'train_tweets': len(train), 'test_tweets': len(test),
+            'features': int(Xtrain.shape[1]), 'params': list(params), 'stages': {s: stats[s] for s in STAGES},
+            'total_seconds': round(sum(stats[s]['seconds'] for s in STAGES), 4),
+            'scores': {k: round(float(v), 4) for k, v in scores.items()}}
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOTDIR, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+# print the stages whose time grew by more than the given factor since an earlier run
+def compare(results, fold, factor, args):
+    with open(fold) as f:
+        earlier = json.load(f)
+    if earlier.get('version') != RESULTS_VERSION:
+        print('Warning: ' + fold + ' has results version ' + str(earlier.get('version')) +
+              ' (version 1 shared the tokenizer cache between the runs), the times are not comparable')
+    if earlier['config'].get('trace') != args.trace:
+        print('Warning: ' + fold + ' was measured with trace ' + str(earlier['config'].get('trace')) +
+              ', the times are not comparable')
+    old = {(r['lang'], r['task'], r['authors']): r for r in earlier['results']}
+    regressions = 0
+    for r in results:
+        prev = old.get((r['lang'], r['task'], r['authors']))
+        if prev is None:
+            continue
+        for s in STAGES:
+            before, after = prev['stages'][s]['seconds'], r['stages'][s]['seconds']
+            ratio = after / before if before > 0 else 1.0
+            mark = ''
+            if ratio > factor and after - before > 0.01:
+                mark = '  <-- regression'
+                regressions += 1
+            print('%-8s %7d %-10s %9.3fs -> %9.3fs (x%.2f)%s' % (r['lang'], r['authors'], s, before, after, ratio, mark))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic corpora.')
+    parser.add_argument('fout', help='output JSON file with the results')
+    parser.add_argument('--authors', type=int, nargs='+', default=[10, 100, 1000],
+                        help='numbers of train authors per language (up to 100000)')
+    parser.add_argument('--langs', nargs='+', default=['english', 'spanish', 'italian', 'dutch'], help='languages')
+    parser.add_argument('--task', default='gender', help='classification task (gender, age)')
+    parser.add_argument('--tweets', type=int, default=100, help='number of tweets per author')
+    parser.add_argument('--test-ratio', type=int, default=4, help='the test set has authors / test-ratio authors')
+    parser.add_argument('--kernel', choices=['linear', 'best'], default='linear',
+                        help='linear kernel (with the C of the best parameters) or the best parameters (rbf SVCs do not scale)')
+    parser.add_argument('--backend', default='liblinear', help='classifier backend for linear kernels')
+    parser.add_argument('--hashing', type=int, default=0, help='number of hashed ngram features (0: vocabulary)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes for extraction and features')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the corpora')
+    parser.add_argument('--no-trace', dest='trace', action='store_false',
+                        help='do not trace the memory (tracemalloc slows down the Python stages)')
+    parser.add_argument('--compare', help='earlier results to compare the stage times with')
+    parser.add_argument('--factor', type=float, default=1.2, help='slowdown reported as a regression by --compare')
+    parser.add_argument('--tweetnlp', default=os.path.join(ROOTDIR, 'tools', 'ark-tweet-nlp-0.3.2'),
+                        help='CMU Tweet NLP directory')
+    args = parser.parse_args()
+
+    results = []
+    for lang in args.langs:
+        for n in args.authors:
+            r = bench(lang, n, args)
+            results.append(r)
+            print('%-8s %7d authors: ' % (lang, n) +
+                  ', '.join('%s %.3fs' % (s, r['stages'][s]['seconds']) for s in STAGES))
+
+    out = {'version': RESULTS_VERSION, 'git': git_version(), 'python': platform.python_version(),
+           'machine': platform.machine(), 'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'config': {k: v for k, v in vars(args).items() if k not in ('fout', 'compare')}, 'results': results}
+    with open(args.fout, 'w') as f:
+        json.dump(out, f, indent=1)
+    print('Results written into ' + args.fout)
+
+    if args.compare and compare(results, args.compare, args.factor, args):
+        sys.exit(1)
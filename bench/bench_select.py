@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+# this script reports the trade-off of the ngram selection (see selection.py) for every language and task:
+# the accuracy of the test tweets and authors, the number of features, the size of the model
+# (vectorizer and classifier) and the time to featurize and predict the test data, for every setting
+# (document frequency cut-off, chi2 or mutual information top k) next to the full vocabulary
+# the tables are those written by the driver (DIR/LANG/features/SUBSET-LANG.table)
+#
+#   python3 bench/bench_select.py [TRAIN DIR] [TEST DIR] select.json --langs dutch --k 1000 10000
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOTDIR)
+from feats import FEATS, get_features
+from model import best_params, build_classifier, predict_authors, train_classifier
+from selection import SCORES, keep_ngrams, ngram_count, prune_vectorizer, select_ngrams
+from utils.table import Table
+
+
+# settings to compare: (name, min_df, score, k), the full vocabulary first
+def settings(args):
+    out = [('full', 1, None, 0)]
+    for min_df in args.min_df:
+        if min_df > 1:
+            out.append(('df>=' + str(min_df), min_df, None, 0))
+        for score in args.scores:
+            for k in args.k:
+                out.append((score + ' ' + str(k) + (' df>=' + str(min_df) if min_df > 1 else ''), min_df, score, k))
+    return out
+
+
+def bench(lang, task, train, test, args):
+    feats = dict(FEATS)
+    Xtrain, vec = get_features(train, lang, None, feats)
+    Ytrain = train.labels(task)
+    if len(set(Ytrain)) < 2:
+        print('only one label, nothing to select')
+        return []
+    n_ngrams = ngram_count(vec['ngrams'])
+
+    params = best_params(lang, task)
+    if args.kernel == 'linear':
+        params = ('linear', params[1], 0)
+
+    Ytest = test.labels(task)
+    authors, codes = test.categories('id'), np.asarray(test.codes('id'), dtype=np.int64)
+    gold = dict(zip(test.labels('id'), Ytest))
+
+    results = []
+    for name, min_df, score, k in settings(args):
+        if name == 'full':
+            X, v = Xtrain, vec
+        else:
+            keep = select_ngrams(Xtrain, Ytrain, n_ngrams, min_df, 1.0, score, k)
+            X, v = keep_ngrams(Xtrain, keep, n_ngrams), dict(vec, ngrams=prune_vectorizer(vec['ngrams'], keep))
+
+        start = time.perf_counter()
+        clf = build_classifier(*params, args.backend, X.shape[0])
+        train_classifier(clf, X, Ytrain)
+        fit_seconds = time.perf_counter() - start
+
+        # the test data is featurized with the (pruned) vectorizer, as in predict.py
+        model = {'clf': clf, 'feats': feats}
+        start = time.perf_counter()
+        Xtest, _ = get_features(test, lang, v, feats)
+        feats_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        Yguess, auth2label = predict_authors(model, Xtest, authors, codes)
+        predict_seconds = time.perf_counter() - start
+
+        results.append({'lang': lang, 'task': task, 'setting': name, 'features': int(X.shape[1]),
+                        'model_kb': round(len(pickle.dumps((v, clf), protocol=pickle.HIGHEST_PROTOCOL)) / 1024, 1),
+                        'fit_seconds': round(fit_seconds, 4), 'feats_seconds': round(feats_seconds, 4),
+                        'predict_seconds': round(predict_seconds, 4),
+                        'predict_us_per_tweet': round(1e6 * predict_seconds / max(len(test), 1), 2),
+                        'tweet_accuracy': round(float(accuracy_score(Ytest, Yguess)), 4),
+                        'author_accuracy': round(float(accuracy_score([gold[a] for a in authors],
+                                                                      [auth2label[a] for a in authors])), 4)})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report accuracy, features, model size and latency of the ngram selection.')
+    parser.add_argument('train_dir', help='train directory (with the tables of the driver)')
+    parser.add_argument('test_dir', help='test directory (with the tables of the driver)')
+    parser.add_argument('fout', help='output JSON file with the results')
+    parser.add_argument('--langs', nargs='+', default=['english', 'spanish', 'italian', 'dutch'], help='languages')
+    parser.add_argument('--tasks', nargs='+', default=['gender', 'age'], help='classification tasks')
+    parser.add_argument('--k', type=int, nargs='+', default=[1000, 5000, 20000], help='numbers of ngrams to keep')
+    parser.add_argument('--scores', nargs='+', choices=SCORES, default=SCORES, help='scores of the top k selection')
+    parser.add_argument('--min-df', type=int, nargs='+', default=[1, 2], help='document frequency cut-offs')
+    parser.add_argument('--kernel', choices=['linear', 'best'], default='linear',
+                        help='linear kernel (with the C of the best parameters) or the best parameters')
+    parser.add_argument('--backend', default='svc', help='classifier backend for linear kernels')
+    args = parser.parse_args()
+
+    results = []
+    for lang in args.langs:
+        train = Table(os.path.join(args.train_dir, lang, 'features', 'train-' + lang + '.table'))
+        test = Table(os.path.join(args.test_dir, lang, 'features', 'test-' + lang + '.table'))
+        for task in args.tasks:
+            print()
+            print('%-8s %-6s %-20s %9s %9s %8s %10s %10s %9s %9s' % (lang, task, 'setting', 'features', 'model_kb',
+                                                                   'fit_s', 'feats_s', 'predict_s', 'tweet_acc',
+                                                                   'auth_acc'))
+            for r in bench(lang, task, train, test, args):
+                results.append(r)
+                print('%-15s %-20s %9d %9.1f %8.3f %10.4f %10.4f %9.4f %9.4f' % (
+                    '', r['setting'], r['features'], r['model_kb'], r['fit_seconds'], r['feats_seconds'],
+                    r['predict_seconds'], r['tweet_accuracy'], r['author_accuracy']))
+                sys.stdout.flush()
+
+    with open(args.fout, 'w') as f:
+        json.dump({'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': vars(args), 'results': results}, f, indent=1)
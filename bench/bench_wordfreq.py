@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# this script benchmarks the word frequency quartile features
+# it compares the per-tweet loop (word_frequency for every token, statistics.mean)
+# with the vectorized computation over the cached frequency table
+
+import os
+import sys
+import time
+import tempfile
+import statistics as stat
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from freqtable import quartile_freqs, token_freq
+
+
+# input tokenized file (id tweet class)
+ftoken = sys.argv[1]
+
+# language of the file
+lang = sys.argv[2]
+
+
+# per-tweet loop (reference)
+def loop_freqs(tweets, lang):
+    word_freqs = []
+    for t in tweets:
+        freq_list = sorted([token_freq(tok, lang) for tok in t], reverse=True)
+        freq_list[-1] = freq_list[-1] + 0.01
+        Q1 = freq_list[:max(1, int(len(freq_list)*0.25))]
+        Q2 = freq_list[int(len(freq_list)*0.25):int(len(freq_list)*0.5)] or [0]
+        Q3 = freq_list[int(len(freq_list)*0.5):int(len(freq_list)*0.75)] or [0]
+        Q4 = freq_list[int(len(freq_list)*0.75):]
+        word_freqs.append([stat.mean(Q1), stat.mean(Q2), stat.mean(Q3), stat.mean(Q4)])
+    return np.array(word_freqs)
+
+
+with open(ftoken, 'r', encoding='utf-8') as fi:
+    next(fi)
+    # the loop fails on tweets without tokens, these are left out
+    tweets = [line.split('\t')[1].split() for line in fi]
+    tweets = [t for t in tweets if t]
+
+start = time.perf_counter()
+ref = loop_freqs(tweets, lang)
+t_loop = time.perf_counter() - start
+
+with tempfile.TemporaryDirectory() as freqdir:
+    start = time.perf_counter()
+    new = quartile_freqs(tweets, lang, freqdir)
+    t_cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = quartile_freqs(tweets, lang, freqdir)
+    t_warm = time.perf_counter() - start
+
+print('tweets:', len(tweets), 'tokens:', sum(len(t) for t in tweets))
+print('loop:             {:8.3f} s'.format(t_loop))
+print('table (building): {:8.3f} s'.format(t_cold))
+print('table (cached):   {:8.3f} s'.format(t_warm))
+print('speed-up (cached): {:.1f}x'.format(t_loop / t_warm))
+print('max abs difference:', np.max(np.abs(ref - new)))
+print('identical values:', np.mean(ref == new))
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# this script generates a synthetic corpus in the PAN author profiling format:
+# a directory per language with an XML file per author and a truth.txt file
+# (id:::gender:::age:::five personality scores), as read by dir_extract.py and the pipeline
+#
+# the tweets are sampled from the words of the sample data of the language (data/train),
+# every gender and age class prefers some of the words, so that the classifiers have something to learn
+#
+#   python3 bench/gen_corpus.py [OUTPUT DIR] [AUTHORS] [LANG ...] [--tweets N] [--seed N]
+
+import os
+import sys
+import zlib
+import uuid
+import argparse
+
+import numpy as np
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOTDIR)
+from freqtable import LANGS
+from utils.pipeline import read_authors
+
+
+# labels of every language (the Italian and Dutch data has no age classes)
+GENDERS = ['F', 'M']
+AGES = {
+    'english': ['18-24', '25-34', '35-49', '50-XX'],
+    'spanish': ['18-24', '25-34', '35-49', '50-XX'],
+    'italian': ['XX-XX'],
+    'dutch': ['XX-XX'],
+}
+
+# number of words of a tweet, and the share of tweets with a mention, url, hashtag and emoticon
+TWEET_WORDS = (4, 20)
+SHARES = {'mention': 0.3, 'url': 0.2, 'hashtag': 0.15, 'emoticon': 0.1}
+EMOTICONS = [':)', ':(', ':D', ';)', ':P', '<3', ':-)']
+
+# number of words preferred by every class, and how much more often they are used
+CLASS_WORDS = 200
+CLASS_BOOST = 20.0
+
+# words used when the language has no sample data
+FALLBACK_WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+                  'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+
+
+# words of the sample tweets of a language and their counts (mentions and urls are added separately)
+def sample_words(lang):
+    idir = os.path.join(ROOTDIR, 'data', 'train', lang)
+    counts = {}
+    if os.path.isdir(idir):
+        for r in read_authors(idir):
+            for w in r.tweet.split():
+                if w.startswith(('@', 'http', '#')) or ']]>' in w:
+                    continue
+                counts[w] = counts.get(w, 0) + 1
+    if not counts:
+        counts = {w: 1 for w in FALLBACK_WORDS}
+    return list(counts), np.array(list(counts.values()), dtype=np.float64)
+
+
+# a tweet of words drawn from the cumulative distribution cdf
+def make_tweet(rng, words, cdf):
+    idx = np.searchsorted(cdf, rng.random(rng.integers(*TWEET_WORDS)) * cdf[-1])
+    tokens = [words[i] for i in idx]
+    if rng.random() < SHARES['mention']:
+        tokens.insert(0, '@username')
+    if rng.random() < SHARES['hashtag']:
+        tokens.append('#' + words[idx[0]].strip('.,!?'))
+    if rng.random() < SHARES['emoticon']:
+        tokens.append(EMOTICONS[rng.integers(len(EMOTICONS))])
+    if rng.random() < SHARES['url']:
+        tokens.append('http://t.co/' + uuid.UUID(int=int(rng.integers(2**62))).hex[-10:])
+    return ' '.join(tokens)
+
+
+def author_xml(auth_id, code, tweets):
+    docs = ''.join('\t<document><![CDATA[' + t + ']]></document>\n' for t in tweets)
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="no"?><author id="' + auth_id + '" lang="' + code + '">\n' +
+            docs + '</author>\n')
+
+
+# write n_authors synthetic authors of a language into odir (created if needed)
+# with the same seed the same corpus is generated
+def generate(odir, lang, n_authors, tweets=100, seed=0):
+    words, counts = sample_words(lang)
+
+    # a word distribution per gender and age class, the same for every corpus of the language
+    # (so that a train and a test corpus generated with different seeds match)
+    class_rng = np.random.default_rng(zlib.crc32(lang.encode('utf-8')))
+    cdfs = {}
+    for g in GENDERS:
+        for a in AGES[lang]:
+            p = counts.copy()
+            p[class_rng.choice(len(words), min(CLASS_WORDS, len(words)), replace=False)] *= CLASS_BOOST
+            cdfs[g, a] = np.cumsum(p)
+
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(odir, exist_ok=True)
+    with open(os.path.join(odir, 'truth.txt'), 'w') as truth:
+        for _ in range(n_authors):
+            auth_id = str(uuid.UUID(int=int(rng.integers(2**63)) << 64 | int(rng.integers(2**63)), version=4))
+            gender = GENDERS[rng.integers(len(GENDERS))]
+            age = AGES[lang][rng.integers(len(AGES[lang]))]
+            with open(os.path.join(odir, auth_id + '.xml'), 'w', encoding='utf-8') as f:
+                f.write(author_xml(auth_id, LANGS[lang], [make_tweet(rng, words, cdfs[gender, age])
+                                                          for _ in range(tweets)]))
+            scores = ':::'.join('%.1f' % s for s in rng.integers(-5, 6, 5) / 10)
+            truth.write(auth_id + ':::' + gender + ':::' + age + ':::' + scores + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic PAN-style author profiling corpus.')
+    parser.add_argument('odir', help='output directory (a subdirectory per language)')
+    parser.add_argument('authors', type=int, help='number of authors per language')
+    parser.add_argument('langs', nargs='*', default=list(LANGS), help='languages (default: all)')
+    parser.add_argument('--tweets', type=int, default=100, help='number of tweets per author')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    for lang in args.langs:
+        generate(os.path.join(args.odir, lang), lang, args.authors, args.tweets, args.seed)
+        print('Generated ' + str(args.authors) + ' ' + lang + ' authors in ' + os.path.join(args.odir, lang))
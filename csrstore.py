@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# this script stores a sparse feature matrix (CSR) on disk, written in blocks of rows
+# a store is a directory with the values (data.bin), column indices (indices.bin),
+# row pointers (indptr.npy) and the shape (meta.json); it is memory-mapped when read,
+# so a matrix larger than memory can be used as a whole or iterated over in blocks of rows
+
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+
+# version of the store layout, increase it when it changes
+STORE_VERSION = 1
+
+# largest number of values with 32-bit indices (what scipy uses for smaller matrices)
+INT32_MAX = np.iinfo(np.int32).max
+
+
+# write the row blocks of a matrix with n_cols columns into a store
+# (the store is written next to its final path and renamed when it is closed)
+class CSRWriter:
+
+    def __init__(self, fstore, n_cols, dtype=np.float64):
+        self.fstore = fstore
+        storedir = os.path.dirname(os.path.abspath(fstore))
+        os.makedirs(storedir, exist_ok=True)
+        self.ftmp = tempfile.mkdtemp(dir=storedir, prefix=os.path.basename(fstore) + '.', suffix='.tmp')
+        self.n_cols = n_cols
+        self.dtype = np.dtype(dtype)
+        self.data = open(os.path.join(self.ftmp, 'data.bin'), 'wb')
+        self.indices = open(os.path.join(self.ftmp, 'indices.bin'), 'wb')
+        self.indptr = [np.zeros(1, dtype=np.int64)]
+        self.rows = 0
+        self.nnz = 0
+
+    def append(self, block):
+        block = sparse.csr_matrix(block)
+        if block.shape[1] != self.n_cols:
+            raise ValueError('Block with ' + str(block.shape[1]) + ' columns, the store has ' + str(self.n_cols))
+        block.sum_duplicates()
+        self.data.write(block.data.astype(self.dtype, copy=False).tobytes())
+        self.indices.write(block.indices.astype(np.int32, copy=False).tobytes())
+        self.indptr.append(block.indptr[1:].astype(np.int64) + self.nnz)
+        self.rows += block.shape[0]
+        self.nnz += block.nnz
+
+    def close(self):
+        self.data.close()
+        self.indices.close()
+        if self.nnz > INT32_MAX:
+            shutil.rmtree(self.ftmp, ignore_errors=True)
+            raise ValueError('The store holds more than 2^31 values, split the data')
+        np.save(os.path.join(self.ftmp, 'indptr.npy'), np.concatenate(self.indptr).astype(np.int32))
+        meta = {'version': STORE_VERSION, 'shape': [self.rows, self.n_cols], 'nnz': self.nnz, 'dtype': self.dtype.str}
+        with open(os.path.join(self.ftmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.fstore, ignore_errors=True)
+        os.replace(self.ftmp, self.fstore)
+        return CSRStore(self.fstore)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.data.close()
+            self.indices.close()
+            shutil.rmtree(self.ftmp, ignore_errors=True)
+
+
+# a store written by CSRWriter
+class CSRStore:
+
+    def __init__(self, fstore):
+        self.path = fstore
+        with open(os.path.join(fstore, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError('Store ' + fstore + ' has version ' + str(meta.get('version')) +
+                             ', expected ' + str(STORE_VERSION))
+        self.shape = tuple(meta['shape'])
+        self.nnz = meta['nnz']
+        self.dtype = np.dtype(meta['dtype'])
+        self.indptr = np.load(os.path.join(fstore, 'indptr.npy'), mmap_mode='r')
+        if self.nnz:
+            self.data = np.memmap(os.path.join(fstore, 'data.bin'), dtype=self.dtype, mode='r')
+            self.indices = np.memmap(os.path.join(fstore, 'indices.bin'), dtype=np.int32, mode='r')
+        else:
+            self.data = np.zeros(0, dtype=self.dtype)
+            self.indices = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    # the whole matrix, its arrays are the memory-mapped files (nothing is read until it is used)
+    def matrix(self):
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape, copy=False)
+
+    # rows a to b (read into memory)
+    def rows(self, a, b):
+        ptr = np.array(self.indptr[a:b + 1])
+        return sparse.csr_matrix((np.array(self.data[ptr[0]:ptr[-1]]), np.array(self.indices[ptr[0]:ptr[-1]]),
+                                  ptr - ptr[0]), shape=(b - a, self.shape[1]))
+
+    # blocks of (at most) size rows
+    def blocks(self, size):
+        for a in range(0, self.shape[0], size):
+            yield self.rows(a, min(a + size, self.shape[0]))
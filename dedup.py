@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+# this script finds the duplicated tweets of a table (retweets, copied promo tweets), so that every
+# distinct text is featurized and predicted once
+# the key of a tweet is a hash of its text as the features see it: the tokenized text without urls,
+# which is already normalized by the preprocessing (lowercased, mentions and urls replaced, repeated
+# characters squeezed), so the copies of a text share a feature row across authors; within an author
+# they are collapsed into one training row weighted by their count (see train_classifier in model.py)
+# and the predictions of the distinct texts are expanded back to every tweet
+
+import hashlib
+
+import numpy as np
+
+from feats import feature_texts, pool_authors
+
+
+# number of tweets read from the table at once
+READ_BATCH = 10000
+
+
+# hash of a text (the texts themselves are not kept)
+def text_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+# the duplicates of a list of texts (any iterable), codes are the integer author of every text
+class Duplicates:
+
+    def __init__(self, texts, codes):
+        index = {}
+        # distinct text of every row, the texts are numbered in the order of their first row
+        self.texts = np.fromiter((index.setdefault(text_key(t), len(index)) for t in texts), dtype=np.int64)
+        _, self.first = np.unique(self.texts, return_index=True) # first row of every distinct text
+        self.copies = np.bincount(self.texts, minlength=len(self.first)) # rows of every distinct text
+
+        # groups of the rows of an author with the same text, in the order of their first row
+        keys = np.asarray(codes, dtype=np.int64) * len(self.first) + self.texts
+        _, first, inv, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.groups = rank[inv.ravel()] # group of every row
+        self.group_rows = first[order] # first row of every group
+        self.group_texts = self.texts[self.group_rows] # distinct text of every group
+        self.weights = counts[order] # rows of every group
+
+    def __len__(self):
+        return len(self.texts)
+
+    # rows of the groups, from the matrix of the distinct texts
+    def group_matrix(self, X):
+        return X[self.group_texts]
+
+    # labels of every row from the labels of the distinct texts
+    def expand(self, Y):
+        return np.asarray(Y)[self.texts]
+
+    # pool_authors on the groups, weighted by their rows (the same as pooling all the rows)
+    def pool(self, X, codes, n_authors, how='mean'):
+        return pool_authors(self.group_matrix(X), np.asarray(codes)[self.group_rows], n_authors, how, self.weights)
+
+
+# the duplicated tweets of a table (see utils/table.py), read in batches
+def find_duplicates(table):
+    texts = (t for batch in table.text_batches('tok', READ_BATCH) for t in feature_texts(batch))
+    return Duplicates(texts, table.codes('id'))
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+# this script runs the whole pipeline (preprocessing, fitting and evaluation)
+# independent (subset, language) jobs are run in parallel threads (the fitting and evaluation
+# jobs are scripts run as subprocesses)
+
+import io
+import os
+import sys
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.pipeline import author_files, preprocess
+from utils.cache import EntryCache
+from utils.instrument import Metrics
+from utils.table import write_table
+from utils.tokenizer import TokenizerPool
+
+
+ROOTDIR = os.path.dirname(os.path.abspath(__file__))
+UTILSDIR = os.path.join(ROOTDIR, 'utils')
+STOPWORDSDIR = os.path.join(UTILSDIR, 'stopwords')
+CACHEDIR = os.path.join(ROOTDIR, 'cache')
+
+
+# run a command and return its output (the output of parallel jobs is printed when they finish)
+def run(cmd, cwd=None):
+    proc = subprocess.run(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError('Command failed: ' + ' '.join(cmd) + '\n' + proc.stdout)
+    return proc.stdout
+
+
+# write the data of a subset and language into a table (original and tokenized tweets, labels)
+# the texts are streamed through all preprocessing stages at once, so they are tokenized only once
+# (runs in a thread of the driver, sharing the pool of tokenizer processes with the other languages)
+# author files preprocessed in earlier runs are taken from the cache, the others are parsed
+# by the pool of workers shared by all languages (parse_pool, None parses in the thread);
+# the stages are measured into the metrics file (if any)
+def prepare(d, dn, l, tokenizer, cachedir, workers, fmetrics, parse_pool=None):
+    featsdir = os.path.join(d, l, 'features')
+    shutil.rmtree(featsdir, ignore_errors=True)
+    os.makedirs(featsdir)
+
+    log = io.StringIO()
+    if author_files(os.path.join(d, l)):
+        metrics = Metrics({'script': 'driver', 'lang': l, 'subset': dn}, fmetrics, log=log)
+        fstopwords = os.path.join(STOPWORDSDIR, 'stopwords_' + l + '.txt')
+        cache = EntryCache(cachedir) if cachedir else None
+        with metrics.stage('preprocess'):
+            records = preprocess(os.path.join(d, l), fstopwords, tokenizer, cache, workers, metrics, parse_pool)
+            write_table(table_path(d, dn, l), records)
+    return log.getvalue() + '[INFO] Tokenized ' + l + ' ' + dn + ' files\n'
+
+
+# table of the preprocessed data of a subset and language
+def table_path(d, dn, l):
+    return os.path.join(d, l, 'features', dn + '-' + l + '.table')
+
+
+# optional arguments of the ngram selection of fit.py
+def selection_args(min_df, max_df, select, k):
+    return (['--min-df', str(min_df), '--max-df', str(max_df)] +
+            (['--select', select, '--k', str(k)] if select else []))
+
+
+# optional arguments of the stage measurements of a script
+def metrics_args(fmetrics, profile):
+    return (['--metrics', fmetrics] if fmetrics else []) + (['--profile', profile] if profile else [])
+
+
+# (the data is featurized once for all tasks; fit_args are further options of fit.py, e.g. the ngram selection)
+def fit(data, names, l, tasks, optimize, hashing, backend, cachedir, fmetrics, profile, chunk_size=0, workers=1,
+        train_pred=True, fit_args=()):
+    (d0, d1), (dn0, dn1) = data, names
+    return run([sys.executable, os.path.join(ROOTDIR, 'fit.py'), l, ','.join(tasks),
+                table_path(d0, dn0, l),
+                table_path(d1, dn1, l),
+                str(int(optimize)),
+                os.path.join(d0, l, 'results', dn0 + '-' + l + '-{task}.pred'),
+                os.path.join(d1, l, 'results', dn1 + '-' + l + '-{task}.pred'),
+                os.path.join(d0, l, 'truth_pred.txt'),
+                os.path.join(d1, l, 'truth_pred.txt'),
+                '--hashing', str(hashing), '--backend', backend, '--cache', cachedir,
+                '--chunk-size', str(chunk_size), '--workers', str(workers)] +
+               ([] if train_pred else ['--no-train-pred']) + list(fit_args) + metrics_args(fmetrics, profile))
+
+
+# evaluate prediction results
+def evaluate(data, names, i, l, t, fmetrics):
+    d, dn = data[i], names[i]
+    return run([sys.executable, os.path.join(ROOTDIR, 'eval.py'),
+                table_path(d, dn, l), dn, t,
+                table_path(data[0], names[0], l),
+                os.path.join(d, l, 'results', dn + '-' + l + '-' + t + '.pred')] + ([fmetrics] if fmetrics else []))
+
+
+# build the dependency graph: { job : (function, arguments, dependencies, executor) }
+# preprocessing runs in threads (sharing the tokenizers), fitting and evaluation run commands
+def build_jobs(data, names, langs, tasks, optimize, hashing, backend, cachedir, tokenizer, workers,
+               fmetrics=None, profile=None, chunk_size=0, fit_workers=1, train_pred=True, fit_args=(),
+               parse_pool=None):
+    jobs = {}
+    for l in langs:
+        for d, dn in zip(data, names):
+            jobs[('prepare', dn, l)] = (prepare, (d, dn, l, tokenizer, cachedir, workers, fmetrics, parse_pool), [],
+                                        'thread')
+
+        # all tasks of a language are fitted by one job, sharing the features
+        deps = [('prepare', dn, l) for dn in names]
+        jobs[('fit', l)] = (fit, (data, names, l, tasks, optimize, hashing, backend, cachedir, fmetrics, profile,
+                                  chunk_size, fit_workers, train_pred, fit_args), deps, 'command')
+
+        # the train data is only evaluated when it was predicted
+        for t in tasks:
+            for i, dn in enumerate(names):
+                if i == 0 and not train_pred:
+                    continue
+                jobs[('eval', dn, l, t)] = (evaluate, (data, names, i, l, t, fmetrics), [('fit', l)], 'command')
+    return jobs
+
+
+# run the jobs as soon as their dependencies are done, on a pool of threads for every kind of job
+# (the commands wait for their subprocess without the GIL; no process is forked from the driver,
+# whose threads may hold locks, e.g. those of the tokenizer pool)
+def run_jobs(jobs, workers):
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as threads, ThreadPoolExecutor(max_workers=workers) as commands:
+        pools = {'thread': threads, 'command': commands}
+        while len(done) < len(jobs):
+            for job, (func, fargs, deps, executor) in jobs.items():
+                if job not in done and job not in running.values() and all(dep in done for dep in deps):
+                    running[pools[executor].submit(func, *fargs)] = job
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    sys.exit('[ERROR] Failed ' + ' '.join(job) + ': ' + str(future.exception()))
+
+                print('[INFO] Finished ' + ' '.join(job))
+                print(future.result(), end='')
+                sys.stdout.flush()
+                done.add(job)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the author profiling pipeline.')
+    parser.add_argument('train_dir', help='train directory (full path)')
+    parser.add_argument('test_dir', help='test directory (full path)')
+    parser.add_argument('--langs', nargs='+', default=['italian', 'dutch'],
+                        help='languages to fit and test (english, spanish, italian, dutch)')
+    parser.add_argument('--tasks', nargs='+', default=['gender', 'age'], help='classification tasks (gender, age)')
+    parser.add_argument('--optimize', type=int, default=0, help='perform svm parameter search (0, 1)')
+    parser.add_argument('--hashing', type=int, default=0,
+                        help='hash the ngrams into this number of features (0 fits a vocabulary)')
+    parser.add_argument('--backend', default='svc', help='classifier backend for linear kernels (svc, liblinear, sgd)')
+    parser.add_argument('--cache', default=CACHEDIR,
+                        help='directory of the cache of preprocessed author files and features (empty: no cache)')
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help='featurize and predict out of core in chunks of this many tweets (0: all in memory)')
+    parser.add_argument('--fit-workers', type=int, default=1,
+                        help='number of processes of every fit job for the parameter search and prediction')
+    parser.add_argument('--min-df', type=int, default=1, help='keep the ngrams of at least this many train tweets')
+    parser.add_argument('--max-df', type=float, default=1.0, help='keep the ngrams of at most this fraction of train tweets')
+    parser.add_argument('--select', choices=['chi2', 'mi'], help='keep the top --k ngrams by this score on the train labels')
+    parser.add_argument('--k', type=int, default=0, help='number of ngrams kept by --select')
+    parser.add_argument('--approx', choices=['nystroem', 'rff'],
+                        help='train rbf kernels as a linear classifier on a kernel approximation')
+    parser.add_argument('--components', type=int, default=1000, help='number of components of --approx')
+    parser.add_argument('--dedup', action='store_true',
+                        help='featurize every distinct text once and train on the texts of every author weighted by their copies')
+    parser.add_argument('--no-train-pred', action='store_true', help='do not predict and evaluate the train data')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of parallel jobs')
+    parser.add_argument('--metrics', help='JSON lines file the stage measurements of all jobs are appended to')
+    parser.add_argument('--profile', help='directory for cProfile output of the stages of the fit jobs')
+    parser.add_argument('--tokenizers', type=int, default=2, help='number of CMU Tweet NLP processes')
+    parser.add_argument('--tweetnlp', default=os.path.join(ROOTDIR, 'tools', 'ark-tweet-nlp-0.3.2'),
+                        help='CMU Tweet NLP directory')
+    args = parser.parse_args()
+
+    data = (args.train_dir, args.test_dir)
+    names = ('train', 'test')
+
+    # remove results of previous runs
+    for l in args.langs:
+        for d in data:
+            if os.path.isfile(os.path.join(d, l, 'truth_pred.txt')):
+                os.remove(os.path.join(d, l, 'truth_pred.txt'))
+            shutil.rmtree(os.path.join(d, l, 'results'), ignore_errors=True)
+            os.makedirs(os.path.join(d, l, 'results'))
+
+    # one pool of tokenizer processes and one of parsing processes for all languages
+    # (the parsers are started by a fork server, not forked from the threads of the driver)
+    parse_pool = None
+    if args.workers > 1:
+        parse_pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('forkserver'))
+    with TokenizerPool(args.tweetnlp, args.tokenizers) as tokenizer:
+        jobs = build_jobs(data, names, args.langs, args.tasks, args.optimize, args.hashing, args.backend,
+                          args.cache, tokenizer, args.workers, args.metrics, args.profile, args.chunk_size,
+                          args.fit_workers, not args.no_train_pred,
+                          selection_args(args.min_df, args.max_df, args.select, args.k) +
+                          (['--approx', args.approx, '--components', str(args.components)] if args.approx else []) +
+                          (['--dedup'] if args.dedup else []), parse_pool)
+        try:
+            run_jobs(jobs, args.workers)
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown(cancel_futures=True)
@@ -6,7 +6,10 @@ import numpy as np
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 from sklearn.metrics import confusion_matrix, f1_score
 
-# input gold classes (id tweet class)
+from utils.instrument import Metrics
+from utils.table import Table
+
+# input table with the gold classes
 fgold = sys.argv[1]
 
 # subset of the data ('train' or 'test')
@@ -15,30 +18,29 @@ subset = sys.argv[2]
 # classification task ('gender' or 'age')
 task = sys.argv[3]
 
-# input training classes (id tweet class)
+# input table with the training classes
 ftrain = sys.argv[4]
 
 # input predicted classes (id tweet prediction)
 fpred = sys.argv[5]
 
+# optional JSON lines file the stage measurements are appended to
+metrics = Metrics({'script': 'eval', 'task': task, 'subset': subset}, sys.argv[6] if len(sys.argv) > 6 else None)
+
 
-# retrieve gold labels
-Ytest = []
-with open(fgold, 'r') as igold:
-    for line in igold.readlines()[1:]:
-        Ytest.append(line.split()[-1])
+with metrics.stage('read') as s:
+    # retrieve gold labels
+    Ytest = Table(fgold).labels(task)
 
-# retrieve predicted labels
-Yguess = []
-with open(fpred, 'r') as ipred:
-    for line in ipred.readlines()[1:]:
-        Yguess.append(line.split()[-1])
+    # retrieve predicted labels
+    Yguess = []
+    with open(fpred, 'r') as ipred:
+        for line in ipred.readlines()[1:]:
+            Yguess.append(line.split()[-1])
 
-# retrieve training labels
-Ytrain = []
-with open(ftrain, 'r') as itrain:
-    for line in itrain.readlines()[1:]:
-        Ytrain.append(line.split()[-1])
+    # retrieve training labels
+    Ytrain = Table(ftrain).labels(task)
+    s.rows(len(Ytest))
 
 
 # print header
@@ -69,7 +71,7 @@ print("Average F-score (macro):", np.mean(PRF[:][2]))
 print("---------------------------------------------------")
 
 # print out the confusion matrix
-conf = confusion_matrix(Ytest, Yguess, lab)
+conf = confusion_matrix(Ytest, Yguess, labels=lab)
 
 print("Confusion matrix:")
 print("{:>34s}".format("PREDICTION"))
@@ -1,162 +1,386 @@
 #!/usr/bin/python3
 # this script uses the tokenized files to extract features
 
+import os
 import re
 import sys
 import numpy as np
-import statistics as stat
 import pickle
-
-from wordfreq import word_frequency
+import tempfile
 
 from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
 
-from nltk.tag import pos_tag
-
-
-# obtain features using a tokenized file, the language and a vectorizer object
-def get_features(ftoken, lang, vec):
+from scipy import sparse
 
-    # map language to lang_code
-    langs = {'english':'en', 'spanish':'es', 'italian':'it', 'dutch':'nl'}
+from csrstore import CSRWriter
+from freqtable import quartile_freqs_ids
+from hashvec import HashingTfidfVectorizer
+from postags import tag_strings
+from scanner import SURFACE, surface_counts
+from tokenids import TokenTfidfVectorizer, encode
+from utils.instrument import Metrics
 
-    print()
-    print('Reading input ' + ftoken + '...')
 
-    tweets = []
-    with open(ftoken, 'r', encoding='utf-8') as fi:
-        next(fi) # ignore header
-        # Just extract the Tweet texts
-        for line in fi:
-            data = line.strip().split('\t')
-            # removing urls
-            text = re.sub(r'\shttps?://\S+', '', data[1])
-            tweets.append(text)
+# additional features stacked in front of the ngram features (default config)
+# the config is stored with trained models, so that prediction uses the same columns
+FEATS = {
+    'handles': True,
+    'hashtags': True,
+    'emoticons': True,
+    'contractions': False, # English only, 0 for other languages
+    'word_freqs': False,
+    'pos': False, # English only
+    'hashing': 0, # number of hashed ngram features, 0 fits a vocabulary instead
+    'token_ids': True, # vocabulary of the ngrams of all whitespace tokens (as ids), False uses TfidfVectorizer's
+    'authors': None, # pool the tweets of every author into one row ('sum' or 'mean'), None classifies tweets
+}
 
-    '''
-    Get basic ngram features
-    '''
-    print('Getting Ngram features...')
-    if vec==None:
-        #vec = CountVectorizer(ngram_range=(1,3)) # withou Tfidf weighting
-        print("Creating tfidf vectorizer")
-        vec = TfidfVectorizer(ngram_range=(1,2))# including Tfidf weighting
-        matrix = vec.fit_transform(tweets)
-    else:
-        print("Using existing tfidf vectorizer")
-        matrix = vec.transform(tweets)
 
+# pool the rows (tweets) of every author into one row by summing or averaging them
+# (weights counts every row as that many tweets, see dedup.py)
+def pool_authors(X, codes, n_authors, how='mean', weights=None):
+    w = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+    P = sparse.csr_matrix((w, (codes, np.arange(len(codes)))), shape=(n_authors, len(codes)))
+    if how == 'mean':
+        P = sparse.diags(1.0 / np.maximum(np.bincount(codes, weights=w, minlength=n_authors), 1)) @ P
+    return sparse.csr_matrix(P @ X)
 
-    # feat_mat is matrix of shape num_documents x num_ngram_features
-    feat_mat = matrix.toarray()
 
-    '''
-    Get additional features (partly language-dependent)
-    '''
-    print('Getting other features...')
+# label of every author (the label of its first tweet, all its tweets share it)
+def author_labels(Y, codes):
+    _, first = np.unique(codes, return_index=True)
+    return [Y[i] for i in first]
 
-    POS = [] # English only
-    counts_handle = []
-    counts_hashtag = []
-    counts_emoticon = []
-    contraction = []
-    word_freqs = []
 
-    contract_forms = ['n\'t', '\'ll', '\'m', '\'s', '\'ve', '\'d', '\'re'] # to be used for English only
+# version of the extra features, increase it when their values change (part of the cache keys)
+EXTRAS_VERSION = 1
 
-    print('Processing ind. tweets...')
-    for t in tweets:
-        if lang == 'english':
-            tag_list = pos_tag(t.split()) # using (more fine-grained) penn treebank tagset
-
-            # represent tweet as string of POS-tag of each word token
-            s = ''
-            for items in tag_list:
-                if len(items) < 2:
-                    items = ['','','']
-                s = ' '.join([s, items[1]])
-            POS.append(s[1:]) # exclude the first white space
-
-        # GET HANDLE, HASHTAG AND EMOTICON
-        counts_handle.append(len(re.findall(r'@username', t)))
-        counts_hashtag.append(len(re.findall(r'#\w+', t)))
-        counts_emoticon.append(len(re.findall(r'\s>?[:;=xX]-?[\(\)/SoOpPdD]{1,8}|\s<3', t)))
-
-        # GET CONTRACTION COUNTS - only for English. Set to 0 for all other langs
-        # GET WORD FREQUENCY
-        counts = 0
-        freq_list = []
-        for tok in t.split():
-            if lang == 'english':
-            # check if contracted form
-                for form in contract_forms:
-                    if tok.endswith(form):
-                        counts += 1
-            else:
-                pass # automatically keep 0 in case of all other lang
+# database of the cached POS tags, in the cache directory
+POS_CACHE = 'postags.sqlite'
 
-            # check freq of word token, make it more readable by *1e6, and round to 5 decimals
-            freq_list.append(round(word_frequency(tok, langs[lang])*1e6, 5))
+# features computed per tweet, with a column each (word_freqs has 4)
+EXTRAS = SURFACE + ['contractions', 'word_freqs']
 
-        # sort all tokens in tweet by general frequency
-        freq_list = sorted(freq_list, reverse=True)
-        freq_list[-1] = freq_list[-1] + 0.01 # Give least frequent token (likely with 0 frequency)
-        Q1 = freq_list[:max(1, int(len(freq_list)*0.25))] # freq of most frequent 25% of words in tweet
-        Q2 = freq_list[int(len(freq_list)*0.25):int(len(freq_list)*0.5)]
+# matches the urls left in the tokenized tweets
+RE_URL = re.compile(r'\shttps?://\S+')
 
-        # make sure Q2 and Q3 are not empty lists. Q1 and Q4 will not be unless freq_list is an empty list
-        if len(Q2) == 0:
-            Q2.append(0)
-        Q3 = freq_list[int(len(freq_list)*0.5):int(len(freq_list)*0.75)]
-        if len(Q3) == 0:
-            Q3.append(0)
-        Q4 = freq_list[int(len(freq_list)*0.75):]# freq of least frequent 25% of words in tweet
+contract_forms = ['n\'t', '\'ll', '\'m', '\'s', '\'ve', '\'d', '\'re'] # to be used for English only
 
-        # get mean freq for each quardrant, store as list of 4 values
-        freqs = [stat.mean(Q1), stat.mean(Q2), stat.mean(Q3), stat.mean(Q4)]
 
-        # store word frequency info and contraction counts
-        contraction.append(counts)
-        word_freqs.append(freqs)
+# the texts the features are computed from: the tokenized tweets without urls
+def feature_texts(texts):
+    return [RE_URL.sub('', t) for t in texts]
 
 
-    # TURN STRINGS OF POS INTO COUNT MATRIX - English Only
-    if lang == 'english':
-        print('Getting POS-features...')
+# numeric extra features of every tweet: surface counts, contractions and word frequencies
+# (the row of a tweet only depends on the tweet itself; tokens are the token ids of the tweets,
+# see tokenids.py, encoded here when they are not given)
+def extra_features(tweets, lang, feats, tokens=None):
+    cols = []
+    if tokens is None and (feats['contractions'] or feats['word_freqs']):
+        tokens = encode(tweets)
 
-        vec2 = CountVectorizer()
-        pos_mat = vec2.fit_transform(POS)
-        feat_mat_pos = pos_mat.toarray()
+    # GET HANDLE, HASHTAG AND EMOTICON (one scan per tweet)
+    counts_surface = surface_counts(tweets)
+    for j, name in enumerate(SURFACE):
+        if feats[name]:
+            cols.append(counts_surface[:, j:j+1])
 
+    # GET CONTRACTION COUNTS - only for English. Set to 0 for all other langs
+    # (the contracted forms of every distinct token are checked once)
+    if feats['contractions']:
+        if lang == 'english':
+            forms = tokens.token_values(lambda tok: sum(tok.endswith(form) for form in contract_forms))
+            contraction = tokens.count(forms)
+        else:
+            contraction = np.zeros(len(tweets), dtype=np.int64)
+        cols.append(contraction.reshape(len(tweets), 1))
+
+    # GET WORD FREQUENCY
+    # mean general frequency of the quartiles of the tokens of each tweet (sorted by frequency),
+    # computed for all tweets at once with the cached frequency table of the language
+    if feats['word_freqs']:
+        cols.append(quartile_freqs_ids(tokens.ids, tokens.lengths(), tokens.vocab, lang))
+
+    if not cols:
+        return np.zeros((len(tweets), 0))
+    return np.hstack(cols)
+
+
+# extra features of every tweet, reusing the ones stored in the cache (an EntryCache)
+# the entries hold the rows of one author and are keyed by its tweets and the feature config,
+# so only the authors that are new or changed are computed
+def cached_extra_features(tweets, ids, lang, feats, cache, tokens=None):
+    config = repr([lang, EXTRAS_VERSION] + [feats[name] for name in EXTRAS])
+    rows = {}
+    for i, auth in enumerate(ids):
+        rows.setdefault(auth, []).append(i)
+
+    blocks = {}
+    missing = []
+    for auth, r in rows.items():
+        key = cache.key(config, auth, '\n'.join(tweets[i] for i in r))
+        blocks[auth] = cache.get(key)
+        if blocks[auth] is None:
+            missing.append((auth, key))
+
+    if missing:
+        todo = [i for auth, _ in missing for i in rows[auth]]
+        extras = extra_features([tweets[i] for i in todo], lang, feats, None if tokens is None else tokens.take(todo))
+        start = 0
+        for auth, key in missing:
+            blocks[auth] = extras[start:start + len(rows[auth])]
+            start += len(rows[auth])
+            cache.put(key, blocks[auth])
+
+    out = None
+    for auth, r in rows.items():
+        if out is None:
+            out = np.zeros((len(tweets), blocks[auth].shape[1]))
+        out[r] = blocks[auth]
+    return out if out is not None else np.zeros((0, 0))
+
+
+# new (unfitted) ngram vectorizer of a feature config: hashed, of token ids or TfidfVectorizer
+def ngram_vectorizer(feats):
+    if feats.get('hashing'):
+        return HashingTfidfVectorizer(n_features=feats['hashing']) # no vocabulary, only idf weights
+    if feats.get('token_ids'):
+        return TokenTfidfVectorizer()
+    #return CountVectorizer(ngram_range=(1,3)) # withou Tfidf weighting
+    return TfidfVectorizer(ngram_range=(1,2)) # including Tfidf weighting
+
+
+# whether the features use the token ids of the tweets (see tokenids.py)
+def uses_tokens(ngram_vec, lang, feats):
+    return (isinstance(ngram_vec, TokenTfidfVectorizer) or feats['word_freqs'] or
+            (lang == 'english' and feats['contractions']))
+
+
+# ngram features of the tweets (or of their token ids), fitting the vectorizer first if asked
+def ngram_features(ngram_vec, tweets, tokens, workers, fit=False):
+    if isinstance(ngram_vec, HashingTfidfVectorizer):
+        return ngram_vec.fit_transform(tweets, workers) if fit else ngram_vec.transform(tweets, workers)
+    docs = tokens if isinstance(ngram_vec, TokenTfidfVectorizer) else tweets
+    return ngram_vec.fit_transform(docs) if fit else ngram_vec.transform(docs)
+
+
+# the idf weights of a vectorizer fitted on distinct tweets, counting every tweet as its copies
+# (the rows of X, its ngram features); returns the rows of X with the new weights, which are
+# those of transforming the tweets again (all weightings are tf * idf, l2 normalized)
+def reweight_idf(ngram_vec, X, copies):
+    X = sparse.csr_matrix(X, copy=True)
+    df = np.bincount(X.indices, weights=np.repeat(copies, np.diff(X.indptr)), minlength=X.shape[1])
+    idf = np.log((1 + copies.sum()) / (1 + df)) + 1
+    X.data *= (idf / ngram_vec.idf_)[X.indices]
+    ngram_vec.idf_ = idf
+    return normalize(X, norm='l2', copy=False)
+
+
+# fit a tf-idf vectorizer on chunks of documents (an iterable of lists), one chunk in memory at a time:
+# the document frequencies of the ngrams are counted chunk by chunk, which gives the same
+# vocabulary and idf weights as TfidfVectorizer(ngram_range).fit on all the documents
+def fit_tfidf_chunks(chunks, ngram_range=(1,2)):
+    df = {}
+    n_docs = 0
+    for docs in chunks:
+        n_docs += len(docs)
+        counter = CountVectorizer(ngram_range=ngram_range, binary=True)
+        try:
+            counts = np.bincount(counter.fit_transform(docs).indices, minlength=len(counter.vocabulary_))
+        except ValueError: # no ngrams in this chunk
+            continue
+        for term, j in counter.vocabulary_.items():
+            df[term] = df.get(term, 0) + int(counts[j])
+    if not df:
+        raise ValueError('empty vocabulary; perhaps the documents only contain stop words')
+
+    terms = sorted(df)
+    ngram_vec = TfidfVectorizer(ngram_range=ngram_range, vocabulary={t: j for j, t in enumerate(terms)})
+    ngram_vec.idf_ = np.log((1 + n_docs) / (1 + np.array([df[t] for t in terms], dtype=np.float64))) + 1
+    return ngram_vec
+
+
+# fit the POS vectorizer on chunks of tag strings (the vocabulary of all chunks, as CountVectorizer.fit)
+def fit_pos_chunks(chunks):
+    tags = set()
+    for POS in chunks:
+        counter = CountVectorizer()
+        try:
+            tags.update(counter.fit(POS).vocabulary_)
+        except ValueError: # no tags in this chunk
+            continue
+    return CountVectorizer(vocabulary={t: j for j, t in enumerate(sorted(tags))})
+
+
+# out-of-core variant of get_features (same arguments and columns): the tokenized tweets are read
+# in chunks of chunk_size rows and every chunk is transformed into a block of rows of a CSR store
+# on disk (fstore, see csrstore.py), so that the tweets are never all held in memory;
+# the vectorizers are fitted in a first pass over the chunks
+# returns the memory-mapped matrix of the store and the vectorizers
+def chunked_features(table, lang, vec, feats, workers, cache, metrics, chunk_size, fstore, dup=None):
+    authors, codes = table.categories('id'), table.codes('id')
+
+    pos = lang == 'english' and feats['pos']
+
+    # with dup only the distinct texts are transformed, but the idf weights are fitted on all the rows
+    keep = None
+    if dup is not None:
+        keep = np.zeros(len(codes), dtype=bool)
+        keep[dup.first] = True
+
+    # texts of the rows of every chunk (with distinct, of the kept rows) and their author ids
+    def chunks(distinct=False):
+        start = 0
+        for batch in table.text_batches('tok', chunk_size):
+            rows = slice(start, start + len(batch))
+            start += len(batch)
+            ids = codes[rows]
+            if keep is not None and distinct:
+                batch, ids = [t for t, k in zip(batch, keep[rows].tolist()) if k], ids[keep[rows]]
+            yield feature_texts(batch), [authors[c] for c in ids.tolist()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # without a cache, the tags of the first pass are kept for the second one in a temporary database
+        fpos = os.path.join(cache.cachedir if cache else tmp, POS_CACHE)
+
+        if vec is not None:
+            ngram_vec, pos_vec = vec['ngrams'], vec['pos']
+        else:
+            with metrics.stage('vocabulary', chunk_size=chunk_size) as s:
+                ngram_vec = ngram_vectorizer(feats)
+                if isinstance(ngram_vec, HashingTfidfVectorizer):
+                    ngram_vec.fit(t for tweets, _ in chunks() for t in tweets)
+                elif isinstance(ngram_vec, TokenTfidfVectorizer):
+                    ngram_vec.fit(encode(tweets) for tweets, _ in chunks())
+                else:
+                    ngram_vec = fit_tfidf_chunks(tweets for tweets, _ in chunks())
+                pos_vec = (fit_pos_chunks(tag_strings(tweets, workers, fpos) for tweets, _ in chunks(True))
+                           if pos else None)
+                s.rows(table.rows)
+
+        with metrics.stage('chunks', chunk_size=chunk_size) as s:
+            writer = None
+            for tweets, ids in chunks(True):
+                if not tweets:
+                    continue
+                tokens = encode(tweets) if uses_tokens(ngram_vec, lang, feats) else None
+                ngrams = ngram_features(ngram_vec, tweets, tokens, workers)
+
+                if cache is None:
+                    extras = extra_features(tweets, lang, feats, tokens)
+                else:
+                    extras = cached_extra_features(tweets, ids, lang, feats, cache, tokens)
+
+                blocks = [sparse.csr_matrix(extras)]
+                if pos:
+                    blocks.append(sparse.csr_matrix(pos_vec.transform(tag_strings(tweets, workers, fpos))))
+                blocks.append(sparse.csr_matrix(ngrams))
+                block = sparse.hstack(blocks, format='csr')
+
+                if writer is None:
+                    writer = CSRWriter(fstore, block.shape[1])
+                writer.append(block)
+
+            if writer is None:
+                raise ValueError('No rows in ' + table.path)
+            all_feat_matrix = writer.close().matrix()
+            s.matrix(all_feat_matrix)
+
+    return all_feat_matrix, {'ngrams': ngram_vec, 'pos': pos_vec}
+
+
+# obtain features using the tokenized tweets of a table (see utils/table.py), the language and the
+# vectorizers of the training data ({ 'ngrams' : ..., 'pos' : ... }, None to fit them)
+# (feats selects the additional features, see FEATS; workers is the number of
+# processes used to transform the ngrams of large files in hashing mode;
+# cache is an optional EntryCache of the extra features of every author;
+# metrics an optional utils.instrument.Metrics recording the stages;
+# with a chunk_size the features are computed out of core into the CSR store fstore, see chunked_features;
+# dup are the duplicated tweets of the table, see dedup.py: the rows are then those of its distinct texts,
+# with the idf weights of all the tweets)
+def get_features(table, lang, vec, feats=None, workers=1, cache=None, metrics=None, chunk_size=0, fstore=None,
+                 dup=None):
+
+    if feats is None:
+        feats = FEATS
+    if metrics is None:
+        metrics = Metrics(log=None)
+    if chunk_size:
+        if fstore is None:
+            raise ValueError('Chunked features need a store path (fstore)')
+        return chunked_features(table, lang, vec, feats, workers, cache, metrics, chunk_size, fstore, dup)
+
+    # Just extract the Tweet texts, removing urls
+    with metrics.stage('read', table=table.path) as s:
+        tweets = feature_texts(table.text('tok'))
+        ids = table.labels('id')
+        if dup is not None:
+            tweets = [tweets[i] for i in dup.first.tolist()]
+            ids = [ids[i] for i in dup.first.tolist()]
+        s.rows(len(tweets))
+
+    # split the tweets once into token ids, shared by the ngram and extra features
+    fitted = vec is not None
+    ngram_vec = vec['ngrams'] if fitted else ngram_vectorizer(feats)
+    tokens = None
+    if uses_tokens(ngram_vec, lang, feats):
+        with metrics.stage('tokens') as s:
+            tokens = encode(tweets)
+            s.rows(len(tokens))
+            s.set(tokens=len(tokens.ids), vocab=len(tokens.vocab))
 
     '''
-    Concatenating all features into one feature matrix
+    Get basic ngram features
     '''
-    print('Concatenating all features...')
-
-    handels = np.array(counts_handle)
-    handels = handels.reshape(len(handels),1)
+    with metrics.stage('ngrams', fit=not fitted) as s:
+        matrix = ngram_features(ngram_vec, tweets, tokens, workers, fit=not fitted)
+        if dup is not None and not fitted:
+            matrix = reweight_idf(ngram_vec, matrix, dup.copies)
 
-    hashtags = np.array(counts_hashtag)
-    hashtags = hashtags.reshape(len(hashtags),1)
+        # feat_mat is a sparse (csr) matrix of shape num_documents x num_ngram_features
+        feat_mat = sparse.csr_matrix(matrix)
+        s.matrix(feat_mat)
+        s.set(vectorizer=type(ngram_vec).__name__)
 
-    emoticons = np.array(counts_emoticon)
-    emoticons = emoticons.reshape(len(emoticons),1)
-
-    contractions = np.array(contraction)
-    contractions = contractions.reshape(len(contractions),1)
-
-    word_freq = np.array(word_freqs)
+    '''
+    Get additional features (partly language-dependent)
+    '''
+    with metrics.stage('extras', cached=cache is not None) as s:
+        if cache is None:
+            extras = extra_features(tweets, lang, feats, tokens)
+        else:
+            extras = cached_extra_features(tweets, ids, lang, feats, cache, tokens)
+        s.matrix(extras)
+
+    # GET POS FEATURES - English only
+    # tag strings of all tweets (batched and cached per tweet), counted with a vectorizer
+    # fitted on the training data only, so train and test share the POS columns
+    pos_vec = vec['pos'] if fitted else None
+    if lang == 'english' and feats['pos']:
+        with metrics.stage('pos', fit=not fitted) as s:
+            POS = tag_strings(tweets, workers, os.path.join(cache.cachedir, POS_CACHE) if cache else None)
+
+            if not fitted:
+                pos_vec = CountVectorizer()
+                feat_mat_pos = sparse.csr_matrix(pos_vec.fit_transform(POS))
+            else:
+                feat_mat_pos = sparse.csr_matrix(pos_vec.transform(POS))
+            s.matrix(feat_mat_pos)
 
-    if lang == 'english':
-        all_feat_matrix = np.hstack((handels, hashtags, emoticons, feat_mat))
-        #all_feat_matrix = feat_mat# ngram features only
-    else:
-        all_feat_matrix = np.hstack((handels, hashtags, emoticons, feat_mat))
-        #all_feat_matrix = feat_mat# ngram features only
 
-    print('Final feature matrix obtained with shape:', all_feat_matrix.shape)
-    print()
+    '''
+    Concatenating all features into one feature matrix
+    '''
+    # stack sparsely, so memory grows with the non-zeros and not with the vocabulary
+    with metrics.stage('stack') as s:
+        blocks = [sparse.csr_matrix(extras)]
+        if lang == 'english' and feats['pos']:
+            blocks.append(feat_mat_pos)
+        blocks.append(feat_mat)
 
-    return all_feat_matrix, vec
+        all_feat_matrix = sparse.hstack(blocks, format='csr')
+        s.matrix(all_feat_matrix)
 
+    return all_feat_matrix, {'ngrams': ngram_vec, 'pos': pos_vec}
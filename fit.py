@@ -1,266 +1,269 @@
 #!/usr/bin/python3
 # this script uses the extracted features to train and optimize models
-
-import re
-import sys
-import pickle
-from pathlib import Path
-from random import randint
-from collections import Counter
+# with several tasks (e.g. gender,age) the tweets are featurized once and the classifiers
+# of the tasks are trained and used for prediction in parallel threads on the same matrices
+
+import os
+import atexit
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import find_duplicates
+from feats import FEATS, author_labels, get_features, pool_authors
+from model import (APPROX, BACKENDS, C_range, C_value, GRIDDIR, N_COMPONENTS, gamma_range, best_params,
+                   build_classifier, optimize_params, predict_blocks, train_classifier, worker_pool)
+from output import majority_vote, write_prediction_blocks, write_predictions, write_truth
+from selection import SCORES, keep_ngrams, ngram_count, select_ngrams
+from utils.cache import EntryCache
+from utils.instrument import Metrics
+from utils.table import Table
 
 import numpy as np
-import numpy.random as npr
-
-from sklearn.svm import SVC
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from sklearn.metrics import accuracy_score
-
-import statistics as stat
-from wordfreq import word_frequency
-
-from nltk.tag import pos_tag
-
-from feats import get_features
-
 from scipy import sparse
 
 
-# input language
-lang = sys.argv[1]
-
-# classification task ('gender' or 'age')
-task = sys.argv[2]
-
-# input train text file (id features class)
-ftrain_txt = sys.argv[3]
-
-# input test text file (id features class)
-ftest_txt = sys.argv[4]
-
-# input train tokenized file (id features class)
-ftrain_tok = sys.argv[5]
-
-# input test tokenized file (id features class)
-ftest_tok = sys.argv[6]
-
-# optimize parameters (boolean)
-optimize = bool(int(sys.argv[7]))
-
-# output training text file (id tweet prediction)
-ftrain_out = sys.argv[8]
-
-# output test text file (id tweet prediction)
-ftest_out = sys.argv[9]
-
-# output truth file (train)
-ftruth_train = sys.argv[10]
-
-# output truth file (test)
-ftruth_test = sys.argv[11]
-
-
-# original data
-Xtrain = []
-Ytrain = []
-
-# development data (0.2) and training data (0.8)
-Xtraindev = []
-Ytraindev = []
-Xdev = []
-Ydev = []
-
-# test data
-Xtest = []
-Ytest = []
-
-# read input classification labels
-with open(ftrain_tok, 'r') as ifile:
-    for line in ifile.readlines()[1:]:
-        Ytrain.append(line.split('\t')[-1].strip())
-
-with open(ftest_tok, 'r') as ifile:
-    for line in ifile.readlines()[1:]:
-        Ytest.append(line.split('\t')[-1].strip())
-
-# obtain feature vectors
-Xtrain, vec = get_features(ftrain_tok, lang, None)
-Xtest, _ = get_features(ftest_tok, lang, vec)
-
-print('Classifying ' + ftrain_tok)
-
-# when optimizing parameters partition the data in train and dev (ratio: 0.8 - 0.2)
-if optimize:
-    dev_inx = list(set([randint(0, Xtrain.shape[0] - 1) for p in range(int(0.2 * Xtrain.shape[0]))]))
-    while len(dev_inx) < int(0.2 * Xtrain.shape[0]):
-        dev_inx = list(set(dev_inx + [randint(0, Xtrain.shape[0]) - 1]))
-    traindev_inx = [x for x in range(Xtrain.shape[0]) if x not in dev_inx]
-
-    Xtraindev = sparse.csr_matrix(np.take(Xtrain, traindev_inx, axis=0))
-    Xdev = sparse.csr_matrix(np.take(Xtrain, dev_inx, axis=0))
-
-    for i in traindev_inx:
-        Ytraindev.append(Ytrain[i])
-    for i in dev_inx:
-        Ydev.append(Ytrain[i])
-
+parser = argparse.ArgumentParser(description='Fit (and optimize) a model and use it for prediction.')
+parser.add_argument('lang', help='input language')
+parser.add_argument('task', help="classification task ('gender' or 'age'), or several separated by commas ('gender,age')")
+parser.add_argument('ftrain', help='input train table (original and tokenized tweets, labels)')
+parser.add_argument('ftest', help='input test table (original and tokenized tweets, labels)')
+parser.add_argument('optimize', type=int, help='optimize parameters (0, 1)')
+parser.add_argument('ftrain_out', help='output training text file (id tweet prediction), {task} is replaced by the task')
+parser.add_argument('ftest_out', help='output test text file (id tweet prediction), {task} is replaced by the task')
+parser.add_argument('ftruth_train', help='output truth file (train)')
+parser.add_argument('ftruth_test', help='output truth file (test)')
+parser.add_argument('--hashing', type=int, default=0,
+                    help='hash the ngrams into this number of features instead of fitting a vocabulary')
+parser.add_argument('--authors', choices=['sum', 'mean'],
+                    help='classify authors instead of tweets, pooling the features of their tweets')
+parser.add_argument('--backend', choices=BACKENDS, default='svc', help='classifier backend for linear kernels')
+parser.add_argument('--approx', choices=APPROX,
+                    help='train rbf kernels as a linear classifier on a kernel approximation (Nystroem, random Fourier features)')
+parser.add_argument('--components', type=int, default=N_COMPONENTS, help='number of components of --approx')
+parser.add_argument('--batch-size', type=int, default=0, help='train in mini-batches of this size (sgd backend)')
+parser.add_argument('--epochs', type=int, default=5, help='number of passes over the mini-batches')
+parser.add_argument('--folds', type=int, default=5, help='number of cross-validation folds of the parameter search')
+parser.add_argument('--C-range', type=C_value, nargs='+', default=C_range, help='C values of the parameter search')
+parser.add_argument('--gamma-range', type=float, nargs='+', default=gamma_range, help='gamma values of the parameter search')
+parser.add_argument('--grid', help='file with the results of earlier parameter searches (default: grids/LANG-TASK.json)')
+parser.add_argument('--cache', help='directory of the cache of extra features (default: no cache)')
+parser.add_argument('--workers', type=int, default=1,
+                    help='number of processes for chunked transforms, the parameter search and prediction')
+parser.add_argument('--chunk-size', type=int, default=0,
+                    help='featurize and predict out of core in chunks of this many tweets (0: all in memory)')
+parser.add_argument('--store', help='directory of the feature stores of chunked mode (default: temporary)')
+parser.add_argument('--min-df', type=int, default=1, help='keep the ngrams of at least this many train tweets')
+parser.add_argument('--max-df', type=float, default=1.0, help='keep the ngrams of at most this fraction of train tweets')
+parser.add_argument('--select', choices=SCORES, help='keep the top --k ngrams by this score on the train labels')
+parser.add_argument('--k', type=int, default=0, help='number of ngrams kept by --select')
+parser.add_argument('--dedup', action='store_true',
+                    help='featurize and predict every distinct text once and train on the texts of every author weighted by their copies')
+parser.add_argument('--no-train-pred', action='store_true',
+                    help='do not predict the train data (its prediction and truth files are only used by eval.py)')
+parser.add_argument('--metrics', help='JSON lines file the stage measurements are appended to')
+parser.add_argument('--profile', help='directory for cProfile output of every stage')
+args = parser.parse_args()
+
+lang = args.lang
+tasks = args.task.split(',')
+ftrain = args.ftrain
+ftest = args.ftest
+optimize = bool(args.optimize)
+ftruth_train = args.ftruth_train
+ftruth_test = args.ftruth_test
+
+# the prediction files of several tasks are told apart by their {task} field
+if len(tasks) > 1 and ('{task}' not in args.ftrain_out or '{task}' not in args.ftest_out):
+    parser.error('with several tasks the output files must contain {task}')
+if args.grid and len(tasks) > 1:
+    parser.error('--grid holds the search of one task, use the default grid files with several tasks')
+
+# the mini-batches are only trained by the sgd backend
+if args.batch_size and args.backend != 'sgd':
+    parser.error('--batch-size trains in mini-batches, which needs --backend sgd')
+
+# features to use
+feats = dict(FEATS, hashing=args.hashing, authors=args.authors)
+
+# select the ngrams of every task (needs a vocabulary)
+selecting = args.min_df > 1 or args.max_df < 1 or bool(args.select and args.k)
+if selecting and args.hashing:
+    parser.error('the ngram selection needs a vocabulary, it can not be combined with --hashing')
+
+# measurements of the stages of this run (the stages of every task are recorded by its own Metrics)
+metrics = Metrics({'script': 'fit', 'lang': lang, 'task': args.task}, args.metrics, args.profile)
+
+
+# read the (integer coded) author of every tweet
+train = Table(ftrain)
+test = Table(ftest)
+authors_train, codes_train = train.categories('id'), np.asarray(train.codes('id'), dtype=np.int64)
+authors_test, codes_test = test.categories('id'), np.asarray(test.codes('id'), dtype=np.int64)
+
+# with --dedup the copies of a text (retweets, promo tweets) share a feature row, see dedup.py
+dup_train = dup_test = None
+if args.dedup:
+    with metrics.stage('dedup') as s:
+        dup_train, dup_test = find_duplicates(train), find_duplicates(test)
+        s.rows(len(dup_train) + len(dup_test))
+        s.set(texts=len(dup_train.first) + len(dup_test.first),
+              groups=len(dup_train.weights) + len(dup_test.weights))
+
+# in chunked mode the feature matrices are memory-mapped stores on disk
+store = None
+if args.chunk_size:
+    store = args.store or tempfile.mkdtemp(prefix='features-')
+    if not args.store:
+        atexit.register(shutil.rmtree, store, True)
+
+# obtain feature vectors, once for all tasks
+cache = EntryCache(args.cache) if args.cache else None
+with metrics.stage('features', subset='train') as s:
+    Xtrain, vec = get_features(train, lang, None, feats, args.workers, cache, metrics, args.chunk_size,
+                               store and os.path.join(store, 'train.csr'), dup_train)
+    s.matrix(Xtrain)
+with metrics.stage('features', subset='test') as s:
+    Xtest, _ = get_features(test, lang, vec, feats, args.workers, cache, metrics, args.chunk_size,
+                            store and os.path.join(store, 'test.csr'), dup_test)
+    s.matrix(Xtest)
+
+print('Classifying ' + ftrain)
+
+# feature matrices are already sparse (csr), the SVC is fed with them directly
 Xtrain = sparse.csr_matrix(Xtrain)
 Xtest = sparse.csr_matrix(Xtest)
 
-# parameters of the SVC to try when optimizing (linear and rbf)
-max_acc = 0
-C_range = [1, 5, 10, 100]
-gamma_range = [0.01, 0.1, 1.0, 10.0]
-
-# a priori best models found
-if lang == 'english':
-    if task == 'gender':
-        best_kernel = 'rbf'
-        best_C = 100
-        best_gamma = 0.1
-    else:
-        best_kernel = 'rbf'
-        best_C = 10
-        best_gamma = 0.1
-
-elif lang == 'spanish':
-    if task == 'gender':
-        best_kernel = 'rbf'
-        best_C = 10
-        best_gamma = 0.1
-    else:
-        best_kernel = 'linear'
-        best_C = 10
-        best_gamma = 0
-
-elif lang == 'italian':
-    best_kernel = 'linear'
-    best_C = 5
-    best_gamma = 0
-
-elif lang == 'dutch':
-    best_kernel = 'linear'
-    best_C = 5
-    best_gamma = 0
-
-
-# classifiers to use
-cls_range = []
-if optimize:
-    for c_val in C_range:
-        cls_range.append(SVC(kernel='linear', C=c_val))
-        for gamma_val in gamma_range:
-            cls_range.append(SVC(kernel='rbf', gamma=gamma_val, C=c_val))
-
-
-# validate each classifier using the test set
-for cls in cls_range:
+# the ngram features are the last columns
+n_ngrams = ngram_count(vec['ngrams'])
+
+# the rows to train on: with --dedup the texts of every author, weighted by their copies
+# (Xtrain and Xtest then hold the distinct texts, which are predicted once for all their tweets)
+Xfit = Xtrain if dup_train is None else dup_train.group_matrix(Xtrain)
+weights = None if dup_train is None or feats['authors'] else dup_train.weights
+
+
+# pooled tweets of every author (with --dedup the texts of the author, weighted by their copies)
+def pool_rows(X, dup, codes, n_authors):
+    if dup is None:
+        return pool_authors(X, codes, n_authors, feats['authors'])
+    return dup.pool(X, codes, n_authors, feats['authors'])
+
+
+# in author mode every author is a single document: its pooled tweets
+# (with a feature selection the tweets are pooled by every task, after its selection)
+if feats['authors'] and not selecting:
+    with metrics.stage('pool') as s:
+        Xfit = Xtrain = pool_rows(Xtrain, dup_train, codes_train, len(authors_train))
+        Xtest = pool_rows(Xtest, dup_test, codes_test, len(authors_test))
+        s.matrix(Xtrain)
+
+
+# train the classifier of a task on the shared matrices and predict the train and test data
+# returns the best parameters and the labels of the authors of every subset ({ subset : { author : label } })
+def fit_task(task):
+    task_metrics = Metrics(dict(metrics.run, task=task), args.metrics, args.profile)
+
+    # read input classification labels of the training rows
+    labels = train.labels(task)
+    Ytrain = labels if dup_train is None else [labels[i] for i in dup_train.group_rows.tolist()]
+
+    # keep the ngrams selected on the labels of the task (on the tweets, before they are pooled)
+    # Xtr are the rows to train on, Xpr and Xte the rows to predict
+    Xtr, Xpr, Xte = Xfit, Xtrain, Xtest
+    if selecting:
+        with task_metrics.stage('select', score=args.select, k=args.k, min_df=args.min_df, max_df=args.max_df) as s:
+            # (with --dedup the rows are the texts of the authors, counted as many times as their copies)
+            keep = select_ngrams(Xtr, Ytrain, n_ngrams, args.min_df, args.max_df, args.select, args.k,
+                                 None if dup_train is None else dup_train.weights)
+            Xtr, Xte = keep_ngrams(Xtr, keep, n_ngrams), keep_ngrams(Xte, keep, n_ngrams)
+            Xpr = Xtr if Xtrain is Xfit else keep_ngrams(Xpr, keep, n_ngrams)
+            s.matrix(Xtr)
+            s.set(ngrams=len(keep))
+        if feats['authors']:
+            with task_metrics.stage('pool') as s:
+                Xtr = Xpr = pool_rows(Xpr, dup_train, codes_train, len(authors_train))
+                Xte = pool_rows(Xte, dup_test, codes_test, len(authors_test))
+                s.matrix(Xtr)
+
+    # in author mode: the label of every author
+    if feats['authors']:
+        Ytrain = author_labels(labels, codes_train)
+
+    # a priori best models found
+    best_kernel, best_C, best_gamma = best_params(lang, task)
+
+    # when optimizing parameters cross-validate the grid (results are reused from earlier runs)
+    if optimize and len(set(Ytrain)) > 1:
+        fgrid = args.grid or os.path.join(GRIDDIR, lang + '-' + task + '.json')
+        with task_metrics.stage('optimize', folds=args.folds) as s:
+            best_kernel, best_C, best_gamma = optimize_params(Xtr, Ytrain, (best_kernel, best_C, best_gamma),
+                                                              args.backend, args.folds, args.workers, fgrid,
+                                                              args.C_range, args.gamma_range,
+                                                              sample_weight=weights, executor=workers_pool)
+            s.matrix(Xtr)
+
+    # define classifier to use
+    n_samples = Xtr.shape[0] if weights is None else int(weights.sum())
+    clf = build_classifier(best_kernel, best_C, best_gamma, args.backend, n_samples, args.approx, args.components)
+
+    # fit the final classifier on the full data
     if len(set(Ytrain)) > 1:
-        cls.fit(Xtraindev, Ytraindev)
-        Ydev_guess = cls.predict(Xdev)
-        acc = accuracy_score(Ydev, Ydev_guess)
-
-        if acc > max_acc:
-            best_kernel = cls.kernel
-            best_C = cls.C
-            best_gamma = cls.gamma
-            max_acc = acc
-
-        if cls.kernel == 'linear':
-            print('Accuracy with linear kernel, c: ' + str(cls.C) + ' is: ', acc)
-        else:
-            print('Accuracy with rbf kernel, c: ' + str(cls.C) + ', gamma: ' + str(cls.gamma) + ' is: ', acc)
-        sys.stdout.flush()
-
-print()
-print('! Best parameter values. Kernel: ' + str(best_kernel) + ', c: ' + str(best_C) + ', gamma: ' + str(best_gamma))
-
-
-# define classifier to use
-if best_kernel == 'linear':
-    clf = SVC(kernel="linear", C=best_C)
-if best_kernel == 'rbf':
-    clf = SVC(kernel="rbf", C=best_C, gamma=best_gamma)
-
-
-# fit the final classifier on the full data and predict test data
-if len(set(Ytrain)) > 1:
-    clf.fit(Xtrain, Ytrain)
-    Ytrain_guess = clf.predict(Xtrain)
-    Ytest_guess = clf.predict(Xtest)
-else:
-    Ytrain_guess = Ytrain
-    Ytest_guess = [Ytrain[0]] * int(Xtest.shape[0])
-
-
-# classification results per author
-auth2labels_train = {}
-auth2labels_test = {}
-
-# print train results into a file
-with open(ftrain_out, 'w') as otrain:
-    with open(ftrain_txt, 'r') as itrain:
-        lines = itrain.readlines()
-        otrain.write('id\ttweet\t' + str(task) + '\n')
-        for i in range(len(Ytrain_guess)):
-            fields = lines[i+1].split('\t')
-            otrain.write(fields[0].strip() + '\t' + fields[1].strip() + '\t' + Ytrain_guess[i] + '\n')
-
-            # accumulate classification results
-            if fields[0].strip() not in auth2labels_train:
-                auth2labels_train[fields[0].strip()] = []
-            auth2labels_train[fields[0].strip()].append(Ytrain_guess[i])
-
-
-# print test results into a file and collect labels
-with open(ftest_out, 'w') as otest:
-    with open(ftest_txt, 'r') as itest:
-        lines = itest.readlines()
-        otest.write('id\ttweet\t' + str(task) + '\n')
-        for i in range(len(Ytest_guess)):
-            fields = lines[i+1].split('\t')
-            otest.write(fields[0].strip() + '\t' + fields[1].strip() + '\t' + Ytest_guess[i] + '\n')
-
-            # accumulate classification results
-            if fields[0].strip() not in auth2labels_test:
-                auth2labels_test[fields[0].strip()] = []
-            auth2labels_test[fields[0].strip()].append(Ytest_guess[i])
-
-
-# check if truth file exists, else, initialize
-if not Path(ftruth_train).is_file():
-    with open(ftruth_train, 'w') as otruth:
-        for auth in auth2labels_train:
-            otruth.write(auth + '\n')
-
-if not Path(ftruth_test).is_file():
-    with open(ftruth_test, 'w') as otruth:
-        for auth in auth2labels_test:
-            otruth.write(auth + '\n')
-
-
-# output results into the truth file
-newlines_train = []
-newlines_test = []
-
-with open(ftruth_train, 'r') as otruth:
-    for line in otruth.readlines():
-        auth = line.split(':::')[0].strip()
-        if auth in auth2labels_train:
-            label = Counter(auth2labels_train[auth]).most_common(1)[0][0]
-            newlines_train.append(line.rstrip('\n') + ':::' + str(label) + '\n')
-
-with open(ftruth_train, 'w') as otruth:
-    for line in newlines_train:
-        otruth.write(line)
-
-with open(ftruth_test, 'r') as otruth:
-    for line in otruth.readlines():
-        auth = line.split(':::')[0].strip()
-        if auth in auth2labels_test:
-            label = Counter(auth2labels_test[auth]).most_common(1)[0][0]
-            newlines_test.append(line.rstrip('\n') + ':::' + str(label) + '\n')
-
-with open(ftruth_test, 'w') as otruth:
-    for line in newlines_test:
-        otruth.write(line)
-
+        with task_metrics.stage('fit', kernel=best_kernel, backend=args.backend, approx=args.approx) as s:
+            train_classifier(clf, Xtr, Ytrain, args.batch_size, args.epochs, weights)
+            s.matrix(Xtr)
+    else:
+        clf = None
+
+    # predict the test data (and the train data, unless skipped) in blocks on the worker processes;
+    # the tweet predictions are streamed into the prediction file of the subset
+    subsets = [('test', Xte, dup_test, test, authors_test, codes_test, args.ftest_out)]
+    if not args.no_train_pred:
+        subsets.insert(0, ('train', Xpr, dup_train, train, authors_train, codes_train, args.ftrain_out))
+    auth2label = {}
+    for subset, X, dup, table, authors, codes, fout in subsets:
+        with task_metrics.stage('predict', subset=subset, workers=args.workers) as s:
+            if clf is None:
+                blocks = [[Ytrain[0]] * int(X.shape[0])]
+            else:
+                blocks = predict_blocks(clf, X, args.chunk_size, args.workers, workers_pool)
+
+            # label of every author: its prediction in author mode, else the majority of its tweets
+            if feats['authors']:
+                Yguess = np.concatenate([np.asarray(b) for b in blocks])
+                auth2label[subset] = dict(zip(authors, Yguess))
+                write_predictions(table, fout.format(task=task), task, Yguess[codes])
+            else:
+                # with --dedup the labels of the distinct texts are expanded to every tweet
+                if dup is not None:
+                    blocks = [dup.expand(np.concatenate([np.asarray(b) for b in blocks]))]
+                Yguess = write_prediction_blocks(table, fout.format(task=task), task, blocks)
+                auth2label[subset] = majority_vote(authors, codes, Yguess)
+            s.matrix(X)
+
+    return (best_kernel, best_C, best_gamma), auth2label
+
+
+# the classifiers of the tasks train in parallel (the solvers release the GIL), sharing the matrices
+# the tasks share one pool of worker processes (cross-validation and prediction), which is started
+# before the task threads so that no process is forked while they run
+workers_pool = worker_pool(args.workers) if args.workers > 1 else None
+try:
+    with ThreadPoolExecutor(max_workers=len(tasks)) as tasks_pool:
+        results = list(tasks_pool.map(fit_task, tasks))
+finally:
+    if workers_pool is not None:
+        workers_pool.shutdown()
+
+# the truth files are written in the order of the tasks (they get a column per task)
+for task, (params, auth2label) in zip(tasks, results):
+    print()
+    print('! Best parameter values (' + task + '). Kernel: ' + str(params[0]) + ', c: ' + str(params[1]) +
+          ', gamma: ' + str(params[2]))
+
+    with metrics.stage('output', task=task) as s:
+        if 'train' in auth2label:
+            write_truth(ftruth_train, auth2label['train'])
+        write_truth(ftruth_test, auth2label['test'])
+        s.rows(sum(len(a) for a in auth2label.values()))
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+# this script keeps a per-language table of general word frequencies (wordfreq)
+# the table is stored on disk as numpy arrays of (token hash, frequency) sorted by hash: the
+# tokens not seen before are added in small shard files next to the table, which are merged
+# into it once there are MAX_SHARDS of them (the arrays are memory-mapped when loaded)
+
+import os
+import glob
+import hashlib
+import tempfile
+import uuid
+import numpy as np
+
+from wordfreq import word_frequency
+
+
+# map language to lang_code
+LANGS = {'english':'en', 'spanish':'es', 'italian':'it', 'dutch':'nl'}
+
+# directory where the tables are stored (a cache, it can be moved with the WORDFREQ_DIR variable)
+FREQDIR = os.environ.get('WORDFREQ_DIR',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'wordfreq'))
+
+# number of shard files of new tokens kept next to a table before they are merged into it
+MAX_SHARDS = 16
+
+# entries of a table, sorted by key
+TABLE_DTYPE = np.dtype([('key', np.uint64), ('freq', np.float64)])
+
+
+# 64 bit hash of a token (the tables store hashes instead of variable length strings)
+def token_hash(tok):
+    return int.from_bytes(hashlib.blake2b(tok.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# frequency of a token, made more readable by *1e6 and rounded to 5 decimals
+def token_freq(tok, lang):
+    return round(word_frequency(tok, LANGS[lang])*1e6, 5)
+
+
+def table_file(lang, freqdir):
+    return os.path.join(freqdir, 'wordfreq-' + lang + '.npy')
+
+
+def shard_files(lang, freqdir):
+    return sorted(glob.glob(os.path.join(glob.escape(freqdir), 'wordfreq-' + lang + '.*.npy')))
+
+
+# a new shard file of a language
+def new_shard_file(lang, freqdir):
+    return os.path.join(freqdir, 'wordfreq-' + lang + '.' + uuid.uuid4().hex + '.npy')
+
+
+# write an array into a temporary file renamed to fout, so that other processes always see complete files
+def save_array(array, fout):
+    freqdir = os.path.dirname(fout)
+    os.makedirs(freqdir, exist_ok=True)
+    fd, ftmp = tempfile.mkstemp(dir=freqdir, prefix=os.path.basename(fout) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(ftmp, fout)
+    except BaseException:
+        os.remove(ftmp)
+        raise
+
+
+# load the (memory-mapped) arrays of a language: the table and its shards, empty if it does not exist yet
+# the shards are loaded first: a shard that is gone was merged into the table before being removed
+def load_table(lang, freqdir=FREQDIR):
+    arrays = []
+    for fshard in shard_files(lang, freqdir):
+        try:
+            arrays.append(np.load(fshard, mmap_mode='r'))
+        except FileNotFoundError:
+            pass
+    ftable = table_file(lang, freqdir)
+    if os.path.isfile(ftable):
+        arrays.insert(0, np.load(ftable, mmap_mode='r'))
+    return arrays
+
+
+# merge the shards of a language into its table
+# (with concurrent merges a shard may be lost, its tokens are then computed again when needed)
+def merge_shards(lang, freqdir=FREQDIR):
+    fshards = shard_files(lang, freqdir)
+    arrays = load_table(lang, freqdir)
+    if not arrays:
+        return
+    table = np.concatenate(arrays)
+    _, first = np.unique(table['key'], return_index=True)
+    save_array(table[first], table_file(lang, freqdir))
+    for fshard in fshards:
+        try:
+            os.remove(fshard)
+        except FileNotFoundError:
+            pass
+
+
+# frequencies of a list of unique tokens, computing (and storing) the ones missing in the table
+def lookup(tokens, lang, freqdir=FREQDIR):
+    arrays = load_table(lang, freqdir)
+    qkeys = np.array([token_hash(tok) for tok in tokens], dtype=np.uint64)
+
+    qfreqs = np.zeros(len(tokens), dtype=np.float64)
+    found = np.zeros(len(tokens), dtype=bool)
+    for table in arrays:
+        keys = table['key']
+        todo = np.flatnonzero(~found)
+        pos = np.searchsorted(keys, qkeys[todo])
+        hit = pos < len(keys)
+        hit[hit] = keys[pos[hit]] == qkeys[todo[hit]]
+        qfreqs[todo[hit]] = table['freq'][pos[hit]]
+        found[todo[hit]] = True
+
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        qfreqs[missing] = [token_freq(tokens[i], lang) for i in missing]
+
+        # the new tokens are stored in a shard of their own, the table is not rewritten
+        new = np.zeros(len(missing), dtype=TABLE_DTYPE)
+        new['key'] = qkeys[missing]
+        new['freq'] = qfreqs[missing]
+        new = new[np.argsort(new['key'], kind='stable')]
+        save_array(new, new_shard_file(lang, freqdir))
+        if len(shard_files(lang, freqdir)) >= MAX_SHARDS:
+            merge_shards(lang, freqdir)
+
+    return qfreqs
+
+
+# mean general frequency of the 4 quartiles of the tokens of every tweet (most frequent first)
+# tweets is a list of token lists, the result has shape num_tweets x 4
+def quartile_freqs(tweets, lang, freqdir=FREQDIR):
+    vocab = {}
+    ids = np.fromiter((vocab.setdefault(tok, len(vocab)) for toks in tweets for tok in toks), dtype=np.int64)
+    lengths = np.array([len(toks) for toks in tweets], dtype=np.int64)
+    return quartile_freqs_ids(ids, lengths, list(vocab), lang, freqdir)
+
+
+# quartile_freqs of a ragged array of token ids: the flat ids of all tweets, the number of
+# tokens of every tweet and the token of every id (see tokenids.py)
+def quartile_freqs_ids(ids, lengths, vocab, lang, freqdir=FREQDIR):
+    n_tweets = len(lengths)
+    rows = np.repeat(np.arange(n_tweets), lengths)
+
+    # the frequencies are looked up once per distinct token
+    used, inv = np.unique(ids, return_inverse=True)
+    values = lookup([vocab[i] for i in used], lang, freqdir)[inv.ravel()]
+
+    # sort the tokens of every tweet by frequency (descending)
+    order = np.lexsort((-values, rows))
+    values = values[order]
+
+    # give least frequent token (likely with 0 frequency) a small frequency
+    starts = np.cumsum(lengths) - lengths
+    nonempty = lengths > 0
+    values[(starts + lengths)[nonempty] - 1] += 0.01
+
+    # the means are exact, as those of statistics.mean: every value is an integer multiple of 2**-scale
+    # (the denominator of its integer ratio is a power of 2), so the sum of a quartile is a sum of
+    # integers, divided once by its size (int / int is correctly rounded)
+    uniq, vinv = np.unique(values, return_inverse=True)
+    ratios = [v.as_integer_ratio() for v in uniq.tolist()]
+    scale = max((den.bit_length() - 1 for _, den in ratios), default=0)
+    units = [num << (scale - den.bit_length() + 1) for num, den in ratios]
+    units = [units[i] for i in vinv.ravel().tolist()]
+
+    # Q1 (most frequent 25%) and Q2 overlap for tweets with less than 4 tokens, empty quartiles have a mean of 0
+    freqs = np.zeros((n_tweets, 4), dtype=np.float64)
+    for t, (start, n) in enumerate(zip(starts.tolist(), lengths.tolist())):
+        if not n:
+            continue
+        for j, (lo, hi) in enumerate([(0, max(1, n // 4)), (n // 4, n // 2), (n // 2, (3 * n) // 4), ((3 * n) // 4, n)]):
+            if hi > lo:
+                freqs[t, j] = sum(units[start + lo:start + hi]) / ((hi - lo) << scale)
+
+    return freqs
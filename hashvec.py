@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# this script defines a tf-idf vectorizer based on feature hashing
+# n-grams are hashed into a fixed number of columns, so no vocabulary is kept:
+# the only state is the idf vector, learned in a streaming pass over the documents
+
+from functools import partial
+from itertools import chain, islice
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from utils.pipeline import bounded_map
+
+
+# default number of hashed features
+N_FEATURES = 2 ** 20
+
+
+# split the documents (any iterable) into chunks, read lazily
+def chunks(docs, size):
+    docs = iter(docs)
+    chunk = list(islice(docs, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(docs, size))
+
+
+# vectorizer of a worker process, sent once by the pool initializer (not with every chunk)
+worker_vec = None
+
+
+def init_worker(vec):
+    global worker_vec
+    worker_vec = vec
+
+
+# run a method of the vectorizer on a chunk of documents in a worker
+def run_chunk(method, docs):
+    return getattr(worker_vec, method)(docs)
+
+
+class HashingTfidfVectorizer:
+
+    # same weighting as TfidfVectorizer (smoothed idf, l2 normalization)
+    def __init__(self, n_features=N_FEATURES, ngram_range=(1,2), chunk_size=10000, workers=1):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.idf_ = None
+
+    def _hasher(self):
+        return HashingVectorizer(n_features=self.n_features, ngram_range=self.ngram_range,
+                                 alternate_sign=False, norm=None)
+
+    # learn the idf weights, docs can be any iterable (e.g. a generator over a file)
+    def fit(self, docs):
+        hasher = self._hasher()
+        df = np.zeros(self.n_features, dtype=np.int64)
+        n_docs = 0
+        for chunk in chunks(docs, self.chunk_size):
+            df += np.bincount(hasher.transform(chunk).indices, minlength=self.n_features)
+            n_docs += len(chunk)
+
+        self.idf_ = self._idf(df, n_docs)
+        return self
+
+    @staticmethod
+    def _idf(df, n_docs):
+        return np.log((1 + n_docs) / (1 + df)) + 1
+
+    # weight a block of hashed counts
+    def _weight(self, X):
+        X.data *= self.idf_[X.indices]
+        return normalize(X, norm='l2', copy=False)
+
+    # hashed counts of a chunk of documents
+    def _hash_chunk(self, docs):
+        return self._hasher().transform(docs)
+
+    # weight a chunk of documents (the hasher itself has no state)
+    def _transform_chunk(self, docs):
+        return self._weight(self._hash_chunk(docs))
+
+    # results of a method on the chunks of the documents, in order: on a pool of workers (at most
+    # two chunks per worker in flight) when there are several chunks, else in process
+    def _map_chunks(self, method, docs, workers):
+        parts = chunks(docs, self.chunk_size)
+        head = list(islice(parts, 2))
+        parts = chain(head, parts)
+        if workers > 1 and len(head) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(self,)) as pool:
+                yield from bounded_map(pool, partial(run_chunk, method), parts, 2 * workers)
+        else:
+            yield from map(getattr(self, method), parts)
+
+    def _stack(self, blocks):
+        if not blocks:
+            return sparse.csr_matrix((0, self.n_features))
+        return sparse.vstack(blocks, format='csr')
+
+    # transform the documents (any iterable) chunk by chunk, in parallel when more workers are given
+    def transform(self, docs, workers=None):
+        return self._stack(list(self._map_chunks('_transform_chunk', docs, workers or self.workers)))
+
+    # fit and transform in a single pass: every chunk is hashed once, its counts are kept
+    # (they have the size of the result) and weighted once the idf is known
+    def fit_transform(self, docs, workers=None):
+        blocks = []
+        df = np.zeros(self.n_features, dtype=np.int64)
+        for X in self._map_chunks('_hash_chunk', docs, workers or self.workers):
+            df += np.bincount(X.indices, minlength=self.n_features)
+            blocks.append(X)
+
+        self.idf_ = self._idf(df, sum(X.shape[0] for X in blocks))
+        return self._stack([self._weight(X) for X in blocks])
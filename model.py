@@ -0,0 +1,407 @@
+#!/usr/bin/python3
+# this script holds the classifier settings and the (de)serialization of trained models
+
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from sklearn.svm import SVC, LinearSVC
+from sklearn.pipeline import make_pipeline
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.metrics.pairwise import rbf_kernel
+
+from feats import pool_authors
+from output import majority_vote
+
+
+# version of the model artifacts, increase it when their content changes
+MODEL_VERSION = 2
+
+# parameters of the SVC to try when optimizing (linear and rbf)
+C_range = [1, 5, 10, 100]
+gamma_range = [0.01, 0.1, 1.0, 10.0]
+
+# classifier backends for the linear kernel
+BACKENDS = ['svc', 'liblinear', 'sgd']
+
+# approximations of the rbf kernel (Nystroem or random Fourier features) and their default size
+APPROX = ['nystroem', 'rff']
+N_COMPONENTS = 1000
+
+# largest number of rows for which the search precomputes the (dense) kernel matrix
+GRAM_MAX_ROWS = 10000
+
+# directory where the results of the parameter searches are stored
+GRIDDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grids')
+
+
+# a priori best models found, returns (kernel, C, gamma)
+def best_params(lang, task):
+    if lang == 'english':
+        if task == 'gender':
+            return 'rbf', 100, 0.1
+        else:
+            return 'rbf', 10, 0.1
+
+    elif lang == 'spanish':
+        if task == 'gender':
+            return 'rbf', 10, 0.1
+        else:
+            return 'linear', 10, 0
+
+    elif lang == 'italian':
+        return 'linear', 5, 0
+
+    elif lang == 'dutch':
+        return 'linear', 5, 0
+
+
+# define classifier to use
+# the backend replaces the libsvm solver of the linear kernel by one that trains in
+# (roughly) linear time on sparse data: 'liblinear' (LinearSVC) or 'sgd' (SGDClassifier,
+# which also supports mini-batches, see fit_minibatches); rbf kernels use SVC, or with approx
+# a linear classifier of the backend (liblinear for 'svc') on n_components approximate features
+def build_classifier(kernel, C, gamma, backend='svc', n_samples=1, approx=None, n_components=N_COMPONENTS):
+    if kernel == 'linear':
+        if backend == 'liblinear':
+            # same objective as the linear SVC (hinge loss, C)
+            return LinearSVC(loss='hinge', C=C, max_iter=10000)
+        if backend == 'sgd':
+            # C of the SVC corresponds to alpha = 1 / (C * n_samples) of the SGD objective
+            return SGDClassifier(loss='hinge', alpha=1.0 / (C * n_samples), max_iter=50, tol=1e-4)
+        return SVC(kernel="linear", C=C)
+    if kernel == 'rbf' and approx:
+        if approx == 'nystroem':
+            mapper = Nystroem(kernel='rbf', gamma=gamma, n_components=n_components, random_state=0)
+        else:
+            mapper = RBFSampler(gamma=gamma, n_components=n_components, random_state=0)
+        return make_pipeline(mapper, build_classifier('linear', C, 0, 'liblinear' if backend == 'svc' else backend,
+                                                      n_samples))
+    if kernel == 'rbf':
+        return SVC(kernel="rbf", C=C, gamma=gamma)
+
+
+# train an SGD classifier with partial_fit on mini-batches
+# batches is a function returning an iterator over (X, y, sample weights) blocks, it is called once per epoch
+def fit_minibatches(clf, batches, classes, epochs=5):
+    for epoch in range(epochs):
+        for X, y, w in batches():
+            clf.partial_fit(X, y, classes=classes, sample_weight=w)
+    return clf
+
+
+# mini-batches of the rows of a matrix, its labels and sample weights (None: all 1), in a random order
+def row_batches(X, Y, batch_size, seed=None, sample_weight=None):
+    rng = np.random.RandomState(seed)
+    Y = np.asarray(Y)
+
+    def batches():
+        order = rng.permutation(X.shape[0])
+        for i in range(0, len(order), batch_size):
+            rows = np.sort(order[i:i + batch_size])
+            yield X[rows], Y[rows], None if sample_weight is None else sample_weight[rows]
+
+    return batches
+
+
+# fit arguments passing the sample weights to the classifier (the last step of a pipeline)
+def weight_args(clf, sample_weight):
+    if sample_weight is None:
+        return {}
+    if hasattr(clf, 'steps'):
+        return {clf.steps[-1][0] + '__sample_weight': sample_weight}
+    return {'sample_weight': sample_weight}
+
+
+# fit a classifier on the full data, in mini-batches when a batch size is given
+# (only for classifiers with partial_fit, i.e. the 'sgd' backend); sample_weight counts every
+# row as that many rows (e.g. the copies of a tweet, see dedup.py), which gives the same hinge loss
+def train_classifier(clf, X, Y, batch_size=0, epochs=5, sample_weight=None):
+    if batch_size and hasattr(clf, 'partial_fit'):
+        return fit_minibatches(clf, row_batches(X, Y, batch_size, sample_weight=sample_weight), sorted(set(Y)),
+                               epochs)
+    return clf.fit(X, Y, **weight_args(clf, sample_weight))
+
+
+# the grid of parameters to try, in the order they are reported
+def param_grid(C_values=C_range, gamma_values=gamma_range):
+    param_range = []
+    for c_val in C_values:
+        param_range.append(('linear', c_val, 0))
+        for gamma_val in gamma_values:
+            param_range.append(('rbf', c_val, gamma_val))
+    return param_range
+
+
+# k-fold split of the row indices, computed once and shared by all parameters
+# the rows are shuffled and then dealt to the folds class by class (stratified)
+def kfold_indices(Y, folds=5, seed=0):
+    Y = np.asarray(Y)
+    order = np.random.RandomState(seed).permutation(len(Y))
+    order = order[np.argsort(Y[order], kind='stable')]
+    fold = np.empty(len(Y), dtype=np.int64)
+    fold[order] = np.arange(len(Y)) % folds
+    return [(np.flatnonzero(fold != k), np.flatnonzero(fold == k)) for k in range(folds)]
+
+
+# kernel matrix of all the rows (dense, rows x rows)
+def gram_matrix(X, kernel, gamma):
+    if kernel == 'linear':
+        return (X @ X.T).toarray()
+    return rbf_kernel(X, gamma=gamma)
+
+
+# cross-validated accuracy of all the C values of one kernel (and gamma)
+# an SVC is trained on the precomputed kernel matrix, which is computed once and shared
+# by the folds and the C values (unless the data is too large for a dense matrix)
+# with sample weights the rows are trained and counted as that many rows
+def search_group(X, Y, kernel, gamma, Cs, splits, backend='svc', sample_weight=None):
+    Y = np.asarray(Y)
+    w = (lambda rows: None) if sample_weight is None else (lambda rows: sample_weight[rows])
+    precomputed = (kernel == 'rbf' or backend == 'svc') and X.shape[0] <= GRAM_MAX_ROWS
+    if precomputed:
+        K = gram_matrix(X, kernel, gamma)
+
+    accs = {}
+    for C in Cs:
+        fold_accs = []
+        for train, dev in splits:
+            if precomputed:
+                cls = SVC(kernel='precomputed', C=C)
+                cls.fit(K[np.ix_(train, train)], Y[train], sample_weight=w(train))
+                Ydev_guess = cls.predict(K[np.ix_(dev, train)])
+            else:
+                n_samples = len(train) if sample_weight is None else int(sample_weight[train].sum())
+                cls = build_classifier(kernel, C, gamma, backend, n_samples)
+                cls.fit(X[train], Y[train], **weight_args(cls, w(train)))
+                Ydev_guess = cls.predict(X[dev])
+            fold_accs.append(accuracy_score(Y[dev], Ydev_guess, sample_weight=w(dev)))
+        accs[(kernel, C, gamma)] = float(np.mean(fold_accs))
+    return accs
+
+
+# key of a search in the grid file: the data, labels (and sample weights) and search settings
+def grid_key(X, Y, backend, folds, seed, sample_weight=None):
+    h = hashlib.blake2b(digest_size=16)
+    for a in (X.data, X.indices, X.indptr, np.array(X.shape)):
+        h.update(np.ascontiguousarray(a).tobytes())
+    if sample_weight is not None:
+        h.update(np.ascontiguousarray(sample_weight, dtype=np.int64).tobytes())
+    h.update('\n'.join(Y).encode('utf-8'))
+    return h.hexdigest() + '-' + backend + '-' + str(folds) + 'fold-' + str(seed)
+
+
+# results of earlier searches: { key : { 'kernel C gamma' : accuracy } }
+def load_grid(fgrid):
+    if fgrid is None or not os.path.isfile(fgrid):
+        return {}
+    with open(fgrid) as f:
+        return json.load(f)
+
+
+def save_grid(fgrid, grid):
+    if fgrid is None:
+        return
+    griddir = os.path.dirname(os.path.abspath(fgrid))
+    os.makedirs(griddir, exist_ok=True)
+    fd, ftmp = tempfile.mkstemp(dir=griddir, prefix=os.path.basename(fgrid) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(grid, f, indent=1, sort_keys=True)
+        os.replace(ftmp, fgrid)
+    except BaseException:
+        os.remove(ftmp)
+        raise
+
+
+# a C value given on the command line: an int when it is integral, as in C_range, so that
+# e.g. 5 and 5.0 are the same parameters (with the same key in the grid files)
+def C_value(s):
+    C = float(s)
+    return int(C) if C.is_integer() else C
+
+
+def param_name(kernel, C, gamma):
+    return kernel + ' ' + repr(C) + ' ' + repr(gamma)
+
+
+# search the best parameters with k-fold cross-validation
+# the kernels (linear and every gamma) are evaluated in parallel, and the accuracies are
+# stored in fgrid, so that a later search on the same data only runs the missing parameters
+def optimize_params(Xtrain, Ytrain, params, backend='svc', folds=5, workers=1, fgrid=None,
+                    C_values=C_range, gamma_values=gamma_range, seed=0, sample_weight=None, executor=None):
+    best_kernel, best_C, best_gamma = params
+    param_range = param_grid(C_values, gamma_values)
+
+    grid = load_grid(fgrid)
+    key = grid_key(Xtrain, Ytrain, backend, folds, seed, sample_weight)
+    results = grid.setdefault(key, {})
+
+    # C values still missing for every kernel
+    groups = {}
+    for kernel, C, gamma in param_range:
+        if param_name(kernel, C, gamma) not in results:
+            groups.setdefault((kernel, gamma), []).append(C)
+
+    if groups:
+        splits = kfold_indices(Ytrain, folds, seed)
+        jobs = [(Xtrain, Ytrain, kernel, gamma, Cs, splits, backend, sample_weight)
+                for (kernel, gamma), Cs in groups.items()]
+        if executor is not None and len(jobs) > 1:
+            accs = list(executor.map(search_group, *zip(*jobs)))
+        elif workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                accs = list(pool.map(search_group, *zip(*jobs)))
+        else:
+            accs = [search_group(*job) for job in jobs]
+
+        for acc in accs:
+            for (kernel, C, gamma), a in acc.items():
+                results[param_name(kernel, C, gamma)] = a
+        save_grid(fgrid, grid)
+
+    # report the accuracies and keep the best classifier (first one on ties)
+    max_acc = 0
+    for kernel, C, gamma in param_range:
+        acc = results[param_name(kernel, C, gamma)]
+
+        if acc > max_acc:
+            best_kernel = kernel
+            best_C = C
+            best_gamma = gamma
+            max_acc = acc
+
+        if kernel == 'linear':
+            print('Accuracy with linear kernel, c: ' + str(C) + ' is: ', acc)
+        else:
+            print('Accuracy with rbf kernel, c: ' + str(C) + ', gamma: ' + str(gamma) + ' is: ', acc)
+        sys.stdout.flush()
+
+    return best_kernel, best_C, best_gamma
+
+
+# store a trained model (vectorizers, feature config and classifier) in a versioned artifact
+# (clf is None when the training data only had one label, which is then stored as default)
+def save_model(fmodel, lang, task, vec, feats, clf, params, default=None):
+    model = {
+        'version': MODEL_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'lang': lang,
+        'task': task,
+        'vec': vec,
+        'feats': feats,
+        'clf': clf,
+        'params': params,
+        'default': default,
+    }
+    with open(fmodel, 'wb') as omodel:
+        pickle.dump(model, omodel, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# load a model artifact stored with save_model
+def load_model(fmodel):
+    with open(fmodel, 'rb') as imodel:
+        model = pickle.load(imodel)
+
+    if model.get('version') != MODEL_VERSION:
+        raise ValueError('Model ' + fmodel + ' has version ' + str(model.get('version')) +
+                         ', expected ' + str(MODEL_VERSION) + '. Train it again.')
+
+    return model
+
+
+# classifiers of a prediction worker process, loaded once from their shared artifacts
+# (the last ones used are kept, a pool may predict with the classifiers of several tasks in turn)
+WORKER_CLFS = 4
+worker_clfs = OrderedDict()
+
+
+def predict_block(fclf, X):
+    if fclf not in worker_clfs:
+        worker_clfs[fclf] = joblib.load(fclf, mmap_mode='r')
+        if len(worker_clfs) > WORKER_CLFS:
+            worker_clfs.popitem(last=False)
+    worker_clfs.move_to_end(fclf)
+    return worker_clfs[fclf].predict(X)
+
+
+# a pool of worker processes whose processes are all started now, e.g. before the caller starts
+# threads, so that no process is forked while another thread runs (they are otherwise forked
+# when the first task is submitted); the pool can be shared by predict_blocks and optimize_params
+def worker_pool(workers):
+    pool = ProcessPoolExecutor(max_workers=workers)
+    list(pool.map(abs, range(workers)))
+    return pool
+
+
+# predictions of the rows of a matrix, yielded in order for every block of chunk_size rows
+# (all at once with 0 and one worker), so that a memory-mapped matrix (see csrstore.py) is only
+# read block by block; with several workers the blocks (by default one per worker) are predicted
+# on a process pool (executor, shared by the caller, or one of its own): the classifier is dumped once
+# into an artifact that every worker memory-maps (the support vectors are shared through the page cache
+# instead of being pickled with every block) and at most two blocks per worker are in flight
+def predict_blocks(clf, X, chunk_size=0, workers=1, executor=None):
+    n = X.shape[0]
+    size = max(1, chunk_size or (-(-n // workers) if workers > 1 else n))
+    if n <= size:
+        yield clf.predict(X)
+    elif workers <= 1:
+        for i in range(0, n, size):
+            yield clf.predict(X[i:i + size])
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            fclf = os.path.join(tmp, 'clf.joblib')
+            joblib.dump(clf, fclf)
+            pool = executor or ProcessPoolExecutor(max_workers=workers)
+            pending = deque()
+            try:
+                for i in range(0, n, size):
+                    pending.append(pool.submit(predict_block, fclf, X[i:i + size]))
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+                if pool is not executor:
+                    pool.shutdown()
+
+
+# predict the rows of a matrix in blocks (see predict_blocks)
+def predict_chunked(clf, X, chunk_size=0, workers=1):
+    return np.concatenate(list(predict_blocks(clf, X, chunk_size, workers)))
+
+
+# predict labels for a feature matrix with a loaded model
+def predict_model(model, X, chunk_size=0, workers=1):
+    if model['clf'] is None:
+        return [model['default']] * int(X.shape[0])
+    return list(predict_chunked(model['clf'], X, chunk_size, workers))
+
+
+# predict the labels of the tweets (rows of X) and of their authors (codes are the author of every row)
+# the label of an author is its prediction in author mode, else the majority of its tweets
+# with dup (see dedup.py) the rows of X are the distinct texts, whose labels are expanded to every tweet
+# returns the tweet labels and { author : label }
+def predict_authors(model, X, authors, codes, chunk_size=0, workers=1, dup=None):
+    if model['feats'].get('authors'):
+        how = model['feats']['authors']
+        P = pool_authors(X, codes, len(authors), how) if dup is None else dup.pool(X, codes, len(authors), how)
+        Yguess = predict_model(model, P, chunk_size, workers)
+        return [Yguess[c] for c in codes], dict(zip(authors, Yguess))
+    Yguess = predict_model(model, X, chunk_size, workers)
+    if dup is not None:
+        Yguess = dup.expand(Yguess).tolist()
+    return Yguess, majority_vote(authors, codes, Yguess)
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# this script writes classification results into prediction and truth files
+
+from pathlib import Path
+from itertools import chain, islice
+
+import numpy as np
+
+
+# number of tweets read from the table and written at once
+WRITE_BATCH = 10000
+
+
+# print results into a file (id tweet prediction), the tweets are those of a table (see utils/table.py)
+# (they are read in batches, so the texts of the table are never all in memory)
+def write_predictions(table, fout, task, Yguess):
+    write_prediction_blocks(table, fout, task, [Yguess])
+
+
+# write_predictions of the labels of consecutive blocks of rows (e.g. of model.predict_blocks),
+# every block is written as soon as it is given; returns the labels of all rows
+def write_prediction_blocks(table, fout, task, blocks):
+    authors, codes = table.categories('id'), table.codes('id')
+    guesses = chain.from_iterable(blocks)
+    Yguess = []
+    with open(fout, 'w') as ofile:
+        ofile.write('id\ttweet\t' + str(task) + '\n')
+        start = 0
+        for tweets in table.text_batches('tweet', WRITE_BATCH):
+            ids = codes[start:start + len(tweets)].tolist()
+            batch = list(islice(guesses, len(tweets)))
+            ofile.writelines(authors[c] + '\t' + tweet + '\t' + guess + '\n'
+                             for c, tweet, guess in zip(ids, tweets, batch))
+            Yguess.extend(batch)
+            start += len(tweets)
+    return Yguess
+
+
+# majority label of every author (codes are the integer author ids of the tweets)
+# counted as a group-by over author x label, ties go to the label the author got first
+# (as with Counter.most_common): returns { author : label } of the authors with tweets
+def majority_vote(authors, codes, Yguess):
+    if not len(Yguess):
+        return {}
+    codes = np.asarray(codes, dtype=np.int64)
+    labels, lab = np.unique(np.asarray(Yguess), return_inverse=True)
+    lab = lab.ravel()
+    cells = codes * len(labels) + lab
+    counts = np.bincount(cells, minlength=len(authors) * len(labels)).reshape(len(authors), len(labels))
+
+    first = np.full(len(authors) * len(labels), len(cells), dtype=np.int64)
+    np.minimum.at(first, cells, np.arange(len(cells)))
+    first = first.reshape(len(authors), len(labels))
+
+    winner = np.where(counts == counts.max(axis=1, keepdims=True), first, len(cells)).argmin(axis=1)
+    voted = counts.sum(axis=1) > 0
+    return {auth: str(labels[w]) for auth, w, v in zip(authors, winner.tolist(), voted.tolist()) if v}
+
+
+# output the label of each author into the truth file
+def write_truth(ftruth, auth2label):
+
+    # check if truth file exists, else, initialize
+    if not Path(ftruth).is_file():
+        with open(ftruth, 'w') as otruth:
+            for auth in auth2label:
+                otruth.write(auth + '\n')
+
+    newlines = []
+    with open(ftruth, 'r') as otruth:
+        for line in otruth:
+            auth = line.split(':::')[0].strip()
+            if auth in auth2label:
+                newlines.append(line.rstrip('\n') + ':::' + auth2label[auth] + '\n')
+
+    with open(ftruth, 'w') as otruth:
+        otruth.writelines(newlines)
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# this script tags tweets with POS tags (penn treebank tagset, nltk) in batches
+# the tag strings are cached per tweet in a sqlite database, so a tweet is only tagged once
+# (also across runs and between the train and the test data)
+
+import os
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import nltk
+from nltk.tag import pos_tag_sents
+
+from hashvec import chunks
+
+
+# number of tweets tagged at once (by a worker)
+TAG_CHUNK = 5000
+
+# tagger used, part of the cache keys
+TAGGER = 'nltk-' + nltk.__version__ + '-perceptron'
+
+
+# represent a tweet as the string of the POS tags of its tokens
+def tag_chunk(tweets):
+    return [' '.join(tag for _, tag in tags) for tags in pos_tag_sents([t.split() for t in tweets])]
+
+
+# cache of tag strings: { hash of tagger and tweet : tags }
+class TagCache:
+
+    def __init__(self, fdb):
+        os.makedirs(os.path.dirname(os.path.abspath(fdb)), exist_ok=True)
+        self.db = sqlite3.connect(fdb, timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS tags (key BLOB PRIMARY KEY, tags TEXT)')
+
+    @staticmethod
+    def key(tweet):
+        return hashlib.blake2b((TAGGER + '\n' + tweet).encode('utf-8'), digest_size=16).digest()
+
+    # tags of the cached tweets: { tweet : tags }
+    def get(self, tweets):
+        found = {}
+        for batch in chunks(list(tweets), 500):
+            keys = {self.key(t): t for t in batch}
+            rows = self.db.execute('SELECT key, tags FROM tags WHERE key IN (' + ','.join('?' * len(keys)) + ')',
+                                   list(keys))
+            for key, tags in rows:
+                found[keys[key]] = tags
+        return found
+
+    def put(self, tweet2tags):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO tags VALUES (?, ?)',
+                                [(self.key(t), tags) for t, tags in tweet2tags.items()])
+
+    def close(self):
+        self.db.close()
+
+
+# POS tag strings of a list of tweets
+# every unique tweet is tagged once, in chunks on a process pool when workers > 1;
+# fcache is an optional sqlite database of the tags of earlier calls
+def tag_strings(tweets, workers=1, fcache=None):
+    unique = list(dict.fromkeys(tweets))
+
+    cache = TagCache(fcache) if fcache else None
+    try:
+        tweet2tags = cache.get(unique) if cache else {}
+        missing = [t for t in unique if t not in tweet2tags]
+
+        batches = list(chunks(missing, TAG_CHUNK))
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                tagged = list(pool.map(tag_chunk, batches))
+        else:
+            tagged = [tag_chunk(batch) for batch in batches]
+
+        new = {}
+        for batch, tags in zip(batches, tagged):
+            new.update(zip(batch, tags))
+        if cache and new:
+            cache.put(new)
+        tweet2tags.update(new)
+    finally:
+        if cache:
+            cache.close()
+
+    return [tweet2tags[t] for t in tweets]
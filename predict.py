@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# this script scores a directory of author XML files with trained model artifacts
+# the data is preprocessed once and classified with every given model
+
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+
+from dedup import find_duplicates
+from feats import get_features
+from model import load_model, predict_authors
+from output import write_predictions, write_truth
+from utils.cache import EntryCache
+from utils.instrument import Metrics
+from utils.pipeline import author_files, preprocess
+from utils.table import Table, write_table
+from utils.tokenizer import TokenizerPool
+
+
+ROOTDIR = os.path.dirname(os.path.abspath(__file__))
+UTILSDIR = os.path.join(ROOTDIR, 'utils')
+
+
+parser = argparse.ArgumentParser(description='Predict author profiles with trained models.')
+parser.add_argument('idir', help='directory with author XML files')
+parser.add_argument('odir', help='output directory for predictions and truth_pred.txt')
+parser.add_argument('fmodels', nargs='+', help='model artifacts saved by train.py (same language)')
+parser.add_argument('--cache', help='directory of the cache of preprocessed author files and features (default: no cache)')
+parser.add_argument('--workers', type=int, default=1, help='number of processes for chunked transforms and prediction')
+parser.add_argument('--chunk-size', type=int, default=0,
+                    help='featurize and predict out of core in chunks of this many tweets (0: all in memory)')
+parser.add_argument('--dedup', action='store_true',
+                    help='featurize and predict every distinct text once (the predictions are the same)')
+parser.add_argument('--metrics', help='JSON lines file the stage measurements are appended to')
+parser.add_argument('--profile', help='directory for cProfile output of every stage')
+parser.add_argument('--tweetnlp', default=os.path.join(ROOTDIR, 'tools', 'ark-tweet-nlp-0.3.2'),
+                    help='CMU Tweet NLP directory')
+args = parser.parse_args()
+
+
+models = [load_model(f) for f in args.fmodels]
+lang = models[0]['lang']
+if any(m['lang'] != lang for m in models):
+    sys.exit('All models must be trained for the same language')
+
+# measurements of the stages of this run
+metrics = Metrics({'script': 'predict', 'lang': lang}, args.metrics, args.profile)
+
+
+os.makedirs(args.odir, exist_ok=True)
+ftruth = os.path.join(args.odir, 'truth_pred.txt')
+if os.path.isfile(ftruth):
+    os.remove(ftruth)
+
+with tempfile.TemporaryDirectory() as tmp:
+    ftable = os.path.join(tmp, 'data.table')
+
+    # extract, clean, tokenize and remove stopwords in one pass (the texts of both tasks are the same)
+    if not author_files(args.idir):
+        sys.exit('No author files found in ' + args.idir)
+    cache = EntryCache(args.cache) if args.cache else None
+    with TokenizerPool(args.tweetnlp) as tokenizer, metrics.stage('preprocess') as s:
+        fstopwords = os.path.join(UTILSDIR, 'stopwords', 'stopwords_' + lang + '.txt')
+        write_table(ftable, preprocess(args.idir, fstopwords, tokenizer, cache, args.workers, metrics))
+        s.rows(len(Table(ftable)))
+
+    data = Table(ftable)
+    authors, codes = data.categories('id'), np.asarray(data.codes('id'), dtype=np.int64)
+
+    # with --dedup the copies of a text (retweets, promo tweets) share a feature row, see dedup.py
+    dup = None
+    if args.dedup:
+        with metrics.stage('dedup') as s:
+            dup = find_duplicates(data)
+            s.rows(len(dup))
+            s.set(texts=len(dup.first))
+
+    # classify with every model
+    for model in models:
+        print('Classifying ' + model['task'] + ' with model trained on ' + model['created'])
+        with metrics.stage('features', task=model['task']) as s:
+            X, _ = get_features(data, lang, model['vec'], model['feats'], args.workers, cache, metrics,
+                                args.chunk_size, os.path.join(tmp, model['task'] + '.csr'), dup)
+            s.matrix(X)
+        with metrics.stage('predict', task=model['task']) as s:
+            Yguess, auth2label = predict_authors(model, X, authors, codes, args.chunk_size, args.workers, dup)
+            s.matrix(X)
+
+        fpred = os.path.join(args.odir, lang + '-' + model['task'] + '.pred')
+        with metrics.stage('output', task=model['task']) as s:
+            write_predictions(data, fpred, model['task'], Yguess)
+            write_truth(ftruth, auth2label)
+            s.rows(len(Yguess))
+        print('Predictions written into ' + fpred)
@@ -28,6 +28,21 @@ LANGS=("italian" "dutch")
 # perform svm parameter search (allowed: 0, 1)
 OPTIMIZE=0
 
+# number of hashed ngram features (0 fits a vocabulary instead)
+HASHING=0
+
+# classifier backend for linear kernels (allowed: svc, liblinear, sgd)
+BACKEND=svc
+
+# cache of preprocessed author files and features, reused by later runs (empty: no cache)
+CACHE=$ROOTDIR/cache
+
+# number of jobs run in parallel
+WORKERS=$(nproc)
+
+# number of CMU Tweet NLP processes shared by all languages
+TOKENIZERS=2
+
 # tools directory
 TOOLSDIR=$ROOTDIR/tools
 
@@ -73,81 +88,14 @@ echo '[INFO] CMU Tweet NLP setup finished'
 echo ''
 
 
-# iterate over data subsets
-for (( i=0; i<${#DATA[@]}; i++ )); do
-    d=${DATA[$i]}
-    dn=${DATANAMES[$i]}
-
-    # iterate over languages
-    for l in ${LANGS[@]}; do
-        rm -f "${DATA[0]}/$l/truth_pred.txt"
-        rm -f "${DATA[1]}/$l/truth_pred.txt"
-
-		    # write data into single files
-		    FEATSDIR="$d/$l/features"
-		    rm -rf $FEATSDIR
-		    mkdir -p $FEATSDIR
-		    python3 ${UTILSDIR}/dir_extract.py "$d/$l" "$FEATSDIR/$dn-$l-${TASKS[0]}.txt" "$FEATSDIR/$dn-$l-${TASKS[1]}.txt"
-
-		    # for each classification problem
-		    for t in ${TASKS[@]}; do
-			      if [ -f "$FEATSDIR/$dn-$l-$t.txt" ]; then
-
-				        echo "[INFO] Tokenizing $l $dn $t files..."
-
-				        # clean file
-				        python3 ${UTILSDIR}/file_clean.py "$FEATSDIR/$dn-$l-$t.txt" 2 "$FEATSDIR/$dn-$l-$t.cln"
-
-				        # tokenize file
-				        pushd ${TWEETNLPDIR} > /dev/null
-				        . ${UTILSDIR}/file_tokenize.sh "$FEATSDIR/$dn-$l-$t.cln" 2 "$FEATSDIR/$dn-$l-$t.cmu"
-				        popd > /dev/null
-
-				        # remove stopwords
-				        python3 ${UTILSDIR}/file_stopwords.py "$FEATSDIR/$dn-$l-$t.cmu" $STOPWORDSDIR/"stopwords_${l}.txt" 2 "$FEATSDIR/$dn-$l-$t.tok"
-            fi
-
-            # remove intermediate files
-            rm -f "$FEATSDIR/$dn-$l-$t.cln"
-            rm -f "$FEATSDIR/$dn-$l-$t.cmu"
-		    done
-
-	  done
-done
-
-
-# iterate over languages
-for l in ${LANGS[@]}; do
-
-    d0=${DATA[0]}
-    d1=${DATA[1]}
-    dn0=${DATANAMES[0]}
-    dn1=${DATANAMES[1]}
-
-    rm -rf "$d0/$l/results"
-    rm -rf "$d1/$l/results"
-    mkdir -p "$d0/$l/results"
-    mkdir -p "$d1/$l/results"
-
-    # for each classification problem
-    for t in ${TASKS[@]}; do
-
-        # optimize/fit an svm model and use it for prediction
-        python3 ${ROOTDIR}/fit.py $l $t \
-                "$d0/$l/features/$dn0-$l-$t.txt" \
-                "$d1/$l/features/$dn1-$l-$t.txt" \
-                "$d0/$l/features/$dn0-$l-$t.tok" \
-                "$d1/$l/features/$dn1-$l-$t.tok" \
-                $OPTIMIZE \
-                "$d0/$l/results/$dn0-$l-$t.pred" \
-                "$d1/$l/results/$dn1-$l-$t.pred" \
-                "$d0/$l/truth_pred.txt" \
-                "$d1/$l/truth_pred.txt"
-
-        # evaluate prediction results
-        python3 ${ROOTDIR}/eval.py "$d0/$l/features/$dn0-$l-$t.txt" $dn0 $t "$d0/$l/features/$dn0-$l-$t.txt" "$d0/$l/results/$dn0-$l-$t.pred"
-        python3 ${ROOTDIR}/eval.py "$d1/$l/features/$dn1-$l-$t.txt" $dn1 $t "$d0/$l/features/$dn0-$l-$t.txt" "$d1/$l/results/$dn1-$l-$t.pred"
-    done
-
-done
-
+# preprocess, fit and evaluate every language and task (independent jobs run in parallel)
+python3 ${ROOTDIR}/driver.py "$DATA_TRAIN" "$DATA_TEST" \
+        --langs ${LANGS[@]} \
+        --tasks ${TASKS[@]} \
+        --optimize $OPTIMIZE \
+        --hashing $HASHING \
+        --backend $BACKEND \
+        --cache "$CACHE" \
+        --workers $WORKERS \
+        --tokenizers $TOKENIZERS \
+        --tweetnlp "$TWEETNLPDIR"
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+# this script counts the surface features of tweets (handles, hashtags, emoticons)
+# the tweets are scanned in batches by a single precompiled pattern, which only returns
+# one character per match: '@' (handle), '#' (hashtag) or any other (emoticon)
+
+import re
+import numpy as np
+
+
+# columns of the counts
+SURFACE = ['handles', 'hashtags', 'emoticons']
+
+# separator of the tweets (it can not be part of any match, and does not occur in XML texts)
+SEP = '\x00'
+
+# number of tweets joined and scanned at once (bounds the joined text and the list of matches)
+SCAN_BATCH = 10000
+
+# every match is a single character, checked against its context:
+#   separator
+#   '@' of @username
+#   '#' of #\w+
+#   first character after the whitespace of \s>?[:;=xX]-?[\(\)/SoOpPdD]{1,8} or \s<3
+# the features start with characters that none of the others contain, so this counts
+# the same (non-overlapping) matches as re.findall, and the leading character class
+# lets the regex engine skip quickly over the rest of the text
+re_surface = re.compile(SEP + r'|[@#>:;=xX<]'
+                        r'(?:(?<=@)(?=username)'
+                        r'|(?<=#)(?=\w)'
+                        r'|(?<=\s>)(?=[:;=xX]-?[\(\)/SoOpPdD])'
+                        r'|(?<=\s[:;=xX])(?=-?[\(\)/SoOpPdD])'
+                        r'|(?<=\s<)(?=3))')
+
+
+# count the surface features of every tweet into an integer array of shape num_tweets x 3
+# (out can be a preallocated array, which is filled in place)
+def surface_counts(tweets, out=None):
+    if out is None:
+        out = np.zeros((len(tweets), len(SURFACE)), dtype=np.int64)
+
+    for i in range(0, len(tweets), SCAN_BATCH):
+        batch = tweets[i:i + SCAN_BATCH]
+        block = out[i:i + len(batch)]
+        # characters of the matches of every tweet, e.g. '@@:#'
+        kinds = ''.join(re_surface.findall(SEP.join(batch))).split(SEP)
+
+        block[:, 0] = np.fromiter((k.count('@') for k in kinds), dtype=np.int64, count=len(batch))
+        block[:, 1] = np.fromiter((k.count('#') for k in kinds), dtype=np.int64, count=len(batch))
+        block[:, 2] = np.fromiter((len(k) for k in kinds), dtype=np.int64, count=len(batch))
+        block[:, 2] -= block[:, 0] + block[:, 1]
+
+    return out
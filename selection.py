@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+# this script selects the ngram features of the training data and prunes the vectorizer to them
+# the ngrams are cut off by document frequency, and the top k of the rest are kept by their
+# chi2 or mutual information with the labels; the pruned vectorizer only computes the kept ngrams
+# (the ngrams are the last columns of the feature matrix, the extra and POS features are always kept)
+
+import copy
+
+import numpy as np
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.feature_selection import chi2
+from sklearn.preprocessing import normalize
+
+from hashvec import HashingTfidfVectorizer
+from tokenids import KEY_BITS, TokenTfidfVectorizer
+
+
+# scores of the top k selection
+SCORES = ['chi2', 'mi']
+
+
+# number of ngram features of a fitted vectorizer
+def ngram_count(ngram_vec):
+    if isinstance(ngram_vec, HashingTfidfVectorizer):
+        return ngram_vec.n_features
+    if isinstance(ngram_vec, TokenTfidfVectorizer):
+        return len(ngram_vec.keys_)
+    return len(ngram_vec.vocabulary_)
+
+
+# chi2 statistic of every column with the labels, counting every row as many times as its weight
+# (the statistic of sklearn.feature_selection.chi2 on the rows repeated)
+def weighted_chi2(X, Y, sample_weight):
+    labels, y = np.unique(np.asarray(Y), return_inverse=True)
+    w = np.asarray(sample_weight, dtype=np.float64)
+    n = X.shape[0]
+    observed = (sparse.csr_matrix((w, (y, np.arange(n))), shape=(len(labels), n)) @ X).toarray()
+    feature_count = observed.sum(axis=0)
+    class_prob = np.bincount(y, weights=w, minlength=len(labels)) / w.sum()
+    expected = class_prob[:, None] * feature_count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((observed - expected) ** 2 / expected).sum(axis=0)
+
+
+# mutual information between the presence of every column and the labels (in nats)
+# (with sample_weight every row counts as many times as its weight)
+def mutual_info(X, Y, sample_weight=None):
+    labels, y = np.unique(np.asarray(Y), return_inverse=True)
+    w = np.ones(X.shape[0]) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    n = w.sum()
+    B = sparse.csr_matrix((np.ones(X.nnz), X.indices, X.indptr), shape=X.shape)
+    B.sum_duplicates()
+    B.data[:] = 1
+
+    # documents of every label with (n11) and without (n01) the column
+    rows = X.shape[0]
+    n11 = (sparse.csr_matrix((w, (y, np.arange(rows))), shape=(len(labels), rows)) @ B).toarray()
+    n1_ = n11.sum(axis=0)
+    n_1 = np.bincount(y, weights=w, minlength=len(labels))[:, None]
+    n01 = n_1 - n11
+
+    mi = np.zeros(X.shape[1])
+    for nij, ni_ in [(n11, n1_), (n01, n - n1_)]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            term = nij / n * np.log(n * nij / (ni_ * n_1))
+        mi += np.nansum(term, axis=0)
+    return mi
+
+
+# indices of the ngram columns to keep (sorted): the ones in at least min_df and at most
+# max_df (a fraction) of the rows, and of those the k with the best score ('chi2' or 'mi')
+# sample_weight counts every row as many rows (e.g. the collapsed copies of a text, see dedup.py),
+# which selects the same ngrams as the repeated rows
+def select_ngrams(X, Y, n_ngrams, min_df=1, max_df=1.0, score=None, k=0, sample_weight=None):
+    X = sparse.csr_matrix(X)[:, X.shape[1] - n_ngrams:]
+    if sample_weight is None:
+        df = np.bincount(X.indices, minlength=n_ngrams)
+        n = X.shape[0]
+    else:
+        w = np.asarray(sample_weight, dtype=np.int64)
+        df = np.bincount(X.indices, weights=np.repeat(w, np.diff(X.indptr)), minlength=n_ngrams)
+        n = w.sum()
+    keep = np.flatnonzero((df >= min_df) & (df <= max_df * n))
+
+    if score and k and k < len(keep):
+        Xk = X[:, keep]
+        if score == 'chi2':
+            scores = chi2(Xk, Y)[0] if sample_weight is None else weighted_chi2(Xk, Y, sample_weight)
+        else:
+            scores = mutual_info(Xk, Y, sample_weight)
+        scores = np.nan_to_num(scores)
+        # best scores first, ties go to the first columns
+        keep = np.sort(keep[np.argsort(-scores, kind='stable')[:k]])
+    return keep
+
+
+# the feature matrix with the kept ngram columns only; the ngram rows are normalized again,
+# which gives the same rows as the pruned vectorizer
+def keep_ngrams(X, keep, n_ngrams):
+    X = sparse.csr_matrix(X)
+    n_extra = X.shape[1] - n_ngrams
+    ngrams = normalize(X[:, n_extra + keep], norm='l2')
+    return sparse.hstack([X[:, :n_extra], ngrams], format='csr')
+
+
+# copy of a fitted vectorizer that only computes the kept ngrams (in the order of keep)
+def prune_vectorizer(ngram_vec, keep):
+    if isinstance(ngram_vec, HashingTfidfVectorizer):
+        raise ValueError('Hashed ngrams have no vocabulary to select from')
+
+    if isinstance(ngram_vec, TokenTfidfVectorizer):
+        pruned = copy.deepcopy(ngram_vec)
+        # the terms of the kept ngrams get new ids in the same order, so the keys stay sorted
+        keys = pruned.keys_[keep]
+        hi, lo = keys >> KEY_BITS, keys & ((1 << KEY_BITS) - 1)
+        used = np.unique(np.concatenate([keys[hi == 0], hi[hi > 0] - 1, lo[hi > 0]]))
+        pruned.keys_ = np.where(hi == 0, np.searchsorted(used, keys),
+                                ((np.searchsorted(used, hi - 1) + 1) << KEY_BITS) | np.searchsorted(used, lo))
+        old = np.fromiter(pruned.terms_.values(), dtype=np.int64, count=len(pruned.terms_))
+        new = np.minimum(np.searchsorted(used, old), max(len(used) - 1, 0))
+        found = (used[new] == old) if len(used) else np.zeros(len(old), dtype=bool)
+        pruned.terms_ = {t: j for t, j, f in zip(pruned.terms_, new.tolist(), found.tolist()) if f}
+        pruned.idf_ = pruned.idf_[keep]
+        return pruned
+
+    # an unfitted TfidfVectorizer with the kept ngrams as its vocabulary (as fit_tfidf_chunks in feats.py)
+    terms = sorted(ngram_vec.vocabulary_, key=ngram_vec.vocabulary_.get)
+    pruned = clone(ngram_vec).set_params(vocabulary={terms[j]: i for i, j in enumerate(keep)})
+    pruned.idf_ = ngram_vec.idf_[keep]
+    return pruned
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+# this script serves author profiles (gender and age) over HTTP with trained model artifacts
+# the models and the tokenizers are loaded once; concurrent requests of a language are
+# collected into micro-batches, which are preprocessed, featurized and classified together
+#
+#   POST /profile        author XML (as parsed by dir_extract.py), the language is taken from
+#                        its lang attribute or from ?lang=...
+#   POST /profile        JSON: {"id": ..., "lang": "english", "tweets": [...]}
+#   GET  /stats          number of requests and p50/p99 latency (ms) per language
+#
+# the response is JSON: {"id": ..., "lang": ..., "tweets": n, "gender": ..., "age": ...}
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from feats import get_features
+from freqtable import LANGS
+from model import load_model, predict_authors
+from utils.pipeline import NO_LABELS, Record, clean, filter_stopwords, parse_author_xml, read_stopwords, tokenize
+from utils.table import MemoryTable
+from utils.tokenizer import TokenizerPool
+
+
+ROOTDIR = os.path.dirname(os.path.abspath(__file__))
+STOPWORDSDIR = os.path.join(ROOTDIR, 'utils', 'stopwords')
+
+# language of the lang codes of the author files
+CODES = {code: lang for lang, code in LANGS.items()}
+
+# number of latencies kept for the statistics
+LATENCY_WINDOW = 10000
+
+
+# scores the requests of a language in micro-batches: a request waits at most max_wait seconds
+# for others, and a batch holds at most max_batch authors
+class Batcher:
+
+    def __init__(self, lang, models, tokenizer, max_batch=64, max_wait=0.005):
+        self.lang = lang
+        self.models = models
+        self.tokenizer = tokenizer
+        self.stopwords = read_stopwords(os.path.join(STOPWORDSDIR, 'stopwords_' + lang + '.txt'))
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # the statistics are updated by the handler threads of the requests
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.stats_lock = threading.Lock()
+
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # profile of an author (blocks until its batch is scored)
+    def submit(self, tweets):
+        start = time.perf_counter()
+        request = {'tweets': tweets, 'labels': {}, 'done': threading.Event()}
+        self.queue.put(request)
+        request['done'].wait()
+        with self.stats_lock:
+            self.latencies.append(1000 * (time.perf_counter() - start))
+            self.requests += 1
+
+        if 'error' in request:
+            raise RuntimeError(request['error'])
+        return request['labels']
+
+    def stats(self):
+        with self.stats_lock:
+            latencies, requests = list(self.latencies), self.requests
+        if not latencies:
+            return {'requests': requests}
+        return {'requests': requests,
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99))}
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            try:
+                self._score(batch)
+            except Exception as e:
+                for request in batch:
+                    request['error'] = str(e)
+            finally:
+                for request in batch:
+                    request['done'].set()
+
+    # preprocess, featurize and classify all the authors of a batch at once
+    # (the authors are numbered by their position in the batch)
+    def _score(self, batch):
+        records = [Record(str(i), t, t, NO_LABELS) for i, request in enumerate(batch) for t in request['tweets']]
+        records = filter_stopwords(tokenize(clean(records), self.tokenizer), self.stopwords)
+        table = MemoryTable(records)
+        authors, codes = table.categories('id'), np.asarray(table.codes('id'), dtype=np.int64)
+
+        for task, model in self.models.items():
+            X, _ = get_features(table, self.lang, model['vec'], model['feats'])
+            _, auth2label = predict_authors(model, X, authors, codes)
+            for i, request in enumerate(batch):
+                request['labels'][task] = auth2label[str(i)]
+
+
+class ProfileHandler(BaseHTTPRequestHandler):
+
+    # batchers of the served languages, set by the server
+    batchers = {}
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self._reply(200, {lang: b.stats() for lang, b in self.batchers.items()})
+        else:
+            self._reply(404, {'error': 'unknown path'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/profile':
+            return self._reply(404, {'error': 'unknown path'})
+
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        lang = parse_qs(url.query).get('lang', [None])[0]
+        try:
+            if data.lstrip().startswith(b'<'):
+                auth_id, tweets = parse_author_xml(data)
+                lang = lang or CODES.get(parse_author_lang(data))
+            else:
+                body = json.loads(data.decode('utf-8'))
+                auth_id, tweets = body.get('id'), [t.replace('\n', '').strip() for t in body['tweets']]
+                lang = lang or body.get('lang')
+        except Exception as e:
+            return self._reply(400, {'error': 'invalid request: ' + str(e)})
+
+        if lang not in self.batchers:
+            return self._reply(400, {'error': 'language not served: ' + str(lang)})
+        if not tweets:
+            return self._reply(400, {'error': 'no tweets'})
+
+        try:
+            labels = self.batchers[lang].submit(tweets)
+        except RuntimeError as e:
+            return self._reply(500, {'error': str(e)})
+        self._reply(200, dict({'id': auth_id, 'lang': lang, 'tweets': len(tweets)}, **labels))
+
+    def log_message(self, format, *args):
+        pass
+
+
+# lang attribute of an author XML document
+def parse_author_lang(data):
+    return ET.fromstring(data).attrib.get('lang')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve author profiles with trained models.')
+    parser.add_argument('fmodels', nargs='+', help='model artifacts saved by train.py (any languages and tasks)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--max-batch', type=int, default=64, help='maximum number of authors in a micro-batch')
+    parser.add_argument('--max-wait', type=float, default=5, help='maximum time (ms) a request waits for a batch')
+    parser.add_argument('--tokenizers', type=int, default=2, help='number of CMU Tweet NLP processes')
+    parser.add_argument('--tweetnlp', default=os.path.join(ROOTDIR, 'tools', 'ark-tweet-nlp-0.3.2'),
+                        help='CMU Tweet NLP directory')
+    args = parser.parse_args()
+
+    # models of every language: { lang : { task : model } }
+    models = {}
+    for f in args.fmodels:
+        model = load_model(f)
+        models.setdefault(model['lang'], {})[model['task']] = model
+        print('Loaded ' + model['lang'] + ' ' + model['task'] + ' model trained on ' + model['created'])
+
+    with TokenizerPool(args.tweetnlp, args.tokenizers) as tokenizer:
+        ProfileHandler.batchers = {lang: Batcher(lang, tasks, tokenizer, args.max_batch, args.max_wait / 1000)
+                                   for lang, tasks in models.items()}
+        server = ThreadingHTTPServer((args.host, args.port), ProfileHandler)
+        print('Serving on http://' + args.host + ':' + str(args.port))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
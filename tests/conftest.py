@@ -0,0 +1,7 @@
+# the modules of the repository are imported by the tests from its root directory
+
+import os
+import sys
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOTDIR)
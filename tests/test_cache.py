@@ -0,0 +1,18 @@
+# the cache of preprocessed author files and extra features (utils/cache.py)
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import EntryCache
+
+
+# threads of one process storing the same entry (e.g. identical author files in train and test)
+def test_put_same_key_from_threads(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    key = cache.key('author file')
+    value = [('id', 'tweet ' * 1000, 'text')] * 100
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.put(key, value), range(200)))
+
+    assert cache.get(key) == value
+    assert [f for f in os.listdir(os.path.dirname(cache._file(key))) if f.endswith('.tmp')] == []
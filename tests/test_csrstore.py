@@ -0,0 +1,54 @@
+# the on-disk store of sparse feature matrices (csrstore.py)
+
+import os
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+import csrstore
+from csrstore import CSRStore, CSRWriter
+
+
+# row blocks of a matrix with empty rows, empty blocks and unsorted duplicate entries
+def chunks(n_cols=50, seed=0):
+    rng = np.random.RandomState(seed)
+    out = [sparse.random(n, n_cols, density=0.1, random_state=rng, format='csr') for n in [7, 0, 13, 1, 20]]
+    out.append(sparse.csr_matrix((np.zeros((3, n_cols)))))
+    out.append(sparse.coo_matrix(([1.0, 2.0, 3.0], ([0, 0, 1], [4, 4, 2])), shape=(2, n_cols)))
+    return out
+
+
+# the chunks written into a store are read back as their vstack, as a whole and in blocks
+def test_round_trip(tmp_path):
+    blocks = chunks()
+    expected = sparse.vstack(blocks, format='csr')
+    expected.sum_duplicates()
+    fstore = str(tmp_path / 'train.csr')
+    with CSRWriter(fstore, 50) as writer:
+        for b in blocks:
+            writer.append(b)
+
+    store = CSRStore(fstore)
+    assert len(store) == expected.shape[0] and store.nnz == expected.nnz
+    X = store.matrix()
+    assert X.shape == expected.shape and (X != expected).nnz == 0
+    assert X.indptr.dtype == np.int32 and X.indices.dtype == np.int32
+    for size in [1, 4, 100]:
+        assert (sparse.vstack(list(store.blocks(size)), format='csr') != expected).nnz == 0
+    assert (store.rows(5, 9) != expected[5:9]).nnz == 0
+    assert os.listdir(str(tmp_path)) == ['train.csr']
+
+    with pytest.raises(ValueError):
+        CSRWriter(str(tmp_path / 'other.csr'), 49).append(blocks[0])
+
+
+# a store of more values than 32-bit row pointers can hold is refused, and nothing is left behind
+def test_int32_overflow(tmp_path, monkeypatch):
+    monkeypatch.setattr(csrstore, 'INT32_MAX', 10)
+    fstore = str(tmp_path / 'train.csr')
+    with pytest.raises(ValueError):
+        with CSRWriter(fstore, 50) as writer:
+            for b in chunks():
+                writer.append(b)
+    assert os.listdir(str(tmp_path)) == []
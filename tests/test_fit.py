@@ -0,0 +1,77 @@
+# runs of fit.py on small generated tables, for the combinations of options that share code paths
+# (author pooling after the ngram selection of every task, the collapsed duplicates of --dedup)
+
+import os
+import sys
+import random
+import subprocess
+from collections import namedtuple
+
+import pytest
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+from utils.table import write_table
+
+
+Record = namedtuple('Record', ['id', 'tweet', 'text', 'labels'])
+
+WORDS = ['huis', 'fiets', 'voetbal', 'mode', 'school', 'werk', 'muziek', 'film', 'eten', 'weer']
+
+
+# tweets of a few authors of both genders, some of them repeated by the author or retweeted by others
+def records(seed):
+    rng = random.Random(seed)
+    out = []
+    for a in range(12):
+        labels = ('MALE' if a % 2 else 'FEMALE', '18-24' if a % 3 else '25-34')
+        words = WORDS[:5] if a % 2 else WORDS[5:]
+        for _ in range(20):
+            text = ' '.join(rng.choice(words) for _ in range(6))
+            out.append(Record('author' + str(a), text, text, labels))
+            if rng.random() < 0.3:
+                out.append(Record('author' + str(a), text, text, labels))
+            if out and rng.random() < 0.2:
+                other = rng.choice(out)
+                out.append(Record('author' + str(a), 'RT ' + other.tweet, other.text, labels))
+    return out
+
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    d = tmp_path_factory.mktemp('tables')
+    write_table(str(d / 'train.table'), records(0))
+    write_table(str(d / 'test.table'), records(1))
+    return d
+
+
+def fit(tables, out, *options):
+    out.mkdir()
+    cmd = [sys.executable, os.path.join(ROOTDIR, 'fit.py'), 'dutch', 'gender,age',
+           str(tables / 'train.table'), str(tables / 'test.table'), '0',
+           str(out / 'train-{task}.pred'), str(out / 'test-{task}.pred'),
+           str(out / 'truth-train.txt'), str(out / 'truth-test.txt')] + list(options)
+    subprocess.run(cmd, cwd=ROOTDIR, check=True, stdout=subprocess.DEVNULL)
+    return {f: (out / f).read_text() for f in os.listdir(out)}
+
+
+@pytest.mark.parametrize('options', [
+    ['--authors', 'sum', '--min-df', '2'],
+    ['--authors', 'mean', '--select', 'chi2', '--k', '5'],
+    ['--authors', 'mean', '--select', 'mi', '--k', '5', '--dedup'],
+    ['--min-df', '2', '--dedup'],
+])
+def test_authors_and_selection(tables, tmp_path, options):
+    outputs = fit(tables, tmp_path / 'out', *options)
+    n_train, n_test = len(records(0)), len(records(1))
+    for task in ['gender', 'age']:
+        assert len(outputs['train-' + task + '.pred'].splitlines()) == n_train + 1
+        assert len(outputs['test-' + task + '.pred'].splitlines()) == n_test + 1
+    assert len(outputs['truth-test.txt'].splitlines()) == 12
+
+
+# the copies of a tweet are one weighted training row, which gives the same classifier
+@pytest.mark.parametrize('options', [[], ['--authors', 'mean'], ['--chunk-size', '50'],
+                                     ['--min-df', '3', '--select', 'chi2', '--k', '8'],
+                                     ['--max-df', '0.3', '--select', 'mi', '--k', '8', '--authors', 'sum']])
+def test_dedup_same_predictions(tables, tmp_path, options):
+    assert fit(tables, tmp_path / 'all', *options) == fit(tables, tmp_path / 'dedup', '--dedup', *options)
@@ -0,0 +1,66 @@
+# the table of general word frequencies (freqtable.py)
+
+import os
+import random
+import statistics as stat
+
+import numpy as np
+
+import freqtable
+from freqtable import load_table, lookup, quartile_freqs, shard_files, table_file, token_freq
+
+
+WORDS = ['de', 'het', 'een', 'fiets', 'huis', 'voetbal', 'muziek', 'xqzzyq', 'school', 'werk']
+
+
+# the new tokens go into shards (the table is not rewritten) until they are merged into the table
+def test_lookup_shards(tmp_path, monkeypatch):
+    freqdir = str(tmp_path)
+    monkeypatch.setattr(freqtable, 'MAX_SHARDS', 3)
+    expected = np.array([token_freq(w, 'dutch') for w in WORDS])
+
+    assert (lookup(WORDS[:2], 'dutch', freqdir) == expected[:2]).all()
+    assert len(shard_files('dutch', freqdir)) == 1 and not os.path.exists(table_file('dutch', freqdir))
+    assert (lookup(WORDS[:4], 'dutch', freqdir) == expected[:4]).all()
+    assert len(shard_files('dutch', freqdir)) == 2
+    # known tokens add no shard
+    assert (lookup(WORDS[3::-1], 'dutch', freqdir) == expected[3::-1]).all()
+    assert len(shard_files('dutch', freqdir)) == 2
+
+    assert (lookup(WORDS[:6], 'dutch', freqdir) == expected[:6]).all()
+    assert shard_files('dutch', freqdir) == []
+    table, = load_table('dutch', freqdir)
+    assert len(table) == 6 and (table['key'][1:] > table['key'][:-1]).all()
+
+    assert (lookup(WORDS, 'dutch', freqdir) == expected).all()
+    assert len(shard_files('dutch', freqdir)) == 1
+    assert sorted(os.listdir(freqdir)) == sorted([os.path.basename(table_file('dutch', freqdir))] +
+                                                 [os.path.basename(f) for f in shard_files('dutch', freqdir)])
+
+
+# the reference of quartile_freqs: the frequencies of every tweet sorted, and the statistics.mean of its quartiles
+def loop_freqs(tweets, freq):
+    word_freqs = []
+    for t in tweets:
+        freq_list = sorted([freq(tok) for tok in t], reverse=True)
+        freq_list[-1] = freq_list[-1] + 0.01
+        Q1 = freq_list[:max(1, int(len(freq_list)*0.25))]
+        Q2 = freq_list[int(len(freq_list)*0.25):int(len(freq_list)*0.5)] or [0]
+        Q3 = freq_list[int(len(freq_list)*0.5):int(len(freq_list)*0.75)] or [0]
+        Q4 = freq_list[int(len(freq_list)*0.75):]
+        word_freqs.append([stat.mean(Q1), stat.mean(Q2), stat.mean(Q3), stat.mean(Q4)])
+    return np.array(word_freqs).reshape(len(tweets), 4)
+
+
+# the means are exactly those of statistics.mean, also for values whose float sums are rounded
+def test_quartile_freqs_exact(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    freqs = {}
+    # frequencies of 5 decimals, over a wide range (as token_freq)
+    freq = lambda tok: freqs.setdefault(tok, round(rng.choice([1e-5, 1e-3, 1, 1e3, 5e4]) * rng.random(), 5))
+    monkeypatch.setattr(freqtable, 'token_freq', lambda tok, lang: freq(tok))
+    tweets = [['w' + str(rng.randrange(3000)) for _ in range(rng.randrange(1, 60))] for _ in range(5000)]
+
+    expected = loop_freqs(tweets, freq)
+    assert (quartile_freqs(tweets, 'dutch', str(tmp_path)) == expected).all()
+    assert (quartile_freqs(tweets + [[]], 'dutch', str(tmp_path))[:-1] == expected).all()
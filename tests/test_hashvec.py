@@ -0,0 +1,24 @@
+# the tf-idf vectorizer based on feature hashing (hashvec.py)
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from hashvec import HashingTfidfVectorizer
+
+
+DOCS = ['de fiets van het huis', 'het huis', 'voetbal op school', 'muziek en film', 'de film van school'] * 7
+
+
+# the documents can be generators, read chunk by chunk in process or on a pool of workers
+def test_chunks_and_workers():
+    ref = HashingTfidfVectorizer(n_features=2 ** 10, chunk_size=len(DOCS))
+    X = ref.fit_transform(DOCS)
+    assert X.shape == (len(DOCS), 2 ** 10)
+    # one column per ngram: the same values as TfidfVectorizer
+    assert sorted(X.data.round(12)) == sorted(TfidfVectorizer(ngram_range=(1, 2)).fit_transform(DOCS).data.round(12))
+
+    for workers in [1, 2]:
+        vec = HashingTfidfVectorizer(n_features=2 ** 10, chunk_size=4, workers=workers)
+        assert (vec.fit_transform(iter(DOCS)) != X).nnz == 0
+        assert (vec.idf_ == ref.idf_).all()
+        assert (vec.transform(d for d in DOCS) != X).nnz == 0
+        assert vec.transform(iter([])).shape == (0, 2 ** 10)
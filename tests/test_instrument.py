@@ -0,0 +1,38 @@
+# the stage measurements (utils/instrument.py)
+
+import time
+import threading
+
+from utils import instrument
+from utils.instrument import Metrics
+
+
+# a stage waiting while another thread computes: its CPU time is the one of its own thread,
+# and the peak RSS is not reset under the stage of the other thread
+def test_parallel_stages(monkeypatch):
+    resets = []
+    monkeypatch.setattr(instrument, 'reset_peak_rss', lambda: resets.append(threading.get_ident()))
+    waiting, busy = Metrics(log=None), Metrics(log=None)
+    started = threading.Event()
+
+    def compute():
+        with busy.stage('compute'):
+            started.set()
+            end = time.perf_counter() + 0.3
+            while time.perf_counter() < end:
+                pass
+
+    thread = threading.Thread(target=compute)
+    thread.start()
+    started.wait()
+    with waiting.stage('wait'):
+        thread.join()
+        with waiting.stage('inner'):
+            pass
+
+    (wait, inner), (compute,) = waiting.records[::-1], busy.records
+    assert wait['stage'] == 'wait' and wait['wall_s'] >= 0.2 and wait['cpu_s'] < 0.1
+    assert compute['cpu_s'] >= 0.1
+    # only the stage of the other thread and the inner stage (once it was done) reset the peak
+    assert resets == [thread.ident, threading.get_ident()]
+    assert not instrument.running
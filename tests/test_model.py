@@ -0,0 +1,92 @@
+# the classifiers, their parameter search and their predictions (model.py)
+
+import json
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.svm import LinearSVC
+
+import model
+from model import kfold_indices, optimize_params, predict_blocks, worker_pool
+
+
+# rows of a few classes, each around its own columns
+def dataset(n=103, n_cols=40, classes=4, seed=0):
+    rng = np.random.RandomState(seed)
+    Y = rng.randint(classes, size=n)
+    X = sparse.random(n, n_cols, density=0.2, random_state=rng, format='csr')
+    X = (X + sparse.csr_matrix((np.ones(n), (np.arange(n), Y * (n_cols // classes))), shape=(n, n_cols))).tocsr()
+    return X, np.array(['class' + str(y) for y in Y])
+
+
+# the blocks predicted on worker processes (a pool of their own or a shared one) are the predictions
+# of the whole matrix, in order, also when the last block is smaller
+@pytest.mark.parametrize('shared', [False, True])
+def test_predict_blocks_workers(shared):
+    X, Y = dataset()
+    # half of the rows relabeled, so that the predictions are not all right and their order matters
+    clf = LinearSVC(dual=True).fit(X, np.roll(Y, 50))
+    expected = clf.predict(X)
+    executor = worker_pool(2) if shared else None
+    try:
+        for chunk_size in [10, 0]:
+            blocks = list(predict_blocks(clf, X, chunk_size=chunk_size, workers=2, executor=executor))
+            sizes = [10] * 10 + [3] if chunk_size else [52, 51]
+            assert [len(b) for b in blocks] == sizes
+            assert (np.concatenate(blocks) == expected).all()
+        if shared:
+            # the shared pool is left running for the caller
+            assert executor.submit(abs, -1).result() == 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+# every row is in the dev rows of exactly one fold (and in the train rows of the others),
+# and the rows of every class are dealt evenly to the folds
+def test_kfold_indices():
+    _, Y = dataset(n=107, classes=3)
+    for folds in [2, 5]:
+        splits = kfold_indices(Y, folds, seed=1)
+        assert len(splits) == folds
+        assert sorted(np.concatenate([dev for _, dev in splits]).tolist()) == list(range(len(Y)))
+        for train, dev in splits:
+            assert sorted(np.concatenate([train, dev]).tolist()) == list(range(len(Y)))
+        for label in set(Y):
+            counts = [(Y[dev] == label).sum() for _, dev in splits]
+            assert max(counts) - min(counts) <= 1
+    assert all((a[1] == b[1]).all() for a, b in zip(kfold_indices(Y, 5, 1), kfold_indices(Y, 5, 1)))
+
+
+# a grid file is reused: the parameters it holds are not searched again, and the parameters
+# of a wider C range are added to it
+def test_grid_file(tmp_path, monkeypatch):
+    X, Y = dataset(n=60)
+    fgrid = str(tmp_path / 'grid.json')
+    searched = []
+    model_search_group = model.search_group
+
+    def search_group(X, Y, kernel, gamma, Cs, *args):
+        searched.append((kernel, gamma, list(Cs)))
+        return model_search_group(X, Y, kernel, gamma, Cs, *args)
+    monkeypatch.setattr(model, 'search_group', search_group)
+
+    params = ('linear', 1, 0)
+    best = optimize_params(X, Y, params, folds=3, fgrid=fgrid, C_values=[1, 10], gamma_values=[0.1])
+    assert sorted(searched) == [('linear', 0, [1, 10]), ('rbf', 0.1, [1, 10])]
+    with open(fgrid) as f:
+        grid = json.load(f)
+    (results,) = grid.values()
+    assert sorted(results) == ['linear 1 0', 'linear 10 0', 'rbf 1 0.1', 'rbf 10 0.1']
+
+    del searched[:]
+    assert optimize_params(X, Y, params, folds=3, fgrid=fgrid, C_values=[1, 10], gamma_values=[0.1]) == best
+    assert searched == []
+
+    optimize_params(X, Y, params, folds=3, fgrid=fgrid, C_values=[1, 10, 100], gamma_values=[0.1])
+    assert sorted(searched) == [('linear', 0, [100]), ('rbf', 0.1, [100])]
+    with open(fgrid) as f:
+        (wider,) = json.load(f).values()
+    assert set(wider) == set(results) | {'linear 100 0', 'rbf 100 0.1'}
+    assert all(wider[name] == acc for name, acc in results.items())
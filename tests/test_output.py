@@ -0,0 +1,34 @@
+# the prediction and truth outputs (output.py)
+
+import random
+from collections import Counter
+
+from output import majority_vote
+
+
+# the previous vote (reference): the most common label of every author, ties to the label it got first
+def counter_vote(authors, codes, Yguess):
+    auth2labels = {}
+    for c, guess in zip(codes, Yguess):
+        auth2labels.setdefault(authors[c], []).append(guess)
+    return {auth: Counter(labels).most_common(1)[0][0] for auth, labels in auth2labels.items()}
+
+
+def test_majority_vote_ties():
+    authors = ['a', 'b', 'c', 'd']
+    # a: tie, got MALE first; b: tie, got FEMALE first; c: no tweets; d: a single tweet
+    codes = [0, 1, 0, 1, 0, 1, 0, 1, 3]
+    Yguess = ['MALE', 'FEMALE', 'FEMALE', 'MALE', 'FEMALE', 'MALE', 'MALE', 'FEMALE', 'FEMALE']
+    assert majority_vote(authors, codes, Yguess) == {'a': 'MALE', 'b': 'FEMALE', 'd': 'FEMALE'}
+    assert majority_vote(authors, codes, Yguess) == counter_vote(authors, codes, Yguess)
+
+    rng = random.Random(0)
+    authors = ['author' + str(a) for a in range(50)]
+    codes = [rng.randrange(50) for _ in range(2000)]
+    Yguess = [rng.choice(['18-24', '25-34', '35-49', '50-XX']) for _ in codes]
+    assert majority_vote(authors, codes, Yguess) == counter_vote(authors, codes, Yguess)
+
+
+def test_majority_vote_empty():
+    assert majority_vote(['a', 'b'], [], []) == {}
+    assert majority_vote([], [], []) == {}
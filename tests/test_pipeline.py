@@ -0,0 +1,87 @@
+# the streaming preprocessing of author files (utils/pipeline.py)
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+ROOTDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+from utils import pipeline
+from utils.cache import EntryCache
+from utils.pipeline import preprocess
+
+FSTOPWORDS = os.path.join(ROOTDIR, 'utils', 'stopwords', 'stopwords_dutch.txt')
+
+
+# stands in for the CMU Tweet NLP pool: every text is its own tokenization
+class SplitTokenizer:
+
+    def tokenize(self, texts):
+        return [' '.join(t.split()) for t in texts]
+
+
+def author_dir(d, n_authors=5, n_tweets=30):
+    d.mkdir()
+    with open(d / 'truth.txt', 'w') as truth:
+        for a in range(n_authors):
+            auth = 'author' + str(a)
+            truth.write(auth + ':::' + ('MALE' if a % 2 else 'FEMALE') + ':::18-24\n')
+            tweets = ''.join('<document><![CDATA[tweet ' + str(i) + ' van @iemand ' + auth + ']]></document>'
+                             for i in range(n_tweets))
+            with open(d / (auth + '.xml'), 'w') as f:
+                f.write('<author id="' + auth + '" lang="nl">' + tweets + '</author>')
+    return str(d)
+
+
+# a corrupt entry is a miss: the author file is processed and stored again
+def test_corrupt_cache_entry(tmp_path):
+    idir = author_dir(tmp_path / 'data')
+    cache = EntryCache(str(tmp_path / 'cache'))
+    records = list(preprocess(idir, FSTOPWORDS, SplitTokenizer(), cache))
+
+    entries = [os.path.join(root, f) for root, _, files in os.walk(cache.cachedir) for f in files]
+    assert len(entries) == 5
+    with open(entries[0], 'wb') as f:
+        f.write(b'not a pickle')
+
+    assert list(preprocess(idir, FSTOPWORDS, SplitTokenizer(), cache)) == records
+    assert all(cache.get(os.path.basename(e)[:-len('.pkl')]) is not None for e in entries)
+    assert list(preprocess(idir, FSTOPWORDS, SplitTokenizer())) == records
+
+
+# an executor running the tasks in the calling thread, counting the ones submitted and not yet taken
+class CountingExecutor:
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def submit(self, func, *args):
+        executor = self
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        class Done:
+            def result(self):
+                executor.in_flight -= 1
+                return func(*args)
+
+            def cancel(self):
+                return False
+
+        return Done()
+
+
+# the files are parsed in order on a pool (own or shared), with at most two chunks per worker in flight
+def test_read_authors_bounded(tmp_path, monkeypatch):
+    idir = author_dir(tmp_path / 'data', n_authors=20)
+    monkeypatch.setattr(pipeline, 'PARSE_CHUNK', 1)
+    serial = list(pipeline.read_authors(idir))
+    assert len(serial) == 20 * 30
+
+    executor = CountingExecutor()
+    assert list(pipeline.read_authors(idir, workers=2, executor=executor)) == serial
+    assert executor.max_in_flight == 4
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('forkserver')) as shared:
+        assert list(pipeline.read_authors(idir, workers=2, executor=shared)) == serial
+    assert list(pipeline.read_authors(idir, workers=2)) == serial
@@ -0,0 +1,63 @@
+# the surface feature scanner (scanner.py) and the cleaning pass (utils/pipeline.py)
+# against the previous implementations (three re.findall per tweet, five re.sub per field)
+
+import re
+import random
+import string
+
+import numpy as np
+
+import scanner
+from scanner import surface_counts
+from utils.pipeline import clean_text
+
+
+# previous surface feature counts (reference)
+def findall_counts(tweets):
+    counts = []
+    for t in tweets:
+        counts.append([len(re.findall(r'@username', t)),
+                       len(re.findall(r'#\w+', t)),
+                       len(re.findall(r'\s>?[:;=xX]-?[\(\)/SoOpPdD]{1,8}|\s<3', t))])
+    return np.array(counts, dtype=np.int64).reshape(len(tweets), 3)
+
+
+# previous cleaning pass (reference)
+def sub_clean(text):
+    a = re.sub(r'([\D])\1\1+', r'\1\1', text)
+    b = re.sub(r'@([A-Za-z0-9_]+)', r'@username ', a)
+    c = re.sub(r'http(s?)://(\S+)', r'@url ', b)
+    d = re.sub(r'(\\[tnrfv])+', r' ', c)
+    e = re.sub(r'([^\w\s' + string.punctuation + r'])', r' \1 ', d)
+    return e.lower()
+
+
+# synthetic cases, and random tweets made of the pieces of the features
+def raw_tweets(n=3000, seed=0):
+    raw = ['@@@user http://t.co/@abc #tag :) xD <3 \\n\\t ok', 'soooo :-))) #a#b @user_1@user_2 ♥ ☺',
+           'no match here', '', ' :P #x:D @username#y', '#a#b##c @usernameusername  :)  <3 >:-D',
+           ' >:) x> x:) :x', '\t:( ;P\u2003=D']
+    pieces = ['@', '@user', '#', '#tag', ' ', '  ', ':', ';', '=', 'x', 'X', '-', ')', '(', '/', 'D', 'P',
+              '<3', '>', 'http://t.co/', 'ok', 'ooo', '\\n', '♥', '\u2003', '_']
+    rng = random.Random(seed)
+    raw += [''.join(rng.choice(pieces) for _ in range(rng.randrange(30))) for _ in range(n)]
+    return raw
+
+
+def test_clean_text():
+    raw = raw_tweets()
+    assert [clean_text(t) for t in raw] == [sub_clean(t) for t in raw]
+
+
+# the counts are the same across the scanned batches, in a new or a preallocated array
+def test_surface_counts(monkeypatch):
+    cleaned = [sub_clean(t) for t in raw_tweets()]
+    expected = findall_counts(cleaned)
+    assert expected.sum() > 0
+    assert (surface_counts(cleaned) == expected).all()
+
+    monkeypatch.setattr(scanner, 'SCAN_BATCH', 7)
+    out = np.full((len(cleaned), 3), -1, dtype=np.int64)
+    assert surface_counts(cleaned, out) is out
+    assert (out == expected).all()
+    assert surface_counts([]).shape == (0, 3)
@@ -0,0 +1,85 @@
+# the ngram selection and the pruned vectorizers (selection.py)
+
+import random
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from dedup import Duplicates
+from selection import keep_ngrams, prune_vectorizer, select_ngrams
+from tokenids import KEY_BITS, TokenTfidfVectorizer, encode
+
+
+WORDS = ['huis', 'fiets', 'voetbal', 'mode', 'school', 'werk', 'muziek', 'film', 'eten', 'weer', 'trein', 'zon']
+
+
+# tweets of a few authors, many of them repeated by the author or copied from others
+def tweets(n_authors=10, n_tweets=30, seed=0):
+    rng = random.Random(seed)
+    docs, codes, labels = [], [], []
+    for a in range(n_authors):
+        words = WORDS[:8] if a % 2 else WORDS[4:]
+        for _ in range(n_tweets):
+            r = rng.random()
+            if docs and r < 0.3:
+                doc = rng.choice(docs)
+            elif docs and r < 0.5 and codes[-1] == a:
+                doc = docs[-1]
+            else:
+                doc = ' '.join(rng.choice(words) for _ in range(rng.randrange(1, 6)))
+            docs.append(doc)
+            codes.append(a)
+            labels.append('MALE' if a % 2 else 'FEMALE')
+    return docs, codes, labels
+
+
+# the collapsed copies weighted by their count select the same ngrams as all the tweets
+@pytest.mark.parametrize('options', [
+    dict(min_df=3), dict(max_df=0.2), dict(min_df=2, score='chi2', k=10), dict(score='mi', k=10),
+    dict(min_df=2, max_df=0.5, score='chi2', k=5),
+])
+def test_select_dedup(options):
+    docs, codes, labels = tweets()
+    X = TfidfVectorizer(ngram_range=(1, 2)).fit_transform(docs)
+    dup = Duplicates(docs, codes)
+    assert len(dup.weights) < len(docs)
+
+    Ygroups = [labels[i] for i in dup.group_rows.tolist()]
+    keep = select_ngrams(X, labels, X.shape[1], **options)
+    assert 0 < len(keep) < X.shape[1]
+    assert (select_ngrams(dup.group_matrix(X[dup.first]), Ygroups, X.shape[1], sample_weight=dup.weights,
+                          **options) == keep).all()
+
+
+# the pruned vectorizers compute the kept ngram columns of the full vectorizer (normalized again),
+# for kept bigrams of terms whose unigrams are left out, unknown tokens and tweets without kept ngrams
+@pytest.mark.parametrize('kind', ['tokens', 'sklearn'])
+def test_prune_vectorizer(kind):
+    docs, _, _ = tweets(seed=1)
+    test, _, _ = tweets(n_authors=4, seed=2)
+    test += ['', 'onbekend huis', 'fiets']
+    if kind == 'tokens':
+        vec = TokenTfidfVectorizer().fit([encode(docs)])
+        transform = lambda v, d: v.transform(encode(d))
+        n = len(vec.keys_)
+    else:
+        vec = TfidfVectorizer(ngram_range=(1, 2)).fit(docs)
+        transform = lambda v, d: v.transform(d)
+        n = len(vec.vocabulary_)
+
+    keep = np.sort(np.random.RandomState(0).choice(n, n // 3, replace=False))
+    if kind == 'tokens':
+        keys = vec.keys_[keep]
+        bigram_terms = np.concatenate([(keys >> KEY_BITS)[keys >> KEY_BITS > 0] - 1,
+                                       (keys & ((1 << KEY_BITS) - 1))[keys >> KEY_BITS > 0]])
+        assert not np.isin(bigram_terms, keys[keys >> KEY_BITS == 0]).all()
+    Xfull = transform(vec, docs)
+    pruned = prune_vectorizer(vec, keep)
+    for d in [docs, test]:
+        X = keep_ngrams(transform(vec, d), keep, n)
+        Xp = transform(pruned, d)
+        assert Xp.shape == (len(d), len(keep))
+        assert np.abs((Xp - X).toarray()).max() <= 1e-15
+    # the full vectorizer is left as it was
+    assert (transform(vec, docs) != Xfull).nnz == 0
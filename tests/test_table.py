@@ -0,0 +1,67 @@
+# the columnar tables of preprocessed tweets (utils/table.py)
+
+import random
+
+import numpy as np
+
+from utils.pipeline import Record
+from utils.table import MemoryTable, Table, decode_rows, write_table
+
+
+PIECES = ['huis', 'fiets', ' ', 'é', 'ß', 'ü', '€', '中文', '😀', '👍🏽', '\t', '\n', '\r\n', ':)', '@username', '']
+
+
+# tweets of a few authors: ascii, multi-byte and emoji characters, empty tweets, tabs and newlines in the text
+def records(n=500, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        tweet = ''.join(rng.choice(PIECES) for _ in range(rng.randrange(0, 8)))
+        text = '' if i % 7 == 0 else ' '.join(tweet.split())
+        auth = 'author' + str(rng.randrange(20))
+        out.append(Record(auth, tweet, text, (rng.choice(['MALE', 'FEMALE']), rng.choice(['18-24', '25-34']))))
+    return out
+
+
+def columns(table, size):
+    return {'tweet': table.text('tweet'), 'tok': table.text('tok'),
+            'tweet_batches': [t for batch in table.text_batches('tweet', size) for t in batch],
+            'tok_batches': [t for batch in table.text_batches('tok', size) for t in batch],
+            'categories': {col: table.categories(col) for col in ['id', 'gender', 'age']},
+            'codes': {col: np.asarray(table.codes(col)).tolist() for col in ['id', 'gender', 'age']},
+            'labels': {col: table.labels(col) for col in ['id', 'gender', 'age']}}
+
+
+# the texts and labels written by write_table are read back by Table as MemoryTable holds them
+def test_round_trip(tmp_path):
+    recs = records()
+    ftable = str(tmp_path / 'train.table')
+    write_table(ftable, iter(recs))
+    table, memory = Table(ftable), MemoryTable(recs)
+
+    assert len(table) == len(memory) == len(recs)
+    assert table.text('tweet') == [r.tweet for r in recs]
+    assert table.text('tok') == [r.text for r in recs]
+    assert table.labels('id') == [r.id for r in recs]
+    assert table.labels('age') == [r.labels[1] for r in recs]
+    for size in [1, 7, 1000]:
+        assert columns(table, size) == columns(memory, size)
+
+
+# tables whose text columns are empty (no rows, or only empty texts)
+def test_empty_texts(tmp_path):
+    for recs in [[], [Record('a', '', '', ('MALE', '18-24'))] * 3]:
+        ftable = str(tmp_path / ('t' + str(len(recs)) + '.table'))
+        write_table(ftable, recs)
+        assert columns(Table(ftable), 2) == columns(MemoryTable(recs), 2)
+
+
+# the byte offsets of the rows are converted to the character offsets of the decoded text
+def test_decode_rows():
+    texts = ['a', '', 'é€', '😀x', '', '\t\n', 'zz']
+    data = b''.join(t.encode('utf-8') for t in texts)
+    offsets = np.concatenate([[0], np.cumsum([len(t.encode('utf-8')) for t in texts])])
+    assert decode_rows(np.frombuffer(data, dtype=np.uint8), offsets) == texts
+    # a slice of the rows, with the offsets relative to its first byte
+    assert decode_rows(np.frombuffer(data[offsets[2]:offsets[5]], dtype=np.uint8), offsets[2:6] - offsets[2]) == \
+        texts[2:5]
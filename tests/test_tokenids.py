@@ -0,0 +1,47 @@
+# the token ids of the tweets and the tf-idf vectorizer of their ngrams (tokenids.py)
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from tokenids import KEY_BITS, TokenTfidfVectorizer, encode
+
+
+TRAIN = ['De fiets van het huis', 'het huis :) !', '', 'voetbal', 'de Fiets , de fiets',
+         '@username x <3 #tag', 'school en werk en muziek', 'huis']
+TEST = ['de fiets van mijn huis', 'onbekend', '', 'huis', 'het nieuwe huis :)', 'Werk ! werk']
+
+
+# the name of the term or bigram of every column (as in TfidfVectorizer)
+def column_names(vec):
+    terms = {j: t for t, j in vec.terms_.items()}
+    hi, lo = vec.keys_ >> KEY_BITS, vec.keys_ & ((1 << KEY_BITS) - 1)
+    return [terms[l] if h == 0 else terms[h - 1] + ' ' + terms[l] for h, l in zip(hi.tolist(), lo.tolist())]
+
+
+# the same vocabulary, idf weights and rows as TfidfVectorizer splitting the tweets on whitespace,
+# with unknown tokens at transform time, empty tweets and tweets without bigrams
+def test_same_as_tfidf_vectorizer():
+    ref = TfidfVectorizer(ngram_range=(1, 2), token_pattern=r'\S+')
+    Xref = ref.fit_transform(TRAIN)
+    vec = TokenTfidfVectorizer()
+    X = vec.fit_transform(encode(TRAIN))
+
+    names = column_names(vec)
+    assert sorted(names) == sorted(ref.vocabulary_)
+    cols = [ref.vocabulary_[n] for n in names]
+    assert np.abs(vec.idf_ - ref.idf_[cols]).max() <= 1e-15
+    assert np.abs(X.toarray() - Xref.toarray()[:, cols]).max() <= 1e-15
+    assert X[2].nnz == 0 and X[3].nnz == 1
+
+    Y = vec.transform(encode(TEST))
+    assert Y.shape == (len(TEST), len(names))
+    assert np.abs(Y.toarray() - ref.transform(TEST).toarray()[:, cols]).max() <= 1e-15
+    assert Y[1].nnz == 0 and Y[2].nnz == 0 and Y[3].nnz == 1
+
+
+# the token ids of a subset of the tweets
+def test_take():
+    docs = encode(TRAIN)
+    sub = docs.take(np.array([4, 2, 0]))
+    assert [' '.join(sub.vocab[i] for i in sub.ids[sub.indptr[r]:sub.indptr[r + 1]]) for r in range(len(sub))] == \
+        [' '.join(TRAIN[r].split()) for r in [4, 2, 0]]
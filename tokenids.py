@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# this script interns the tokens of tokenized tweets into integer ids, once for all feature stages
+# the tweets become a ragged array of int32 token ids (CSR-style: the ids of all tweets and the
+# offsets of every tweet) with a vocabulary of their distinct tokens; the ngram, word frequency
+# and contraction features work on the ids, so a tweet is split only once
+
+from array import array
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+
+# bigram (a, b) of term ids has the key (a + 1) << KEY_BITS | b, above the keys of the unigrams (a)
+KEY_BITS = 32
+
+
+# the token ids of a list of tweets
+class TokenIds:
+
+    def __init__(self, ids, indptr, vocab):
+        self.ids = ids # token ids of all tweets (int32)
+        self.indptr = indptr # the ids of tweet i are ids[indptr[i]:indptr[i + 1]] (int64)
+        self.vocab = vocab # token of every id
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    # number of tokens of every tweet
+    def lengths(self):
+        return np.diff(self.indptr)
+
+    # tweet of every token
+    def rows(self):
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    # the tweets of a list of row indices (with the same vocabulary)
+    def take(self, rows):
+        lengths = self.lengths()[rows]
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        pos = np.arange(indptr[-1]) + np.repeat(self.indptr[rows] - indptr[:-1], lengths)
+        return TokenIds(self.ids[pos], indptr, self.vocab)
+
+    # value of a function of the token of every id (it is called once per distinct token)
+    def token_values(self, func, dtype=np.int64):
+        return np.fromiter((func(tok) for tok in self.vocab), dtype=dtype, count=len(self.vocab))
+
+    # sum of the values of the tokens (indexed by id) of every tweet
+    def count(self, values):
+        return np.bincount(self.rows(), weights=values[self.ids], minlength=len(self)).astype(values.dtype)
+
+
+# split every tweet on whitespace (once) and intern its tokens
+def encode(tweets):
+    index = {}
+    ids = array('i')
+    indptr = np.zeros(len(tweets) + 1, dtype=np.int64)
+    for i, t in enumerate(tweets):
+        toks = t.split()
+        indptr[i + 1] = len(toks)
+        ids.extend([index.setdefault(tok, len(index)) for tok in toks])
+    np.cumsum(indptr, out=indptr)
+    return TokenIds(np.frombuffer(ids, dtype=np.int32), indptr, list(index))
+
+
+# tf-idf vectorizer of the unigrams and bigrams of token ids, with the weighting of TfidfVectorizer
+# (lowercased terms, raw counts, smoothed idf, l2 normalization); unlike its token pattern,
+# every token is a term, including one-character tokens, punctuation and emoticons
+# the vocabulary is the ids of the lowercased terms and the sorted ngram keys (one per column)
+class TokenTfidfVectorizer:
+
+    def __init__(self):
+        self.terms_ = {}
+        self.keys_ = None
+        self.idf_ = None
+
+    # ngram keys of the tweets and the tweet of every key; the terms not seen yet are added
+    # to the vocabulary when growing, otherwise the ngrams with an unknown term are left out
+    def _ngrams(self, docs, grow=False):
+        if grow:
+            terms = docs.token_values(lambda tok: self.terms_.setdefault(tok.lower(), len(self.terms_)))
+        else:
+            terms = docs.token_values(lambda tok: self.terms_.get(tok.lower(), -1))
+        tids = terms[docs.ids]
+        rows = docs.rows()
+
+        known = tids >= 0
+        pair = (rows[:-1] == rows[1:]) & known[:-1] & known[1:]
+        bigrams = ((tids[:-1][pair] + 1) << KEY_BITS) | tids[1:][pair]
+        return np.concatenate([tids[known], bigrams]), np.concatenate([rows[known], rows[:-1][pair]])
+
+    # learn the vocabulary and the idf weights from chunks of tweets (an iterable of TokenIds),
+    # counting the document frequencies chunk by chunk
+    def fit(self, chunks):
+        self.terms_ = {}
+        keys = np.zeros(0, dtype=np.int64)
+        df = np.zeros(0, dtype=np.int64)
+        n_docs = 0
+        for docs in chunks:
+            k, rows = self._ngrams(docs, grow=True)
+            uniq, inv = np.unique(k, return_inverse=True)
+            # one count per ngram and tweet
+            X = sparse.csr_matrix((np.ones(len(k)), (rows, inv.ravel())), shape=(len(docs), len(uniq)))
+            keys, inv = np.unique(np.concatenate([keys, uniq]), return_inverse=True)
+            df = np.bincount(inv.ravel(), weights=np.concatenate([df, np.bincount(X.indices, minlength=len(uniq))]),
+                             minlength=len(keys)).astype(np.int64)
+            n_docs += len(docs)
+        if not len(keys):
+            raise ValueError('empty vocabulary; perhaps the documents only contain stop words')
+
+        self.keys_ = keys
+        self.idf_ = np.log((1 + n_docs) / (1 + df)) + 1
+        return self
+
+    def transform(self, docs):
+        keys, rows = self._ngrams(docs)
+        cols = np.searchsorted(self.keys_, keys)
+        found = cols < len(self.keys_)
+        found[found] = self.keys_[cols[found]] == keys[found]
+
+        X = sparse.csr_matrix((np.ones(int(found.sum())), (rows[found], cols[found])),
+                              shape=(len(docs), len(self.keys_)))
+        X.data *= self.idf_[X.indices]
+        return normalize(X, norm='l2', copy=False)
+
+    def fit_transform(self, docs):
+        return self.fit([docs]).transform(docs)
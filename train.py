@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+# this script trains a model on a tokenized file and stores it as an artifact
+# the artifact can be used afterwards by predict.py to score new data
+
+import os
+import atexit
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from scipy import sparse
+
+from dedup import find_duplicates
+from feats import FEATS, author_labels, get_features, pool_authors
+from model import (APPROX, BACKENDS, C_range, C_value, GRIDDIR, N_COMPONENTS, gamma_range, best_params,
+                   build_classifier, optimize_params, train_classifier, save_model)
+from selection import SCORES, keep_ngrams, ngram_count, prune_vectorizer, select_ngrams
+from utils.cache import EntryCache
+from utils.instrument import Metrics
+from utils.table import Table
+
+
+parser = argparse.ArgumentParser(description='Train a model and save it for later predictions.')
+parser.add_argument('lang', help='language (english, spanish, italian, dutch)')
+parser.add_argument('task', help='classification task (gender, age)')
+parser.add_argument('ftrain', help='input train table (original and tokenized tweets, labels)')
+parser.add_argument('fmodel', help='output model artifact')
+parser.add_argument('--optimize', action='store_true', help='perform svm parameter search')
+parser.add_argument('--hashing', type=int, default=0,
+                    help='hash the ngrams into this number of features instead of fitting a vocabulary')
+parser.add_argument('--authors', choices=['sum', 'mean'],
+                    help='classify authors instead of tweets, pooling the features of their tweets')
+parser.add_argument('--backend', choices=BACKENDS, default='svc', help='classifier backend for linear kernels')
+parser.add_argument('--approx', choices=APPROX,
+                    help='train rbf kernels as a linear classifier on a kernel approximation (Nystroem, random Fourier features)')
+parser.add_argument('--components', type=int, default=N_COMPONENTS, help='number of components of --approx')
+parser.add_argument('--batch-size', type=int, default=0, help='train in mini-batches of this size (sgd backend)')
+parser.add_argument('--epochs', type=int, default=5, help='number of passes over the mini-batches')
+parser.add_argument('--folds', type=int, default=5, help='number of cross-validation folds of the parameter search')
+parser.add_argument('--C-range', type=C_value, nargs='+', default=C_range, help='C values of the parameter search')
+parser.add_argument('--gamma-range', type=float, nargs='+', default=gamma_range, help='gamma values of the parameter search')
+parser.add_argument('--grid', help='file with the results of earlier parameter searches (default: grids/LANG-TASK.json)')
+parser.add_argument('--cache', help='directory of the cache of extra features (default: no cache)')
+parser.add_argument('--workers', type=int, default=1, help='number of processes for chunked transforms and the parameter search')
+parser.add_argument('--min-df', type=int, default=1, help='keep the ngrams of at least this many train tweets')
+parser.add_argument('--max-df', type=float, default=1.0, help='keep the ngrams of at most this fraction of train tweets')
+parser.add_argument('--select', choices=SCORES, help='keep the top --k ngrams by this score on the train labels')
+parser.add_argument('--k', type=int, default=0, help='number of ngrams kept by --select')
+parser.add_argument('--dedup', action='store_true',
+                    help='featurize every distinct text once and train on the texts of every author weighted by their copies')
+parser.add_argument('--chunk-size', type=int, default=0,
+                    help='featurize out of core in chunks of this many tweets (0: all in memory)')
+parser.add_argument('--store', help='directory of the feature store of chunked mode (default: temporary)')
+parser.add_argument('--metrics', help='JSON lines file the stage measurements are appended to')
+parser.add_argument('--profile', help='directory for cProfile output of every stage')
+args = parser.parse_args()
+
+# the mini-batches are only trained by the sgd backend
+if args.batch_size and args.backend != 'sgd':
+    parser.error('--batch-size trains in mini-batches, which needs --backend sgd')
+
+# features to use
+feats = dict(FEATS, hashing=args.hashing, authors=args.authors)
+
+# select the ngrams (needs a vocabulary)
+selecting = args.min_df > 1 or args.max_df < 1 or bool(args.select and args.k)
+if selecting and args.hashing:
+    parser.error('the ngram selection needs a vocabulary, it can not be combined with --hashing')
+
+# measurements of the stages of this run
+metrics = Metrics({'script': 'train', 'lang': args.lang, 'task': args.task}, args.metrics, args.profile)
+
+
+# read input classification labels and obtain feature vectors
+train = Table(args.ftrain)
+Ytrain = train.labels(args.task)
+cache = EntryCache(args.cache) if args.cache else None
+
+# in chunked mode the feature matrix is a memory-mapped store on disk
+store = None
+if args.chunk_size:
+    store = args.store or tempfile.mkdtemp(prefix='features-')
+    if not args.store:
+        atexit.register(shutil.rmtree, store, True)
+
+# with --dedup the copies of a text (retweets, promo tweets) share a feature row, see dedup.py
+dup = None
+if args.dedup:
+    with metrics.stage('dedup') as s:
+        dup = find_duplicates(train)
+        s.rows(len(dup))
+        s.set(texts=len(dup.first), groups=len(dup.weights))
+
+with metrics.stage('features', subset='train') as s:
+    Xtrain, vec = get_features(train, args.lang, None, feats, args.workers, cache, metrics, args.chunk_size,
+                               store and os.path.join(store, 'train.csr'), dup)
+    s.matrix(Xtrain)
+Xtrain = sparse.csr_matrix(Xtrain)
+
+# the rows to train on: with --dedup the texts of every author, weighted by their copies
+weights = None
+if dup is not None:
+    Xtrain = dup.group_matrix(Xtrain)
+    Ytrain = [Ytrain[i] for i in dup.group_rows.tolist()]
+    weights = dup.weights
+
+# keep the selected ngrams only: the vectorizer of the model is pruned to them,
+# so that prediction only computes the kept ngrams
+if selecting:
+    with metrics.stage('select', score=args.select, k=args.k, min_df=args.min_df, max_df=args.max_df) as s:
+        n_ngrams = ngram_count(vec['ngrams'])
+        keep = select_ngrams(Xtrain, Ytrain, n_ngrams, args.min_df, args.max_df, args.select, args.k, weights)
+        Xtrain = keep_ngrams(Xtrain, keep, n_ngrams)
+        vec = dict(vec, ngrams=prune_vectorizer(vec['ngrams'], keep))
+        s.matrix(Xtrain)
+        s.set(ngrams=len(keep))
+
+# in author mode every author is a single document: its pooled tweets and its label
+if feats['authors']:
+    with metrics.stage('pool') as s:
+        codes = np.asarray(train.codes('id'), dtype=np.int64)
+        if dup is None:
+            Xtrain = pool_authors(Xtrain, codes, len(train.categories('id')), feats['authors'])
+        else:
+            Xtrain = pool_authors(Xtrain, codes[dup.group_rows], len(train.categories('id')), feats['authors'],
+                                  weights)
+        Ytrain = author_labels(train.labels(args.task), codes)
+        weights = None
+        s.matrix(Xtrain)
+
+print('Training on ' + args.ftrain)
+
+# a priori best models found
+params = best_params(args.lang, args.task)
+if args.optimize and len(set(Ytrain)) > 1:
+    fgrid = args.grid or os.path.join(GRIDDIR, args.lang + '-' + args.task + '.json')
+    with metrics.stage('optimize', folds=args.folds) as s:
+        params = optimize_params(Xtrain, Ytrain, params, args.backend, args.folds, args.workers, fgrid,
+                                 args.C_range, args.gamma_range, sample_weight=weights)
+        s.matrix(Xtrain)
+
+print()
+print('! Best parameter values. Kernel: ' + str(params[0]) + ', c: ' + str(params[1]) + ', gamma: ' + str(params[2]))
+
+# fit the final classifier on the full data
+if len(set(Ytrain)) > 1:
+    with metrics.stage('fit', kernel=params[0], backend=args.backend, approx=args.approx) as s:
+        n_samples = Xtrain.shape[0] if weights is None else int(weights.sum())
+        clf = build_classifier(*params, args.backend, n_samples, args.approx, args.components)
+        train_classifier(clf, Xtrain, Ytrain, args.batch_size, args.epochs, weights)
+        s.matrix(Xtrain)
+    default = None
+else:
+    clf = None
+    default = Ytrain[0]
+
+save_model(args.fmodel, args.lang, args.task, vec, feats, clf, params, default)
+print('Model saved into ' + args.fmodel)
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# this script keeps a content-addressed cache of intermediate results on disk
+# every entry is stored under a hash of everything it was computed from, so a changed
+# input gets a new key and stale entries are never read (they can simply be deleted)
+
+import os
+import pickle
+import hashlib
+import tempfile
+
+
+# hash of the given parts (strings or bytes), used as key of an entry
+def content_key(*parts):
+    h = hashlib.blake2b(digest_size=20)
+    for p in parts:
+        if isinstance(p, str):
+            p = p.encode('utf-8')
+        h.update(len(p).to_bytes(8, 'little'))
+        h.update(p)
+    return h.hexdigest()
+
+
+class EntryCache:
+
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+
+    def _file(self, key):
+        return os.path.join(self.cachedir, key[:2], key + '.pkl')
+
+    # key of the entry computed from the given parts
+    def key(self, *parts):
+        return content_key(*parts)
+
+    def __contains__(self, key):
+        return os.path.isfile(self._file(key))
+
+    # the stored value of a key, None if it is not in the cache
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    # store a value (written to a temporary file of its own and renamed, so that readers
+    # and writers running in parallel, in processes or threads, never see a partial entry)
+    def put(self, key, value):
+        fentry = self._file(key)
+        os.makedirs(os.path.dirname(fentry), exist_ok=True)
+        fd, ftmp = tempfile.mkstemp(dir=os.path.dirname(fentry), prefix=key + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(ftmp, fentry)
+        except BaseException:
+            os.remove(ftmp)
+            raise
@@ -4,13 +4,14 @@
 # it assumes that the field of interest has been tokenized
 
 import sys
-import string
+
+from pipeline import read_stopwords, remove_stopwords
 
 # source data file
 ifile = sys.argv[1]
 
 # list of stopwords
-stopwords = set(open(sys.argv[2], 'r').read().split())
+stopwords = read_stopwords(sys.argv[2])
 
 # field to filter
 filter_field = int(sys.argv[3])
@@ -21,7 +22,7 @@ ofile = sys.argv[4]
 
 with open(ifile, 'r') as fin:
     with open(ofile, 'w') as fout:
-        for line in fin.readlines():
+        for line in fin:
             ind = 0
             fields = line.split('\t')
 
@@ -29,8 +30,7 @@ with open(ifile, 'r') as fin:
                 ind += 1
                 # directly output or filter a field
                 if ind == filter_field:
-                    field2 = list(map(lambda y: '' if y in stopwords else y, field.split()))
-                    fout.write(' '.join([w for w in field2 if w]))
+                    fout.write(remove_stopwords(field, stopwords))
                 else:
                     fout.write(field)
 
@@ -39,4 +39,3 @@ with open(ifile, 'r') as fin:
                     fout.write('\t')
                 else:
                     fout.write('')
-
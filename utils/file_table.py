@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+# this script combines the tab-separated files of the step by step preprocessing
+# (dir_extract.py, file_clean.py, file_tokenize.sh, file_stopwords.py) into a table (see table.py)
+# the tweets of all files must be in the same order
+
+import sys
+
+from pipeline import Record
+from table import write_table
+
+# text files (id tweet class) of the first and second problem
+ftxt1 = sys.argv[1]
+ftxt2 = sys.argv[2]
+
+# tokenized file (id tweet class) of the first problem
+ftok = sys.argv[3]
+
+# output table
+otable = sys.argv[4]
+
+
+def fields(fname):
+    with open(fname, 'r') as f:
+        next(f)
+        for line in f:
+            yield line.rstrip('\n').split('\t')
+
+
+def records():
+    for t1, t2, tok in zip(fields(ftxt1), fields(ftxt2), fields(ftok)):
+        yield Record(t1[0].strip(), t1[1].strip(), tok[1].strip(), (t1[-1].strip(), t2[-1].strip()))
+
+
+write_table(otable, records())
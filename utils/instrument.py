@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+# this script records what the pipeline stages cost: for every named stage the wall time, the CPU time
+# of its thread (and of the child processes that finished meanwhile), the number of rows, the shape and
+# non-zeros of the resulting matrix and the peak RSS
+# a stage is logged when it ends (one line, key=value) and appended to a metrics file (JSON lines)
+# together with the run it belongs to (e.g. language, task and subset)
+#
+#   metrics = Metrics({'script': 'fit', 'lang': 'dutch', 'task': 'gender'}, 'metrics.jsonl')
+#   with metrics.stage('features', subset='train') as s:
+#       X = ...
+#       s.matrix(X)
+#
+# the records of a stream of records (see pipeline.py) are metered with metrics.meter(name, records),
+# the time of a stage of a stream excludes the time spent in the stages before it
+# with a profile directory every outermost stage is also profiled with cProfile (one .prof file each)
+
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import resource
+import threading
+from collections import Counter
+
+
+# peak RSS (MB) of the process since the last reset
+# on Linux the peak is reset at the start of a stage (clear_refs), unless stages of other threads are
+# running (they share the process and its peak, the peak is then the one since an earlier reset);
+# elsewhere it is the peak of the process
+def peak_rss():
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmHWM:\s+(\d+)', f.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+# CPU time of the finished child processes (e.g. of the process pools of a stage)
+def children_cpu_time():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+
+# number of running stages of every thread (of all the Metrics of the process)
+running = Counter()
+running_lock = threading.Lock()
+
+
+# count a stage starting in the current thread, resetting the peak RSS when no other thread runs a stage
+# (the stages running in this thread contain the new one, they get its peak when it ends)
+def start_stage():
+    thread = threading.get_ident()
+    with running_lock:
+        if not any(n for t, n in running.items() if t != thread):
+            reset_peak_rss()
+        running[thread] += 1
+
+
+def end_stage():
+    thread = threading.get_ident()
+    with running_lock:
+        running[thread] -= 1
+        if not running[thread]:
+            del running[thread]
+
+
+# measurements of a running stage, the code of the stage can add its rows and result matrix
+class Stage:
+
+    def __init__(self, name, fields, inherited=()):
+        self.record = dict(fields, stage=name)
+        # fields passed on to the stages it contains
+        self.inherited = set(inherited)
+        self.peak = 0
+
+    def rows(self, n):
+        self.record['rows'] = int(n)
+
+    def matrix(self, X):
+        self.record['rows'] = int(X.shape[0])
+        self.record['shape'] = [int(d) for d in X.shape]
+        if hasattr(X, 'nnz'):
+            self.record['nnz'] = int(X.nnz)
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+
+# the stages of a run: run holds the fields of all its records (e.g. script, lang, task, subset),
+# fmetrics is the JSON lines file the records are appended to, profile a directory for cProfile output
+# and log a stream the records are printed to (None: silent)
+class Metrics:
+
+    def __init__(self, run=None, fmetrics=None, profile=None, log=sys.stdout):
+        self.run = dict(run or {})
+        self.fmetrics = fmetrics
+        self.profile = profile
+        self.log = log
+        self.records = []
+        self._stages = []
+        self._meters = []
+
+    # fields of a new stage: those of the run and of the enclosing stages, updated with the given ones
+    def _fields(self, fields):
+        outer = dict(self.run)
+        for s in self._stages:
+            outer.update((k, s.record[k]) for k in s.inherited)
+        outer.update(fields)
+        return outer
+
+    def stage(self, name, **fields):
+        return _StageContext(self, name, fields)
+
+    # meter a stream: count its items and time the calls into it (without the upstream stages)
+    def meter(self, name, items, **fields):
+        record = dict(self._fields(fields), stage=name, rows=0)
+        wall = cpu = 0.0
+        inner_wall = inner_cpu = 0.0
+        iterator = iter(items)
+        try:
+            while True:
+                self._meters.append([0.0, 0.0])
+                w0, c0 = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    dw, dc = time.perf_counter() - w0, time.thread_time() - c0
+                    inner = self._meters.pop()
+                    wall, cpu = wall + dw, cpu + dc
+                    inner_wall, inner_cpu = inner_wall + inner[0], inner_cpu + inner[1]
+                    if self._meters:
+                        self._meters[-1][0] += dw
+                        self._meters[-1][1] += dc
+                record['rows'] += 1
+                yield item
+        finally:
+            record['wall_s'] = round(wall - inner_wall, 4)
+            record['cpu_s'] = round(cpu - inner_cpu, 4)
+            self.emit(record)
+
+    # log the record of a finished stage and append it to the metrics file
+    def emit(self, record):
+        self.records.append(record)
+        if self.log is not None:
+            self.log.write('[STAGE] ' + ' '.join(k + '=' + format_value(v) for k, v in record.items()) + '\n')
+            self.log.flush()
+        if self.fmetrics:
+            os.makedirs(os.path.dirname(os.path.abspath(self.fmetrics)), exist_ok=True)
+            # a single write of a line, so parallel runs can append to the same file
+            with open(self.fmetrics, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+class _StageContext:
+
+    def __init__(self, metrics, name, fields):
+        self.metrics = metrics
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        m = self.metrics
+        self.stage = Stage(self.name, m._fields(self.fields), self.fields)
+        self.outermost = not m._stages
+        m._stages.append(self.stage)
+
+        self.profiler = None
+        if m.profile and self.outermost:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        start_stage()
+        self.wall, self.cpu, self.children = time.perf_counter(), time.thread_time(), children_cpu_time()
+        return self.stage
+
+    def __exit__(self, *exc):
+        m = self.metrics
+        record = self.stage.record
+        record['wall_s'] = round(time.perf_counter() - self.wall, 4)
+        record['cpu_s'] = round(time.thread_time() - self.cpu, 4)
+        children = children_cpu_time() - self.children
+        if children:
+            record['children_cpu_s'] = round(children, 4)
+        if self.profiler is not None:
+            self.profiler.disable()
+            name = [str(v) for v in list(m.run.values()) + list(self.fields.values())] + [self.name]
+            fprof = os.path.join(m.profile, '-'.join(name) + '.prof')
+            os.makedirs(m.profile, exist_ok=True)
+            self.profiler.dump_stats(fprof)
+            record['profile'] = fprof
+
+        # the peak of an inner stage was reset by the stages it contains, they pass it on
+        self.stage.peak = max(self.stage.peak, peak_rss())
+        record['peak_rss_mb'] = round(self.stage.peak, 1)
+        end_stage()
+        m._stages.pop()
+        if m._stages:
+            m._stages[-1].peak = max(m._stages[-1].peak, self.stage.peak)
+        if exc[0] is not None:
+            record['error'] = exc[0].__name__
+        m.emit(record)
+        return False
+
+
+def format_value(v):
+    if isinstance(v, list):
+        return 'x'.join(str(d) for d in v)
+    if isinstance(v, float):
+        return '%g' % v
+    return str(v)
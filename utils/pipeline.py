@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+# this script streams the tweets of a directory through the preprocessing stages
+# (extract -> clean -> tokenize -> stopwords) without writing intermediate files
+# every stage is a generator of records, so only a few tweets are held in memory
+
+import os
+import re
+import string
+from pathlib import Path
+from itertools import groupby
+from collections import deque
+from operator import attrgetter
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+
+
+# a tweet flowing through the pipeline: author id, original text, processed text,
+# labels (gender, age) and the author file it comes from
+Record = namedtuple('Record', ['id', 'tweet', 'text', 'labels', 'source'], defaults=(None,))
+
+# version of the preprocessing, increase it when the output of the stages changes
+# (it is part of the key of the cached entries)
+PIPELINE_VERSION = 1
+
+# labels used when the directory has no truth file
+NO_LABELS = ('X', 'XX-XX')
+
+# special directories and files found next to the author files
+SPECIAL_FILES = ['features', 'results', 'truth.txt', 'truth_pred.txt']
+
+# matches repeated characters
+re_repeat = r'([\D])\1\1+'
+
+# matches twitter mentions @username
+re_mention = r'@([A-Za-z0-9_]+)'
+
+# matches urls
+re_urls = r'http(s?)://(\S+)'
+
+# matches control characters
+re_control = r'(\\[tnrfv])+'
+
+# matches other special characters such as emoticons
+re_emoticon = r'([^\w\s' + string.punctuation + r'])'
+
+# number of tweets sent at once to the tokenizer pool
+TOKENIZE_BATCH = 10000
+
+# number of author files parsed at once by a worker of the ingestion pool
+PARSE_CHUNK = 64
+
+# number of records written at once into the output files
+WRITE_BATCH = 10000
+
+
+# read gender and age labels from the truth file: { id : [ gender, age ] }
+def read_truth(idir):
+    labels = {}
+    if Path(idir + "/truth.txt").is_file():
+        with open(idir + "/truth.txt") as f:
+            for l in f:
+                labels[l.split(":::")[0]] = l.split(":::")[1:3]
+    return labels
+
+
+# list the author files in the given directory
+def author_files(idir):
+    with os.scandir(idir) as entries:
+        return [e.name for e in entries if e.name not in SPECIAL_FILES]
+
+
+# parse the XML document of an author: returns the author id and the texts of its tweets
+def parse_author_xml(data):
+    root = ET.fromstring(data)
+    # extract the author id
+    auth_id = root.attrib["id"].strip()
+    # extract the texts of tweets
+    return auth_id, [child.text.replace('\n', '').strip() for child in root]
+
+
+# parse an author file (an author file is small, parsing its bytes at once is faster than an incremental parse)
+def parse_author(fname):
+    with open(fname, 'rb') as af:
+        return parse_author_xml(af.read())
+
+
+# parse a chunk of author files (a task of the ingestion pool)
+def parse_authors(fnames):
+    return [parse_author(f) for f in fnames]
+
+
+# results of func on every item in order, computed on an executor with at most ahead items in flight
+# (so that the parsed files do not pile up in memory while the later stages are slower)
+def bounded_map(executor, func, items, ahead):
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# read tweets from all the author files in the given directory (or only the given files)
+# with workers > 1 the files are parsed in chunks on a process pool, in the same order, with at
+# most two chunks per worker in flight; executor is an optional pool shared by several readers
+# (e.g. the threads of the driver), otherwise one is created for the files
+def read_authors(idir, files=None, workers=1, executor=None):
+    labels = read_truth(idir)
+    if files is None:
+        files = author_files(idir)
+
+    chunks = [files[i:i + PARSE_CHUNK] for i in range(0, len(files), PARSE_CHUNK)]
+    fchunks = [[idir + "/" + f for f in chunk] for chunk in chunks]
+    own = None
+    if executor is None and workers > 1 and len(chunks) > 1:
+        executor = own = ProcessPoolExecutor(max_workers=workers)
+    if executor is not None and len(chunks) > 1:
+        parsed = bounded_map(executor, parse_authors, fchunks, 2 * workers)
+    else:
+        parsed = (parse_authors(fchunk) for fchunk in fchunks)
+
+    try:
+        for chunk, authors in zip(chunks, parsed):
+            for f, (auth_id, texts) in zip(chunk, authors):
+                auth_labels = tuple(labels[auth_id][:2]) if labels else NO_LABELS
+                for text in texts:
+                    yield Record(auth_id, text, text, auth_labels, f)
+    finally:
+        parsed.close()
+        if own is not None:
+            own.shutdown(cancel_futures=True)
+
+
+# compiled patterns of the cleaning pass
+RE_REPEAT = re.compile(re_repeat)
+RE_MENTION = re.compile(re_mention)
+RE_URLS = re.compile(re_urls)
+RE_CONTROL = re.compile(re_control)
+RE_EMOTICON = re.compile(re_emoticon)
+
+
+# clean a text before tokenization
+# the replacements are applied in order (a url may contain a mention), but the ones
+# that can not match the text are skipped
+def clean_text(text):
+    # replace repeated letters with only 2 occurrences
+    text = RE_REPEAT.sub(r'\1\1', text)
+    # replace mentions with a generic token
+    if '@' in text:
+        text = RE_MENTION.sub('@username ', text)
+    # replace urls
+    if 'http' in text:
+        text = RE_URLS.sub('@url ', text)
+    # replace control characters
+    if '\\' in text:
+        text = RE_CONTROL.sub(' ', text)
+    # replace emoticons (printable ascii is always a word character, a space or punctuation)
+    if not (text.isascii() and text.isprintable()):
+        text = RE_EMOTICON.sub(r' \1 ', text)
+
+    return text.lower()
+
+
+# remove stopwords from a tokenized text
+def remove_stopwords(text, stopwords):
+    return ' '.join([w for w in text.split() if w not in stopwords])
+
+
+# read a list of stopwords
+def read_stopwords(fstopwords):
+    with open(fstopwords, 'r') as f:
+        return set(f.read().split())
+
+
+def clean(records):
+    for r in records:
+        yield r._replace(text=clean_text(r.text))
+
+
+# tokenize the texts in batches with a pool of CMU Tweet NLP processes (see tokenizer.py)
+def tokenize(records, tokenizer):
+    batch = []
+    for r in records:
+        batch.append(r)
+        if len(batch) == TOKENIZE_BATCH:
+            for r, tokens in zip(batch, tokenizer.tokenize([r.text for r in batch])):
+                yield r._replace(text=tokens)
+            batch = []
+
+    for r, tokens in zip(batch, tokenizer.tokenize([r.text for r in batch])):
+        yield r._replace(text=tokens)
+
+
+def filter_stopwords(records, stopwords):
+    for r in records:
+        yield r._replace(text=remove_stopwords(r.text, stopwords))
+
+
+# write the original tweets (.txt) and the processed ones (.tok, optional) of every task
+# in one pass: ofiles_txt and ofiles_tok are (gender file, age file) pairs
+# the lines are collected and written in batches of WRITE_BATCH records
+def write_records(records, ofiles_txt, ofiles_tok=()):
+    outs = [open(f, 'w') for f in list(ofiles_txt) + list(ofiles_tok)]
+    try:
+        for o, task in zip(outs, ['gender', 'age'] * 2):
+            o.write('id\ttweet\t' + task + '\n')
+
+        lines = [[] for o in outs]
+        txt_gender, txt_age = lines[:2]
+        for n, (auth_id, tweet, text, (gender, age), _) in enumerate(records, 1):
+            txt_gender.append(auth_id + '\t' + tweet + '\t' + gender + '\n')
+            txt_age.append(auth_id + '\t' + tweet + '\t' + age + '\n')
+            if ofiles_tok:
+                lines[2].append(auth_id + '\t' + text + '\t' + gender + '\n')
+                lines[3].append(auth_id + '\t' + text + '\t' + age + '\n')
+            if n % WRITE_BATCH == 0:
+                for o, l in zip(outs, lines):
+                    o.writelines(l)
+                    l.clear()
+
+        for o, l in zip(outs, lines):
+            o.writelines(l)
+    finally:
+        for o in outs:
+            o.close()
+
+
+# run the tweets of the given author files (all by default) through the preprocessing stages
+# (metrics is an optional instrument.Metrics metering the records of every stage,
+# executor an optional process pool parsing the files, see read_authors)
+def process(idir, fstopwords, tokenizer, files=None, workers=1, metrics=None, executor=None):
+    meter = metrics.meter if metrics is not None else lambda name, records: records
+    records = meter('extract', read_authors(idir, files, workers, executor))
+    records = meter('clean', clean(records))
+    records = meter('tokenize', tokenize(records, tokenizer))
+    return meter('stopwords', filter_stopwords(records, read_stopwords(fstopwords)))
+
+
+# preprocessed tweets of every author file, taken from the cache (see cache.py) when the
+# author file, the stopwords and the pipeline version did not change since they were stored
+# only the new and changed files go through the stages (in a single stream)
+def cached_records(idir, fstopwords, tokenizer, cache, workers=1, metrics=None, executor=None):
+    files = author_files(idir)
+    with open(fstopwords, 'rb') as sf:
+        stopwords = sf.read()
+    keys = {}
+    for f in files:
+        with open(idir + "/" + f, 'rb') as af:
+            keys[f] = cache.key(af.read(), stopwords, str(PIPELINE_VERSION))
+
+    missing = [f for f in files if keys[f] not in cache]
+    if missing:
+        for f, records in groupby(process(idir, fstopwords, tokenizer, missing, workers, metrics, executor),
+                                  attrgetter('source')):
+            cache.put(keys[f], [(r.id, r.tweet, r.text) for r in records])
+        # files without tweets
+        for f in missing:
+            if keys[f] not in cache:
+                cache.put(keys[f], [])
+
+    # the labels are not cached, the truth file may change independently
+    labels = read_truth(idir)
+    for f in files:
+        entry = cache.get(keys[f])
+        if entry is None:
+            # an unreadable entry (e.g. truncated or corrupt) is computed and stored again
+            entry = [(r.id, r.tweet, r.text) for r in process(idir, fstopwords, tokenizer, [f], metrics=metrics)]
+            cache.put(keys[f], entry)
+        for auth_id, tweet, text in entry:
+            yield Record(auth_id, tweet, text, tuple(labels[auth_id][:2]) if labels else NO_LABELS, f)
+
+
+# preprocessed tweets of a directory of author files (a stream of records, written into
+# a table with table.write_table)
+# tokenizer is a (shared) TokenizerPool, cache an optional EntryCache of preprocessed author files
+# and workers the number of processes parsing the author files (on executor, when it is given)
+def preprocess(idir, fstopwords, tokenizer, cache=None, workers=1, metrics=None, executor=None):
+    if cache is None:
+        return process(idir, fstopwords, tokenizer, workers=workers, metrics=metrics, executor=executor)
+    return cached_records(idir, fstopwords, tokenizer, cache, workers, metrics, executor)
@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+# this script preprocesses a directory of author files in a single streaming pass
+# (extract -> clean -> tokenize -> stopwords) and writes the original and tokenized tweets
+# with the labels of both tasks into a table (see table.py)
+
+import sys
+
+from pipeline import author_files, preprocess
+from cache import EntryCache
+from instrument import Metrics
+from table import write_table
+from tokenizer import TokenizerPool
+
+# source data directory
+idir = sys.argv[1]
+
+# list of stopwords
+fstopwords = sys.argv[2]
+
+# CMU Tweet NLP directory
+tweetnlp = sys.argv[3]
+
+# output table
+otable = sys.argv[4]
+
+# optional cache directory of preprocessed author files (empty: no cache)
+cache = EntryCache(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] else None
+
+# optional JSON lines file the stage measurements are appended to
+metrics = Metrics({'script': 'preprocess', 'idir': idir}, sys.argv[6] if len(sys.argv) > 6 else None)
+
+
+# nothing to do without author files
+if not author_files(idir):
+    sys.exit()
+
+with TokenizerPool(tweetnlp) as tokenizer, metrics.stage('preprocess'):
+    write_table(otable, preprocess(idir, fstopwords, tokenizer, cache, metrics=metrics))
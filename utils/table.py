@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# this script stores the preprocessed tweets of a subset and language as a columnar table
+# a table is a directory with one file per column, which are memory-mapped when read:
+#   text columns (tweet, tok): the UTF-8 bytes of all rows (.bin) and their offsets (.offsets.npy)
+#   categorical columns (id, gender, age): integer codes (.npy), the categories are in meta.json
+
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# version of the table layout, increase it when it changes
+TABLE_VERSION = 1
+
+# columns of a table of preprocessed tweets
+TEXT_COLUMNS = ['tweet', 'tok']
+CATEGORICAL_COLUMNS = ['id', 'gender', 'age']
+
+# number of rows collected before they are written into the column files
+WRITE_BATCH = 10000
+
+
+# write a stream of records (see pipeline.py) into a table
+# the table is written next to its final path and renamed, so readers never see a partial table
+def write_table(ftable, records):
+    tabledir = os.path.dirname(os.path.abspath(ftable))
+    os.makedirs(tabledir, exist_ok=True)
+    ftmp = tempfile.mkdtemp(dir=tabledir, prefix=os.path.basename(ftable) + '.', suffix='.tmp')
+
+    texts = {col: open(os.path.join(ftmp, col + '.bin'), 'wb') for col in TEXT_COLUMNS}
+    offsets = {col: [0] for col in TEXT_COLUMNS}
+    categories = {col: {} for col in CATEGORICAL_COLUMNS}
+    codes = {col: [] for col in CATEGORICAL_COLUMNS}
+    try:
+        batch = {col: [] for col in TEXT_COLUMNS}
+        for n, r in enumerate(records, 1):
+            for col, value in zip(TEXT_COLUMNS, (r.tweet, r.text)):
+                data = value.encode('utf-8')
+                batch[col].append(data)
+                offsets[col].append(offsets[col][-1] + len(data))
+            for col, value in zip(CATEGORICAL_COLUMNS, (r.id,) + tuple(r.labels)):
+                codes[col].append(categories[col].setdefault(value, len(categories[col])))
+            if n % WRITE_BATCH == 0:
+                for col in TEXT_COLUMNS:
+                    texts[col].write(b''.join(batch[col]))
+                    batch[col].clear()
+
+        for col in TEXT_COLUMNS:
+            texts[col].write(b''.join(batch[col]))
+    finally:
+        for f in texts.values():
+            f.close()
+
+    for col in TEXT_COLUMNS:
+        np.save(os.path.join(ftmp, col + '.offsets.npy'), np.array(offsets[col], dtype=np.int64))
+    for col in CATEGORICAL_COLUMNS:
+        np.save(os.path.join(ftmp, col + '.npy'), np.array(codes[col], dtype=np.int32))
+
+    meta = {
+        'version': TABLE_VERSION,
+        'rows': len(codes['id']),
+        'categories': {col: list(categories[col]) for col in CATEGORICAL_COLUMNS},
+    }
+    with open(os.path.join(ftmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(ftable, ignore_errors=True)
+    os.replace(ftmp, ftable)
+
+
+# decode the UTF-8 bytes of consecutive rows (split at the given byte offsets, starting with 0)
+def decode_rows(data, offsets):
+    text = data.tobytes().decode('utf-8')
+    if len(text) != len(data):
+        # byte offsets to character offsets: skip the continuation bytes of multi-byte characters
+        continuation = np.concatenate([[0], np.cumsum((data & 0xC0) == 0x80)])
+        offsets = offsets - continuation[offsets]
+    offsets = offsets.tolist()
+    return [text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+# a table written by write_table, only the columns that are asked for are read
+class Table:
+
+    def __init__(self, ftable):
+        self.path = ftable
+        with open(os.path.join(ftable, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != TABLE_VERSION:
+            raise ValueError('Table ' + ftable + ' has version ' + str(meta.get('version')) +
+                             ', expected ' + str(TABLE_VERSION) + '. Preprocess the data again.')
+        self.rows = meta['rows']
+        self._categories = meta['categories']
+
+    def __len__(self):
+        return self.rows
+
+    # texts of a text column (tweet or tok)
+    # the column is decoded at once and split at the character offsets of the rows
+    def text(self, col):
+        offsets = np.load(os.path.join(self.path, col + '.offsets.npy'))
+        if offsets[-1] == 0:
+            return [''] * self.rows
+        return decode_rows(np.memmap(os.path.join(self.path, col + '.bin'), dtype=np.uint8, mode='r'), offsets)
+
+    # texts of a text column in batches of (at most) size rows, only one batch is decoded at a time
+    def text_batches(self, col, size):
+        offsets = np.load(os.path.join(self.path, col + '.offsets.npy'), mmap_mode='r')
+        data = np.memmap(os.path.join(self.path, col + '.bin'), dtype=np.uint8, mode='r') if offsets[-1] else None
+        for a in range(0, self.rows, size):
+            b = min(a + size, self.rows)
+            rows = np.array(offsets[a:b + 1])
+            if rows[-1] == rows[0]:
+                yield [''] * (b - a)
+            else:
+                yield decode_rows(data[rows[0]:rows[-1]], rows - rows[0])
+
+    # integer codes of a categorical column (id, gender, age)
+    def codes(self, col):
+        return np.load(os.path.join(self.path, col + '.npy'), mmap_mode='r')
+
+    # categories of a categorical column, in the order of their codes
+    def categories(self, col):
+        return self._categories[col]
+
+    # values of a categorical column
+    def labels(self, col):
+        categories = self._categories[col]
+        return [categories[c] for c in self.codes(col).tolist()]
+
+
+# a table of records held in memory, with the same interface as Table (e.g. for a single request)
+class MemoryTable:
+
+    def __init__(self, records, path='<memory>'):
+        self.path = path
+        records = list(records)
+        self.rows = len(records)
+        self._texts = {'tweet': [r.tweet for r in records], 'tok': [r.text for r in records]}
+        self._categories = {}
+        self._codes = {}
+        for j, col in enumerate(CATEGORICAL_COLUMNS):
+            values = [r.id for r in records] if j == 0 else [r.labels[j - 1] for r in records]
+            categories = {}
+            self._codes[col] = np.array([categories.setdefault(v, len(categories)) for v in values], dtype=np.int32)
+            self._categories[col] = list(categories)
+
+    def __len__(self):
+        return self.rows
+
+    def text(self, col):
+        return self._texts[col]
+
+    def text_batches(self, col, size):
+        for a in range(0, self.rows, size):
+            yield self._texts[col][a:a + size]
+
+    def codes(self, col):
+        return self._codes[col]
+
+    def categories(self, col):
+        return self._categories[col]
+
+    def labels(self, col):
+        categories = self._categories[col]
+        return [categories[c] for c in self._codes[col].tolist()]
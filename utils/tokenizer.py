@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# this script keeps CMU Tweet NLP tokenizers running as long-lived processes
+# texts are sent in batches through stdin/stdout pipes, so the JVM and its model
+# are only loaded once per process, and a pool of them is shared by all languages
+
+import os
+import queue
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# a single tokenizer process (twokenize.sh reading from its stdin)
+# CMU Tweet NLP prints (and flushes) one line per input line: tokens, tab, original text
+class Tokenizer:
+
+    def __init__(self, tweetnlp):
+        self.proc = subprocess.Popen(['bash', os.path.join(tweetnlp, 'twokenize.sh'), '/dev/stdin'],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=tweetnlp)
+
+    def _write(self, texts):
+        for t in texts:
+            # the tokenizer reads line by line, so the text must not break the line
+            self.proc.stdin.write((t.replace('\r', ' ').replace('\n', ' ') + '\n').encode('utf-8'))
+        self.proc.stdin.flush()
+
+    # tokenize a batch of texts, the input is written while the output is read
+    def tokenize(self, texts):
+        writer = threading.Thread(target=self._write, args=(texts,), daemon=True)
+        writer.start()
+
+        tokens = []
+        for _ in texts:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError('CMU Tweet NLP tokenizer exited unexpectedly')
+            tokens.append(line.decode('utf-8').rstrip('\n').split('\t')[0])
+
+        writer.join()
+        return tokens
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        self.proc.wait()
+
+
+# a pool of tokenizer processes with a cache of the tokenized texts
+# every unique text is tokenized only once (as long as it stays in the cache)
+class TokenizerPool:
+
+    def __init__(self, tweetnlp, workers=1, batch_size=1000, cache_size=1000000):
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.idle = queue.Queue()
+        for _ in range(workers):
+            self.idle.put(Tokenizer(tweetnlp))
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _tokenize_batch(self, batch):
+        worker = self.idle.get()
+        try:
+            return worker.tokenize(batch)
+        finally:
+            self.idle.put(worker)
+
+    # tokenize a list of texts, sending the ones not seen before to the tokenizers in batches
+    def tokenize(self, texts):
+        found = {}
+        missing = []
+        with self.lock:
+            for t in dict.fromkeys(texts):
+                if t in self.cache:
+                    self.cache.move_to_end(t)
+                    found[t] = self.cache[t]
+                else:
+                    missing.append(t)
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        for batch, tokens in zip(batches, self.executor.map(self._tokenize_batch, batches)):
+            found.update(zip(batch, tokens))
+
+        with self.lock:
+            for t in missing:
+                self.cache[t] = found[t]
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return [found[t] for t in texts]
+
+    def close(self):
+        self.executor.shutdown()
+        for _ in range(self.workers):
+            self.idle.get().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()